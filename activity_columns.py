@@ -0,0 +1,49 @@
+from input_interfaces import Attention, BufferTime
+
+
+# Buffers and activities as columns (lists, one row each in the given order) with the start ranges
+# of every movable one, computed in one pass for the bulk model build of ScheduleTasks
+#   duration              as given
+#   windowStart/End       first choice window of movable ones: the group time, or the schedule
+#                         time without a group (and for buffers)
+#   plainStarts           row -> start ranges [[first, last], ...] keeping a movable one inside its
+#                         first choice window or one of the disturbance times its attention allows
+#   wantedStarts          row -> start ranges of its wanted windows when it has second choice ones
+#                         (see ScheduleTasks._addSecondChoice), None when every start is wanted
+# disturbanceWindows maps an attention to the (start, end) disturbance times it may also use
+class ActivityColumns:
+    def __init__(self, activities, scheduleWindow, groupWindows, disturbanceWindows):
+        self.duration = []
+        self.windowStart = []
+        self.windowEnd = []
+        self.plainStarts = {}
+        self.wantedStarts = {}
+        for row, activity in enumerate(activities):
+            isBuffer = isinstance(activity, BufferTime)
+            groupName = None if isBuffer else activity.groupName
+            windowStart, windowEnd = groupWindows[groupName] if groupName is not None else scheduleWindow
+            self.duration.append(activity.duration)
+            self.windowStart.append(windowStart)
+            self.windowEnd.append(windowEnd)
+            if activity.startTime is not None:
+                continue
+
+            first = [[windowStart, windowEnd - activity.duration]] if windowEnd - activity.duration >= windowStart else []
+            attention = Attention.NORMAL if isBuffer else activity.attentionRequired
+            if attention == Attention.NORMAL:
+                self.plainStarts[row] = first
+                self.wantedStarts[row] = None
+                continue
+            windows = disturbanceWindows.get(attention, [])
+            disturbance = [[start, end - activity.duration] for start, end in windows if end - activity.duration >= start]
+            self.plainStarts[row] = first + disturbance
+            # Without a group the disturbance times are the wanted ones and the rest of the
+            # schedule the second choice; with a group the group time is wanted and the
+            # disturbance times are the second choice
+            if groupName is None:
+                self.wantedStarts[row] = disturbance
+            else:
+                self.wantedStarts[row] = first if windows else None
+
+    def __len__(self):
+        return len(self.duration)
@@ -0,0 +1,126 @@
+import collections
+import threading
+import time
+
+
+# Rules that end an anytime solve early (see ScheduleTasks.solveAsync); None turns a rule off
+#   timeBudget       seconds from the start of the solve
+#   targetObjective  a solution with at most this objective was found
+#   relativeGap      (objective - bound) / objective of the last solution is at most this
+#   stallTime        seconds without a better solution, counted from the last one found
+StopCondition = collections.namedtuple('StopCondition', 'timeBudget, targetObjective, relativeGap, stallTime',
+                                       defaults=(None, None, None, None))
+
+# A solve running in a background thread that hands out its improving solutions as they are found
+# Iterating over it yields SolutionSnapshots (plain int lists, cheap to capture in the solver's
+# callback): only the latest one is kept, so a slow consumer skips solutions instead of holding the
+# search up or piling them up. result() waits for the SolveResult
+# It is the reporter of the solve: the callback only stores the snapshot and checks the objective
+# rules, a watcher thread applies the time rules and stop() ends the search at any time
+# Once stopped, every later search of the solve (a later lexicographic stage, the greedy fallback)
+# stops at its first solution
+# The scheduler must not be used until the solve is done
+class AnytimeSolve:
+    def __init__(self, scheduler, stop=None, **solveArguments):
+        self.scheduler = scheduler
+        self.stopCondition = stop or StopCondition()
+        # Why the search was stopped early ('stopped', 'time budget', 'target objective',
+        # 'relative gap' or 'stall'), None if it ran to the end
+        self.stopReason = None
+        self._condition = threading.Condition()
+        self._latest = None
+        self._solutionCount = 0
+        self._startTime = time.monotonic()
+        self._lastImprovement = None
+        self._finished = False
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(solveArguments,), daemon=True)
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        self._watcher.start()
+
+    def _run(self, solveArguments):
+        result = error = None
+        try:
+            result = self.scheduler.solve(reporter=self, **solveArguments)
+        except BaseException as exception:
+            error = exception
+        with self._condition:
+            self._result = result
+            self._error = error
+            self._finished = True
+            self._condition.notify_all()
+
+    # Wait for a time rule or stop() and stop the running search
+    def _watch(self):
+        stop = self.stopCondition
+        with self._condition:
+            while not self._finished and self.stopReason is None:
+                now = time.monotonic()
+                deadlines = []
+                if stop.timeBudget is not None:
+                    deadlines.append((self._startTime + stop.timeBudget, 'time budget'))
+                if stop.stallTime is not None and self._lastImprovement is not None:
+                    deadlines.append((self._lastImprovement + stop.stallTime, 'stall'))
+                reached = [reason for deadline, reason in deadlines if deadline <= now]
+                if reached:
+                    self.stopReason = reached[0]
+                else:
+                    self._condition.wait(min([deadline for deadline, _ in deadlines], default=now + 3600) - now)
+            if self._finished:
+                return
+        self.scheduler.solver.StopSearch()
+
+    # Reporter interface, called from the solver thread
+    def onSolution(self, solutionCallback, snapshot):
+        stop = self.stopCondition
+        with self._condition:
+            self._latest = snapshot
+            self._solutionCount += 1
+            self._lastImprovement = time.monotonic()
+            if self.stopReason is None:
+                if stop.targetObjective is not None and snapshot.objective <= stop.targetObjective:
+                    self.stopReason = 'target objective'
+                elif stop.relativeGap is not None and \
+                        snapshot.objective - snapshot.bound <= stop.relativeGap * max(1, abs(snapshot.objective)):
+                    self.stopReason = 'relative gap'
+            self._condition.notify_all()
+        if self.stopReason is not None:
+            solutionCallback.StopSearch()
+
+    def onStage(self, stageName, status, solutionCount, wallTime):
+        pass
+
+    def onResult(self, result):
+        pass
+
+    # End the search now; the best schedule found so far becomes the result
+    def stop(self):
+        with self._condition:
+            if self.stopReason is None:
+                self.stopReason = 'stopped'
+            self._condition.notify_all()
+
+    def done(self):
+        return self._finished
+
+    # The SolveResult, waiting up to timeout seconds (None: until the solve is done)
+    def result(self, timeout=None):
+        self._thread.join(timeout)
+        if not self._finished:
+            raise TimeoutError('The solve is still running')
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def __iter__(self):
+        seen = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._solutionCount > seen or self._finished)
+                if self._solutionCount == seen:
+                    return
+                seen = self._solutionCount
+                snapshot = self._latest
+            yield snapshot
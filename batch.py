@@ -0,0 +1,110 @@
+import collections
+import concurrent.futures
+import os
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+from model_template import loadTemplate
+from scheduler import ScheduleTasks
+from solve_result import SolveResult
+from solver_config import SolverConfig
+
+
+# Result of one case of a batch: index of the case in the input and its SolveResult
+BatchResult = collections.namedtuple('BatchResult', 'index, result')
+
+
+# Solve many independent userData dicts across a pool of worker processes
+# Results are yielded as BatchResults in completion order, as soon as each solve finishes
+# Every solve gets the time limit of solverConfig; unless solverConfig sets numSearchWorkers,
+# the cores are split between the worker processes so that workers x search threads
+# does not oversubscribe the machine
+# A case that raises (or whose worker process dies) is reported with status 'ERROR'
+# instead of stopping the batch
+# cases may be any iterable (e.g. a generator); at most maxPending cases are held in memory
+# templatePath is an optional file saved by model_template.ModelTemplate.save: each worker loads it
+# once and makes the model of every case matching it from the template instead of building it
+def solveMany(cases, workers=None, solverConfig=None, mode='weighted', keepSolutions=0, maxPending=None, templatePath=None):
+    workers = workers or os.cpu_count() or 1
+    solverConfig = splitCores(solverConfig, workers)
+    maxPending = maxPending or 2 * workers
+    solveOptions = (solverConfig, mode, keepSolutions, templatePath)
+
+    caseIterator = enumerate(cases)
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    # future -> (index, userData)
+    pending = {}
+    try:
+        while True:
+            # Keep the pool busy without reading the whole input up front
+            while len(pending) < maxPending:
+                nextCase = next(caseIterator, None)
+                if nextCase is None:
+                    break
+                index, userData = nextCase
+                pending[pool.submit(solveCase, userData, solveOptions)] = (index, userData)
+            if not pending:
+                break
+
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            crashed = []
+            for future in done:
+                index, userData = pending.pop(future)
+                try:
+                    yield BatchResult(index, future.result())
+                except BrokenProcessPool:
+                    crashed.append((index, userData))
+
+            if crashed:
+                # A dead worker breaks the whole pool and every unfinished case with it, so there is
+                # no telling which case killed it: solve each of them again in a process of its own
+                crashed += list(pending.values())
+                pending = {}
+                pool.shutdown(wait=False)
+                for index, userData in crashed:
+                    yield BatchResult(index, solveIsolated(userData, solveOptions))
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# solverConfig for solves running in workers processes at once: unless it sets numSearchWorkers,
+# each solve gets an equal share of the cores
+def splitCores(solverConfig, workers):
+    solverConfig = solverConfig or SolverConfig()
+    if solverConfig.numSearchWorkers is None:
+        solverConfig = solverConfig.replace(numSearchWorkers=max(1, (os.cpu_count() or 1) // workers))
+    return solverConfig
+
+
+# SolveResult of a case that could not be solved
+def errorResult(message):
+    return SolveResult(status='ERROR', objective=None, bound=None, wallTime=0.0,
+                       placed=[], unplaced=[], error=message)
+
+
+# Solve one case in a new single worker pool, reporting it as failed if the process dies
+# mpContext is the multiprocessing context of the pool (default: the platform's)
+def solveIsolated(userData, solveOptions, mpContext=None):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=mpContext) as pool:
+        try:
+            return pool.submit(solveCase, userData, solveOptions).result()
+        except BrokenProcessPool:
+            return errorResult('Worker process died while solving this case')
+
+
+# Runs in a worker process of solveMany (or any other process pool): build and solve one case,
+# turning any exception into an error result
+# solveOptions is a (solverConfig, mode, keepSolutions, templatePath) tuple; a case that does not
+# match the template (if any) is built as usual
+def solveCase(userData, solveOptions):
+    solverConfig, mode, keepSolutions, templatePath = solveOptions
+    try:
+        template = loadTemplate(templatePath) if templatePath is not None else None
+        if template is not None and template.matches(userData):
+            scheduler = template.instantiate(userData, solverConfig=solverConfig)
+        else:
+            scheduler = ScheduleTasks(userData, solverConfig=solverConfig)
+        return scheduler.solve(mode=mode, keepSolutions=keepSolutions)
+    except Exception:
+        return errorResult(traceback.format_exc(limit=5))
@@ -0,0 +1,461 @@
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+import ortools
+
+import input_cases
+from batch import solveMany
+from decomposition import solveDecomposed
+from greedy import greedySchedule
+from instance_generator import DAY_LENGTH, generateUserData, multiDayUserData
+from model_template import ModelTemplate
+from rolling_horizon import solveRollingHorizon
+from input_interfaces import createInputShell, ScheduleTime, Activity, DisturbanceMarkedTimes, Resource
+from scheduler import ScheduleTasks
+from solver_config import SolverConfig
+
+
+# Sizes used when no sizes are given on the command line
+DEFAULT_SIZES = [10, 20, 50, 100, 200, 500]
+# Time limit (seconds) given to CP-SAT for each benchmark solve
+SOLVE_TIME_LIMIT = 10.0
+
+
+def benchmarkCase(userData, compactSchedule, penalizeOrderChanges=False, presolve=True):
+    start = time.time()
+    scheduler = ScheduleTasks(userData, compactSchedule=compactSchedule, penalizeOrderChanges=penalizeOrderChanges, presolve=presolve)
+    buildTime = time.time() - start
+
+    modelProto = scheduler.model.Proto()
+    SolverConfig(maxTimeInSeconds=SOLVE_TIME_LIMIT, numSearchWorkers=1).applyTo(scheduler.solver.parameters)
+    start = time.time()
+    status = scheduler.solver.Solve(scheduler.model)
+    solveTime = time.time() - start
+
+    return {
+        'variables': len(modelProto.variables),
+        'constraints': len(modelProto.constraints),
+        'build': buildTime,
+        'solve': solveTime,
+        'status': scheduler.solver.StatusName(status),
+        'objective': scheduler.solver.ObjectiveValue(),
+        'pruned': len(scheduler.presolveReport['pruned']) if scheduler.presolveReport else 0,
+    }
+
+
+# Model size and solve time with the order-change penalty on, for the hand-written cases and a random day
+def benchmarkOrderChanges():
+    cases = [(name, getattr(input_cases, name)) for name in sorted(dir(input_cases)) if name.startswith('case')]
+    cases.append(('random200', generateUserData(200)))
+    print('case\t\tvariables\tconstraints\tbuild (s)\tsolve (s)\tstatus')
+    for name, userData in cases:
+        row = benchmarkCase(userData, compactSchedule=True, penalizeOrderChanges=True)
+        print('%s\t\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%s' % (
+            name, row['variables'], row['constraints'], row['build'], row['solve'], row['status']))
+
+
+# Day where tierSize activities of each priority level compete for room for about 1.5 tiers
+def priorityTiersUserData(tierSize, numLevels=3, seed=0):
+    rng = random.Random(seed)
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, int(tierSize * 15 * 1.5))]
+    for priority in range(1, numLevels + 1):
+        for i in range(tierSize):
+            userData['activities'].append(Activity(
+                'P' + str(priority) + '-' + str(i), rng.randint(10, 20), priority=priority))
+    return userData
+
+
+# Solve time of the priority cascade as the size of each priority level grows
+def benchmarkPriorityTiers(tierSizes=(5, 10, 20, 50, 100, 200)):
+    print('tier size\tvariables\tconstraints\tbuild (s)\tsolve (s)\tstatus')
+    for tierSize in tierSizes:
+        row = benchmarkCase(priorityTiersUserData(tierSize, seed=0), compactSchedule=False)
+        print('%d\t\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%s' % (
+            tierSize, row['variables'], row['constraints'], row['build'], row['solve'], row['status']))
+
+
+# Model size, build and solve time with and without presolve on days where lower priority levels
+# cannot all fit (priority tiers) and on random days
+def benchmarkPresolve(sizes=(50, 100, 200, 500)):
+    print('case\t\tpresolve\tpruned\tvariables\tconstraints\tbuild (s)\tsolve (s)\tobjective\tstatus')
+    for size in sizes:
+        for name, userData in (('tiers' + str(size), priorityTiersUserData(size // 3)), ('random' + str(size), generateUserData(size))):
+            for presolve in (False, True):
+                row = benchmarkCase(userData, compactSchedule=True, presolve=presolve)
+                print('%s\t%s\t\t%d\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%.0f\t\t%s' % (
+                    name, presolve, row['pruned'], row['variables'], row['constraints'],
+                    row['build'], row['solve'], row['objective'], row['status']))
+
+
+# Random day whose activities mostly need high or low attention, with numWindows disturbance times
+def disturbanceUserData(numActivities, numWindows, seed=0):
+    rng = random.Random(seed)
+    userData = generateUserData(numActivities, seed=seed)
+    endTime = userData['schedule-time'][0].endTime
+    windowLength = max(10, endTime // (2 * max(1, numWindows)))
+    userData['disturbance-marked-times'] = [
+        DisturbanceMarkedTimes(rng.choice(['high', 'low']), start, start + windowLength)
+        for start in sorted(rng.sample(range(0, endTime - windowLength), numWindows))]
+    userData['activities'] = [Activity(activity.name, activity.duration, startTime=activity.startTime,
+                                       groupName=activity.groupName, priority=activity.priority,
+                                       attentionRequired=rng.choice([1, 1, 2, 3, 3]))
+                              for activity in userData['activities']]
+    return userData
+
+
+# Model size and solve time as the number of disturbance times grows
+def benchmarkDisturbance(numActivities=200, windowCounts=(0, 10, 25, 50)):
+    print('windows\t\tvariables\tconstraints\tbuild (s)\tsolve (s)\tobjective\tstatus')
+    for numWindows in windowCounts:
+        row = benchmarkCase(disturbanceUserData(numActivities, numWindows), compactSchedule=True)
+        print('%d\t\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%.0f\t\t%s' % (
+            numWindows, row['variables'], row['constraints'], row['build'], row['solve'], row['objective'], row['status']))
+
+
+# Team day: numPeople people with activitiesPerPerson activities each, a tenth of them meetings of
+# 2 to 4 people in one of the rooms (capacity 1, the last room holds 3 meetings at once)
+# Each person's activities slightly overflow the schedule
+# With teams, the people are split into that many teams, each meeting in numRooms rooms of its own
+def teamUserData(numPeople, activitiesPerPerson, numRooms=None, seed=0, teams=1):
+    rng = random.Random(seed)
+    teamSize = -(-numPeople // teams)
+    numRooms = numRooms or max(1, teamSize // 5)
+    people = ['P' + str(i) for i in range(numPeople)]
+    endTime = int(activitiesPerPerson * 17.5 / 1.2)
+
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, endTime)]
+    userData['resources'] = [Resource(person) for person in people]
+
+    def addActivity(resources):
+        userData['activities'].append(Activity(
+            'A' + str(len(userData['activities'])),
+            rng.randint(5, 30),
+            priority=rng.choice([1, 2, 3, 3]),
+            resources=resources,
+        ))
+
+    remaining = dict.fromkeys(people, activitiesPerPerson)
+    for first in range(0, numPeople, teamSize):
+        members = people[first:first + teamSize]
+        rooms = ['R' + str(len(userData['resources']) - numPeople + i) for i in range(numRooms)]
+        userData['resources'] += [Resource(room, capacity=3 if i == numRooms - 1 else 1) for i, room in enumerate(rooms)]
+        if len(members) < 2:
+            continue
+        for _ in range(len(members) * activitiesPerPerson // 10):
+            available = [person for person in members if remaining[person] > 0]
+            if len(available) < 2:
+                break
+            attendees = rng.sample(available, rng.randint(2, min(4, len(available))))
+            for attendee in attendees:
+                remaining[attendee] -= 1
+            addActivity(attendees + [rng.choice(rooms)])
+    for person in people:
+        for _ in range(remaining[person]):
+            addActivity([person])
+    return userData
+
+
+# Model size and solve time of team days as the number of people grows
+def benchmarkTeam(teamSizes=(5, 10, 20, 50), activitiesPerPerson=20):
+    print('people\tactivities\tvariables\tconstraints\tbuild (s)\tsolve (s)\tobjective\tstatus')
+    for numPeople in teamSizes:
+        userData = teamUserData(numPeople, activitiesPerPerson)
+        row = benchmarkCase(userData, compactSchedule=True)
+        print('%d\t%d\t\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%.0f\t\t%s' % (
+            numPeople, len(userData['activities']), row['variables'], row['constraints'],
+            row['build'], row['solve'], row['objective'], row['status']))
+
+
+# One model versus solveDecomposed on team days of teams of 5 people, which split into one component per team
+def benchmarkDecomposition(teamSizes=(10, 50, 100), activitiesPerPerson=20):
+    config = SolverConfig(maxTimeInSeconds=SOLVE_TIME_LIMIT)
+    print('people\tactivities\tcomponents\tone model (s)\tobjective\tstatus\t\tdecomposed (s)\tobjective\tstatus')
+    for numPeople in teamSizes:
+        userData = teamUserData(numPeople, activitiesPerPerson, teams=numPeople // 5)
+        start = time.time()
+        whole = ScheduleTasks(userData, solverConfig=config).solve()
+        wholeTime = time.time() - start
+        decomposed = solveDecomposed(userData, solverConfig=config)
+        print('%d\t%d\t\t%d\t\t%.3f\t\t%s\t%s\t\t%.3f\t\t%s\t%s' % (
+            numPeople, len(userData['activities']), decomposed.decomposition['components'], wholeTime,
+            whole.objective, whole.status, decomposed.wallTime, decomposed.objective, decomposed.status))
+
+
+# Run time and objective of rolling horizon solves (one day windows, half a day of lookahead) as the
+# plan grows, against one model of the whole plan given as much time as all the windows together
+def benchmarkRollingHorizon(dayCounts=(1, 2, 5, 10, 20), activitiesPerDay=20, windowTimeLimit=2.0):
+    print('days\tactivities\tone model (s)\tobjective\tstatus\t\trolling (s)\tobjective\tdropped')
+    for numDays in dayCounts:
+        userData = multiDayUserData(numDays, activitiesPerDay)
+        config = SolverConfig(maxTimeInSeconds=windowTimeLimit * numDays, numSearchWorkers=1)
+        start = time.time()
+        whole = ScheduleTasks(userData, solverConfig=config).solve(keepSolutions=0)
+        wholeTime = time.time() - start
+        rolling = solveRollingHorizon(userData, DAY_LENGTH, windowConfig=config.replace(maxTimeInSeconds=windowTimeLimit))
+        print('%d\t%d\t\t%.3f\t\t%s\t%s\t\t%.3f\t\t%s\t%d' % (
+            numDays, len(userData['activities']), wholeTime, whole.objective, whole.status,
+            rolling.wallTime, rolling.objective, rolling.horizon['dropped-by-cascade']))
+
+
+# Re-solve time after changing one activity, cold versus warm started from the previous schedule
+def benchmarkWarmStart(sizes=(50, 100, 200, 500)):
+    config = SolverConfig(maxTimeInSeconds=SOLVE_TIME_LIMIT, numSearchWorkers=1)
+    print('activities\tfirst (s)\tcold (s)\twarm (s)\tcold objective\twarm objective')
+    for size in sizes:
+        userData = generateUserData(size)
+        previous = ScheduleTasks(userData, solverConfig=config).solve()
+
+        # Lengthen one activity by 5 minutes
+        edited = dict(userData)
+        edited['activities'] = list(userData['activities'])
+        activity = edited['activities'][size // 2]
+        edited['activities'][size // 2] = Activity(activity.name, activity.duration + 5, startTime=activity.startTime,
+            groupName=activity.groupName, priority=activity.priority, attentionRequired=activity.attentionRequired,
+            resources=activity.resources)
+
+        cold = ScheduleTasks(edited, solverConfig=config).solve()
+        warmScheduler = ScheduleTasks(edited, solverConfig=config)
+        warmScheduler.warmStart(previous)
+        warm = warmScheduler.solve()
+        print('%d\t\t%.3f\t\t%.3f\t\t%.3f\t\t%s\t\t%s' % (
+            size, previous.wallTime, cold.wallTime, warm.wallTime, cold.objective, warm.objective))
+
+
+# Greedy schedule time, and solves under a short time limit without and with greedy (hint and fallback)
+def benchmarkGreedy(sizes=(100, 1000, 10000), timeLimit=1.0):
+    config = SolverConfig(maxTimeInSeconds=timeLimit, numSearchWorkers=1)
+    print('activities\tgreedy (s)\tplaced\tplain objective\tstatus\t\tgreedy objective\tstatus\t\tfallback')
+    for size in sizes:
+        userData = generateUserData(size)
+        start = time.time()
+        starts = greedySchedule(userData)
+        greedyTime = time.time() - start
+        plain = ScheduleTasks(userData, solverConfig=config).solve(keepSolutions=0)
+        withGreedy = ScheduleTasks(userData, solverConfig=config, greedy=True).solve(keepSolutions=0)
+        print('%d\t\t%.3f\t\t%d\t%s\t\t%s\t\t%s\t\t%s\t%s' % (
+            size, greedyTime, len([start for start in starts if start is not None]), plain.objective, plain.status,
+            withGreedy.objective, withGreedy.status, withGreedy.fallback))
+
+
+# Where build and solve time go as the day grows: time and model growth of every build phase, and
+# the CP-SAT stats of the solve; the trace of the largest day is written to tracePath
+def benchmarkProfile(sizes=(100, 1000, 5000), tracePath='profile_trace.json'):
+    config = SolverConfig(maxTimeInSeconds=SOLVE_TIME_LIMIT, numSearchWorkers=1)
+    for size in sizes:
+        scheduler = ScheduleTasks(generateUserData(size), solverConfig=config, profile=True)
+        profile = scheduler.solve(keepSolutions=0).profile
+        print('%d activities: %s' % (size, profile['model']))
+        print('phase\t\t\tcalls\ttime (s)\tvariables\tintervals\tconstraints')
+        for name, counters in profile['build'].items():
+            print('%-20s\t%d\t%.3f\t\t%d\t\t%d\t\t%d' % (
+                name, counters['calls'], counters['time'], counters['variables'], counters['intervals'], counters['constraints']))
+        for solve in profile['solves']:
+            print('solve: %s in %.3f s, presolve %s s, first solution %s s, %d branches, %d conflicts' % (
+                solve['status'], solve['wall-time'], solve['presolve-time'], solve['first-solution-time'],
+                solve['branches'], solve['conflicts']))
+        print()
+    scheduler.profiler.writeTrace(tracePath)
+
+
+# Model build time of large generated days, with and without presolve and variable names
+def benchmarkBuild(sizes=(1000, 10000, 20000)):
+    print('activities\tvariables\tconstraints\tbuild (s)\tno presolve (s)\twith names (s)')
+    for size in sizes:
+        userData = generateUserData(size, seed=1, numDisturbanceTimes=8, numBuffers=20)
+        times = []
+        for arguments in ({}, {'presolve': False}, {'variableNames': True}):
+            start = time.time()
+            scheduler = ScheduleTasks(userData, **arguments)
+            times.append(time.time() - start)
+            if not arguments:
+                proto = scheduler.model.Proto()
+        print('%d\t\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%.3f' % (
+            size, len(proto.variables), len(proto.constraints), times[0], times[1], times[2]))
+
+
+# Model of one routine for many users, differing only in their fixed start times: built for every
+# user (without presolve, which depends on the fixed start times) or instantiated from a template
+# saved once and memory-mapped
+def benchmarkTemplate(sizes=(1000, 10000, 20000), numUsers=5, templatePath='benchmark_template.bin'):
+    print('activities\tfile (MB)\tbuild (s)\tload (s)\tinstantiate (s)')
+    for size in sizes:
+        routine = generateUserData(size, seed=1, numDisturbanceTimes=8, numBuffers=20, fixedStartShare=0.1)
+        ModelTemplate.build(routine).save(templatePath)
+        start = time.time()
+        template = ModelTemplate.load(templatePath)
+        loadTime = time.time() - start
+        buildTime = instantiateTime = 0.0
+        for user in range(numUsers):
+            rng = random.Random(user)
+            userData = dict(routine)
+            userData['activities'] = [
+                activity if activity.startTime is None else
+                Activity(activity.name, activity.duration, startTime=rng.randint(0, routine['schedule-time'][0].endTime - activity.duration),
+                         groupName=activity.groupName, priority=activity.priority, attentionRequired=activity.attentionRequired)
+                for activity in routine['activities']]
+            start = time.time()
+            ScheduleTasks(userData, presolve=False)
+            buildTime += time.time() - start
+            start = time.time()
+            template.instantiate(userData)
+            instantiateTime += time.time() - start
+        print('%d\t\t%.1f\t\t%.3f\t\t%.4f\t\t%.3f' % (
+            size, os.path.getsize(templatePath) / 1e6, buildTime / numUsers, loadTime, instantiateTime / numUsers))
+    os.remove(templatePath)
+
+
+# Throughput of solveMany with 1 up to os.cpu_count() worker processes
+def benchmarkBatch(numCases=40, caseSize=40):
+    cases = [generateUserData(caseSize, seed=seed) for seed in range(numCases)]
+    config = SolverConfig(maxTimeInSeconds=SOLVE_TIME_LIMIT)
+    print('workers\tcases/s\t\terrors')
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.time()
+        results = list(solveMany(cases, workers=workers, solverConfig=config))
+        elapsed = time.time() - start
+        errors = len([batchResult for batchResult in results if batchResult.result.status == 'ERROR'])
+        print('%d\t%.2f\t\t%d' % (workers, numCases / elapsed, errors))
+        workers *= 2
+
+
+# Generated days of the suite as (name, generateUserData arguments); the seeds are fixed, so the
+# reports of two runs compare instance by instance
+SUITE_SIZES = (50, 200)
+SUITE_PROFILES = [
+    ('plain', {}),
+    ('tight-groups', {'numGroups': 4, 'groupShare': 0.7, 'groupTightness': 1.5}),
+    ('disturbance', {'numDisturbanceTimes': 10, 'attentionShare': 0.8}),
+    ('fixed-starts', {'fixedStartShare': 0.3, 'numBuffers': 5}),
+    ('priority-levels', {'priorityWeights': (1, 1, 1, 1, 1), 'load': 2.0}),
+]
+SUITE = [('%s-%d' % (profile, size), dict(arguments, numActivities=size))
+         for profile, arguments in SUITE_PROFILES for size in SUITE_SIZES]
+
+
+# Runs in a process of its own (see benchmarkSuite): build and solve one suite instance with one
+# search worker, a fixed seed and a deterministic time limit, so that the schedule found does not
+# depend on the machine's speed; peak memory is the peak resident size of the process
+def suiteCase(arguments, timeLimit):
+    userData = generateUserData(**arguments)
+    start = time.time()
+    scheduler = ScheduleTasks(userData)
+    buildTime = time.time() - start
+    modelProto = scheduler.model.Proto()
+    config = SolverConfig(maxDeterministicTime=timeLimit, numSearchWorkers=1, randomSeed=0)
+    start = time.time()
+    result = scheduler.solve(solverConfig=config, keepSolutions=0)
+    solveTime = time.time() - start
+    gap = None
+    if result.objective is not None and result.bound is not None:
+        gap = abs(result.objective - result.bound) / max(1.0, abs(result.objective))
+    return {
+        'arguments': arguments,
+        'activities': len(userData['activities']) + len(userData['buffer-times']),
+        'variables': len(modelProto.variables),
+        'constraints': len(modelProto.constraints),
+        'build': buildTime,
+        'solve': solveTime,
+        'status': result.status,
+        'objective': result.objective,
+        'bound': result.bound,
+        'gap': gap,
+        # ru_maxrss is in KiB on Linux
+        'peak-memory-mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+# Run the suite and write a JSON report to reportPath; with baselinePath, print how every instance
+# changed against that earlier report
+# Each instance is solved in a new process, so that its peak memory is its own
+def benchmarkSuite(reportPath='benchmark_report.json', baselinePath=None, timeLimit=SOLVE_TIME_LIMIT):
+    instances = {}
+    print('instance\t\tvariables\tconstraints\tbuild (s)\tsolve (s)\tobjective\tgap\tmemory (MB)\tstatus')
+    for name, arguments in SUITE:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            row = pool.submit(suiteCase, arguments, timeLimit).result()
+        instances[name] = row
+        print('%-20s\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%s\t%s\t%.0f\t\t%s' % (
+            name, row['variables'], row['constraints'], row['build'], row['solve'], row['objective'],
+            'n/a' if row['gap'] is None else '%.3f' % row['gap'], row['peak-memory-mb'], row['status']))
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'ortools': ortools.__version__,
+        'deterministic-time-limit': timeLimit,
+        'instances': instances,
+    }
+    with open(reportPath, 'w') as reportFile:
+        json.dump(report, reportFile, indent=2)
+    if baselinePath is not None:
+        with open(baselinePath) as baselineFile:
+            compareReports(json.load(baselineFile), report)
+    return report
+
+
+# Print baseline -> report for the instances both reports hold, marking worse objectives
+def compareReports(baseline, report):
+    print('instance\t\tbuild (s)\t\tsolve (s)\t\tvariables\tobjective')
+    for name, row in report['instances'].items():
+        old = baseline['instances'].get(name)
+        if old is None:
+            continue
+        worse = old['objective'] is not None and (row['objective'] is None or row['objective'] > old['objective'])
+        print('%-20s\t%.3f -> %.3f\t%.3f -> %.3f\t%d -> %d\t%s -> %s%s' % (
+            name, old['build'], row['build'], old['solve'], row['solve'], old['variables'], row['variables'],
+            old['objective'], row['objective'], '\tWORSE' if worse else ''))
+
+
+def main(sizes):
+    print('activities\tcompact\tvariables\tconstraints\tbuild (s)\tsolve (s)\tstatus')
+    for size in sizes:
+        userData = generateUserData(size)
+        for compactSchedule in (False, True):
+            row = benchmarkCase(userData, compactSchedule)
+            print('%d\t\t%s\t%d\t\t%d\t\t%.3f\t\t%.3f\t\t%s' % (
+                size, compactSchedule, row['variables'], row['constraints'],
+                row['build'], row['solve'], row['status']))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['order']:
+        benchmarkOrderChanges()
+    elif sys.argv[1:] == ['priority']:
+        benchmarkPriorityTiers()
+    elif sys.argv[1:] == ['warmstart']:
+        benchmarkWarmStart()
+    elif sys.argv[1:] == ['batch']:
+        benchmarkBatch()
+    elif sys.argv[1:] == ['presolve']:
+        benchmarkPresolve()
+    elif sys.argv[1:] == ['disturbance']:
+        benchmarkDisturbance()
+    elif sys.argv[1:] == ['team']:
+        benchmarkTeam()
+    elif sys.argv[1:] == ['decompose']:
+        benchmarkDecomposition()
+    elif sys.argv[1:] == ['rolling']:
+        benchmarkRollingHorizon()
+    elif sys.argv[1:] == ['greedy']:
+        benchmarkGreedy()
+    elif sys.argv[1:] == ['profile']:
+        benchmarkProfile()
+    elif sys.argv[1:] == ['build']:
+        benchmarkBuild()
+    elif sys.argv[1:] == ['template']:
+        benchmarkTemplate()
+    elif sys.argv[1:2] == ['suite']:
+        # benchmark.py suite [report.json [baseline.json]]
+        benchmarkSuite(*sys.argv[2:4])
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
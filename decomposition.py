@@ -0,0 +1,336 @@
+import collections
+import concurrent.futures
+import math
+import os
+import time
+
+from batch import splitCores
+from input_interfaces import Attention, BufferTime, Disturbance, resourcesOf, validateUserData
+from presolve import tracksOf
+from scheduler import ScheduleTasks
+from solve_result import ScheduledActivity, SolveResult
+from solver_config import SolverConfig
+
+
+# Result of one component solve: indices into buffer-times + activities of the whole day of the
+# component's buffers and activities (in its model order), its SolveResult and the start of each
+# of them (None if not fitted, or every one None when the solve found nothing)
+ComponentSolve = collections.namedtuple('ComponentSolve', 'indices, result, starts')
+
+
+# Independent parts of one day
+# Two buffers or activities interact when they share a track (the schedule's own track or a
+# resource) and the times they may take overlap; every set of activities connected that way is a
+# component, and nothing but the priority cascade links one component to another
+# Activities that fit none of their windows can never be present and belong to no component
+class Decomposition:
+    def __init__(self, userData):
+        self.userData = userData
+        self.activities = userData['buffer-times'] + userData['activities']
+        self.capacities = {None: 1}
+        self.capacities.update((resource.name, resource.capacity) for resource in resourcesOf(userData))
+
+        groupWindows = {group.name: (group.startTime, group.endTime) for group in userData['activity-groups']}
+        spans = [_span(activity, userData, groupWindows) for activity in self.activities]
+        self.neverFitting = [index for index, span in enumerate(spans) if span is None]
+
+        # Union the activities of each track whose spans overlap, sweeping them by start
+        parents = list(range(len(self.activities)))
+        spansByTrack = collections.defaultdict(list)
+        for index, span in enumerate(spans):
+            if span is not None:
+                for track in tracksOf(self.activities[index]):
+                    spansByTrack[track].append((span[0], span[1], index))
+        for trackSpans in spansByTrack.values():
+            trackSpans.sort()
+            reach = None
+            for spanStart, spanEnd, index in trackSpans:
+                if reach is not None and spanStart < reach[0]:
+                    _union(parents, reach[1], index)
+                    reach = (max(reach[0], spanEnd), reach[1])
+                else:
+                    reach = (spanEnd, index)
+
+        componentsByRoot = collections.OrderedDict()
+        for index, span in enumerate(spans):
+            if span is not None:
+                componentsByRoot.setdefault(_find(parents, index), []).append(index)
+        # Each component is a list of indices in increasing order, so buffers come first as in a model
+        self.components = list(componentsByRoot.values())
+
+        # Tracks whose activities are spread over more than one component
+        componentsByTrack = collections.defaultdict(set)
+        for position, component in enumerate(self.components):
+            for index in component:
+                for track in tracksOf(self.activities[index]):
+                    componentsByTrack[track].add(position)
+        self.splitTracks = set(track for track, positions in componentsByTrack.items() if len(positions) > 1)
+
+    # userData of the buffers and activities at indices (increasing), with the groups and resources they use
+    def componentUserData(self, indices):
+        activities = [self.activities[index] for index in indices]
+        groupNames = set(getattr(activity, 'groupName', None) for activity in activities)
+        resourceNames = set(track for activity in activities for track in tracksOf(activity))
+        return {
+            'schedule-time': self.userData['schedule-time'],
+            'buffer-times': [activity for activity in activities if isinstance(activity, BufferTime)],
+            'activity-groups': [group for group in self.userData['activity-groups'] if group.name in groupNames],
+            'activities': [activity for activity in activities if not isinstance(activity, BufferTime)],
+            'disturbance-marked-times': self.userData['disturbance-marked-times'],
+            'resources': [resource for resource in resourcesOf(self.userData) if resource.name in resourceNames],
+        }
+
+    # Total capacity of the tracks of a model of the buffers and activities at indices, which
+    # has the schedule's own track and one per resource they use
+    def totalCapacity(self, indices):
+        resourceNames = set(track for index in indices for track in tracksOf(self.activities[index]) if track is not None)
+        return 1 + sum(self.capacities[name] for name in resourceNames)
+
+
+# (first start, last end) of the times an activity may take, None if it fits none of them
+def _span(activity, userData, groupWindows):
+    if activity.startTime is not None:
+        return activity.startTime, activity.startTime + activity.duration
+    scheduleTime = userData['schedule-time'][0]
+    windows = [(scheduleTime.startTime, scheduleTime.endTime)]
+    if not isinstance(activity, BufferTime):
+        if activity.groupName is not None:
+            windows = [groupWindows[activity.groupName]]
+        disturbance = {Attention.HIGH: Disturbance.LOW, Attention.LOW: Disturbance.HIGH}.get(activity.attentionRequired)
+        windows += [(dis.startTime, dis.endTime) for dis in userData['disturbance-marked-times'] if dis.disturbance == disturbance]
+    windows = [(start, end) for start, end in windows if end - start >= activity.duration]
+    if not windows:
+        return None
+    return min(start for start, _ in windows), max(end for _, end in windows)
+
+
+def _find(parents, index):
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def _union(parents, first, second):
+    parents[_find(parents, second)] = _find(parents, first)
+
+
+# Solve userData as independent components (see Decomposition), in parallel across workers
+# processes (default os.cpu_count(); with one worker they are solved one after another in this process)
+# The component schedules are stitched into one and reconciled with the priority cascade across
+# components: activities of levels after the first level some component leaves incomplete must go,
+# so components that placed such activities are solved again without them, warm started from their
+# schedule, until no component does
+# With a time limit in solverConfig the whole solve keeps to it: each component gets a share of
+# the remaining time in proportion to its number of activities
+# The result is OPTIMAL only when it provably is: every component solve was optimal, the
+# reconcile removed nothing and, for compact schedules, no track is split over components (the
+# idle time of a track depends on its last activity, which only one of its components holds)
+# A day that does not split is solved as one model, as is one with penalizeOrderChanges, whose
+# order indicators link every pair of consecutive activities
+def solveDecomposed(userData, compactSchedule=True, penalizeOrderChanges=False, solverConfig=None, mode='weighted',
+                    workers=None):
+    startTime = time.time()
+    validateUserData(userData)
+    solverConfig = solverConfig or SolverConfig()
+    decomposition = Decomposition(userData)
+    report = {
+        'components': len(decomposition.components),
+        'largest': max([len(component) for component in decomposition.components] or [0]),
+        'never-fitting': len(decomposition.neverFitting),
+        'reconciled-levels': [],
+        're-solved': 0,
+        'solver-time': 0.0,
+    }
+    if penalizeOrderChanges or (len(decomposition.components) == 1 and not decomposition.neverFitting):
+        result = ScheduleTasks(userData, compactSchedule=compactSchedule, penalizeOrderChanges=penalizeOrderChanges,
+                               solverConfig=solverConfig).solve(mode=mode)
+        report['solver-time'] = result.wallTime
+        result.decomposition = report
+        return result
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(decomposition.components)))
+    componentConfig = splitCores(solverConfig, workers)
+    deadline = None if solverConfig.maxTimeInSeconds is None else startTime + solverConfig.maxTimeInSeconds
+    jobs = [(indices, None) for indices in decomposition.components]
+    solves = _solveComponents(decomposition, jobs, compactSchedule, componentConfig, mode, workers, deadline)
+    report['solver-time'] += sum(solve.result.wallTime for solve in solves)
+    firstSolves = list(solves)
+
+    # Reconcile the priority cascade across components, see above
+    while True:
+        starts = _stitchedStarts(decomposition, solves)
+        blockedPriority = min([decomposition.activities[index].priority
+                               for index, start in enumerate(starts) if start is None] or [None])
+        violating = [position for position, solve in enumerate(solves)
+                     if blockedPriority is not None and any(
+                         start is not None and decomposition.activities[index].priority > blockedPriority
+                         for index, start in zip(solve.indices, solve.starts))]
+        if not violating:
+            break
+        report['reconciled-levels'].append(int(blockedPriority))
+        report['re-solved'] += len(violating)
+        jobs = []
+        for position in violating:
+            indices = [index for index in solves[position].indices
+                       if decomposition.activities[index].priority <= blockedPriority]
+            jobs.append((indices, [starts[index] for index in indices]))
+        for position, solve in zip(violating, _solveComponents(decomposition, jobs, compactSchedule, componentConfig,
+                                                               mode, workers, deadline)):
+            solves[position] = solve
+            report['solver-time'] += solve.result.wallTime
+
+    return _stitchedResult(decomposition, firstSolves, solves, starts, compactSchedule, mode, solverConfig,
+                           time.time() - startTime, report)
+
+
+# Runs in a worker process of solveDecomposed (or in the calling process): build and solve one component
+# options is a (compactSchedule, solverConfig, mode, hint) tuple, hint the starts of a previous
+# schedule of the component (or None); returns the SolveResult and the start of each activity
+# A hinted schedule only lost activities, so it is still valid: when the time runs out before a
+# schedule is found, the hinted one is taken as it is
+def solveComponent(userData, options):
+    compactSchedule, solverConfig, mode, hint = options
+    scheduler = ScheduleTasks(userData, compactSchedule=compactSchedule, solverConfig=solverConfig)
+    if hint is not None:
+        scheduler.warmStart(hint)
+    result = scheduler.solve(mode=mode, keepSolutions=0)
+    if hint is not None and not result.hasSolution():
+        scheduler.solver.parameters.fix_variables_to_their_hinted_value = True
+        result = scheduler.solve(mode=mode, keepSolutions=0, solverConfig=solverConfig.replace(maxTimeInSeconds=None))
+    return result, scheduler.activityStarts()
+
+
+# ComponentSolves of jobs, (indices, hint) pairs, in the order of jobs
+# The largest components are started first; each job's time limit is fixed as it starts
+def _solveComponents(decomposition, jobs, compactSchedule, solverConfig, mode, workers, deadline):
+    # A component the reconcile emptied still counts as one activity
+    def size(position):
+        return max(1, len(jobs[position][0]))
+    pendingSize = sum(size(position) for position in range(len(jobs)))
+
+    def jobArguments(position):
+        nonlocal pendingSize
+        indices, hint = jobs[position]
+        config = solverConfig
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.time())
+            config = solverConfig.replace(maxTimeInSeconds=remaining * min(1.0, workers * size(position) / pendingSize))
+        pendingSize -= size(position)
+        return decomposition.componentUserData(indices), (compactSchedule, config, mode, hint)
+
+    order = collections.deque(sorted(range(len(jobs)), key=lambda position: -size(position)))
+    outputs = [None] * len(jobs)
+    if workers == 1 or len(jobs) == 1:
+        for position in order:
+            outputs[position] = solveComponent(*jobArguments(position))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            # future -> position in jobs; only workers jobs run at a time, so that time limits
+            # are shared out as jobs actually start
+            pending = {}
+            while order or pending:
+                while order and len(pending) < workers:
+                    position = order.popleft()
+                    pending[pool.submit(solveComponent, *jobArguments(position))] = position
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    outputs[pending.pop(future)] = future.result()
+
+    solves = []
+    for (indices, _), (result, starts) in zip(jobs, outputs):
+        solves.append(ComponentSolve(indices, result, starts if starts is not None else [None] * len(indices)))
+    return solves
+
+
+# Start of every buffer and activity of the day (None if not fitted) in the component schedules
+def _stitchedStarts(decomposition, solves):
+    starts = [None] * len(decomposition.activities)
+    for solve in solves:
+        for index, start in zip(solve.indices, solve.starts):
+            starts[index] = start
+    return starts
+
+
+# SolveResult of the whole day from the component schedules
+# Penalties and objective are those of the whole day's model for the stitched schedule; the bound
+# adds up the first component solves, each taken to the scale of the whole day's objective
+def _stitchedResult(decomposition, firstSolves, solves, starts, compactSchedule, mode, solverConfig, wallTime, report):
+    activities = decomposition.activities
+    scheduleTime = decomposition.userData['schedule-time'][0]
+    scheduleLength = scheduleTime.endTime - scheduleTime.startTime
+
+    penalties = collections.OrderedDict()
+    penalties['not present'] = len([start for start in starts if start is None])
+    penalties['second choice'] = sum(solve.result.penalties.get('second choice', 0)
+                                     for solve in solves if solve.result.hasSolution())
+    # Idle time of each track up to its last present activity (see ScheduleTasks.getActivitiesInBetweenGapsPenalty)
+    if compactSchedule:
+        lastEnds = {}
+        presentDurations = collections.Counter()
+        for activity, start in zip(activities, starts):
+            if start is not None:
+                for track in tracksOf(activity):
+                    lastEnds[track] = max(lastEnds.get(track, start), start + activity.duration)
+                    presentDurations[track] += activity.duration
+        penalties['gaps'] = sum(decomposition.capacities[track] * (lastEnd - scheduleTime.startTime) - presentDurations[track]
+                                for track, lastEnd in lastEnds.items())
+
+    # Scale of the penalties before gaps in a model of the whole day and in the model of each component
+    def scale(totalCapacity):
+        return scheduleLength * totalCapacity + 1 if compactSchedule else 1
+    daysScale = scale(sum(decomposition.capacities.values()))
+    objective = daysScale * (penalties['not present'] + 120 * penalties['second choice']) + penalties.get('gaps', 0)
+
+    solved = [solve for solve in solves if solve.result.hasSolution()]
+    exact = (len(solved) == len(solves)
+             and all(solve.result.status == 'OPTIMAL' for solve in solves)
+             and not report['reconciled-levels']
+             and not (compactSchedule and decomposition.splitTracks))
+    if not solves or exact:
+        status = 'OPTIMAL'
+    elif solved:
+        status = 'FEASIBLE'
+    else:
+        status = solves[0].result.status
+
+    # Within a component, penalties before gaps weigh more than any idle time it can have, so
+    # a component bound b splits into at least b // componentScale of them plus the rest
+    bound = None
+    if mode == 'weighted':
+        bound = daysScale * len(decomposition.neverFitting)
+        for solve in firstSolves:
+            if solve.result.bound is None:
+                continue
+            componentBound = math.ceil(solve.result.bound - 1e-6)
+            componentScale = scale(decomposition.totalCapacity(solve.indices))
+            splitGaps = compactSchedule and any(track in decomposition.splitTracks
+                                                for index in solve.indices for track in tracksOf(activities[index]))
+            bound += daysScale * (componentBound // componentScale) + (0 if splitGaps else componentBound % componentScale)
+    else:
+        # The lexicographic objective is the penalty of the last stage
+        stageNames = set(stage['name'] for solve in solved for stage in solve.result.stages)
+        lastStage = [terms for name, terms in ScheduleTasks.LEXICOGRAPHIC_STAGES if name in stageNames]
+        if lastStage:
+            objective = sum(penalties.get(term, 0) for term in lastStage[-1])
+        if status == 'OPTIMAL':
+            bound = objective
+
+    placed = [ScheduledActivity(activity.name, start, activity.duration, activity.priority)
+              for activity, start in zip(activities, starts) if start is not None]
+    placed.sort(key=lambda activity: activity.start)
+    unplaced = [ScheduledActivity(activity.name, None, activity.duration, activity.priority)
+                for activity, start in zip(activities, starts) if start is None]
+    result = SolveResult(
+        status=status,
+        objective=objective if solved or not solves else None,
+        bound=bound,
+        wallTime=wallTime,
+        placed=placed,
+        unplaced=unplaced,
+        solutionCount=sum(solve.result.solutionCount for solve in solves),
+        penalties=penalties,
+        solverConfig=solverConfig.asDict(),
+        decomposition=report,
+    )
+    return result
@@ -0,0 +1,158 @@
+from input_interfaces import (Activity, ActivityGroup, BufferTime, DisturbanceMarkedTimes, InvalidInputError,
+                              ScheduleTime, resourcesOf)
+from scheduler import ScheduleTasks
+from solve_result import ScheduledActivity, SolveResult
+
+
+def _ceil(value, slotMinutes):
+    return -(-value // slotMinutes)
+
+
+# userData expressed in slots of slotMinutes, for long horizons where minute resolution makes
+# the model needlessly large
+# Rounding is conservative, so every schedule of the scaled day is valid in minutes:
+#   durations are rounded up, schedule, group and disturbance windows are shrunk to whole slots
+#   and a fixed start activity takes every slot it touches
+# Disturbance times whose window holds no whole slot are left out of the scaled day
+# Activities that cannot be expressed in slots (of a group whose window holds no whole slot, or no
+# longer fitting the scaled schedule) are kept as placeholders listed in absent: a ScheduleTasks of
+# the scaled day must keep them never present (ScheduleTasks(absent=...)), so that their priority
+# level stays incomplete and holds back the later levels as it would in minutes
+class TimeScale:
+    def __init__(self, userData, slotMinutes):
+        if not isinstance(slotMinutes, int) or slotMinutes < 1:
+            raise InvalidInputError('slotMinutes must be a positive int, got ' + repr(slotMinutes))
+        self.slotMinutes = slotMinutes
+        self.userData = userData
+        # Index into buffer-times + activities of userData of each scaled buffer and activity
+        self.originalIndices = []
+        # Placeholders of the buffers and activities that cannot be expressed in slots
+        self.absent = []
+
+        scheduleTime = userData['schedule-time'][0]
+        self.startSlot = _ceil(scheduleTime.startTime, slotMinutes)
+        self.endSlot = scheduleTime.endTime // slotMinutes
+        if self.endSlot <= self.startSlot:
+            raise InvalidInputError('The schedule time holds no whole slot of %d minutes' % slotMinutes)
+
+        groups = []
+        for group in userData['activity-groups']:
+            window = self._innerWindow(group.startTime, group.endTime)
+            if window is not None:
+                groups.append(ActivityGroup(group.name, *window))
+        groupNames = set(group.name for group in groups)
+        disturbanceTimes = []
+        for dis in userData['disturbance-marked-times']:
+            window = self._innerWindow(dis.startTime, dis.endTime)
+            if window is not None:
+                disturbanceTimes.append(DisturbanceMarkedTimes(dis.disturbance, *window))
+
+        buffers = []
+        activities = []
+        for index, activity in enumerate(userData['buffer-times'] + userData['activities']):
+            isBuffer = isinstance(activity, BufferTime)
+            startTime, duration = self._scaledPlacement(activity)
+            expressible = isBuffer or activity.groupName is None or activity.groupName in groupNames
+            if startTime is None:
+                expressible = expressible and duration <= self.endSlot - self.startSlot
+            else:
+                expressible = expressible and self.startSlot <= startTime and startTime + duration <= self.endSlot
+            if not expressible:
+                # Any valid placement will do, the placeholder is never present
+                startTime, duration, groupName = None, 1, None
+            else:
+                groupName = None if isBuffer else activity.groupName
+            if isBuffer:
+                scaled = BufferTime(duration, startTime=startTime)
+                buffers.append(scaled)
+            else:
+                scaled = Activity(activity.name, duration, startTime=startTime, groupName=groupName,
+                                  priority=activity.priority, attentionRequired=activity.attentionRequired,
+                                  resources=activity.resources)
+                activities.append(scaled)
+            if not expressible:
+                self.absent.append(scaled)
+            self.originalIndices.append(index)
+
+        self.scaledUserData = {
+            'schedule-time': [ScheduleTime(self.startSlot, self.endSlot)],
+            'buffer-times': buffers,
+            'activity-groups': groups,
+            'activities': activities,
+            'disturbance-marked-times': disturbanceTimes,
+            'resources': list(resourcesOf(userData)),
+        }
+
+    # Largest whole slot window inside [startTime, endTime], None if there is none
+    def _innerWindow(self, startTime, endTime):
+        startSlot = max(_ceil(startTime, self.slotMinutes), self.startSlot)
+        endSlot = min(endTime // self.slotMinutes, self.endSlot)
+        return (startSlot, endSlot) if startSlot < endSlot else None
+
+    # Scaled (start time or None, duration) of a buffer or activity
+    def _scaledPlacement(self, activity):
+        if activity.startTime is None:
+            return None, _ceil(activity.duration, self.slotMinutes)
+        startSlot = activity.startTime // self.slotMinutes
+        return startSlot, _ceil(activity.startTime + activity.duration, self.slotMinutes) - startSlot
+
+    # Starts in minutes of the buffers and activities of userData (None if not fitted), given the
+    # starts in slots of the scaled ones (as returned by ScheduleTasks.activityStarts)
+    def toMinutes(self, scaledStarts):
+        originals = self.userData['buffer-times'] + self.userData['activities']
+        starts = [None] * len(originals)
+        for index, scaledStart in zip(self.originalIndices, scaledStarts):
+            if scaledStart is not None:
+                fixedStart = originals[index].startTime
+                starts[index] = fixedStart if fixedStart is not None else scaledStart * self.slotMinutes
+        return starts
+
+    # SolveResult in minutes for a solve of the scaled day
+    # Objective, bound and penalties stay in the units of the scaled model
+    def resultToMinutes(self, result, scaledStarts):
+        originals = self.userData['buffer-times'] + self.userData['activities']
+        starts = self.toMinutes(scaledStarts or [])
+        placed = [ScheduledActivity(activity.name, start, activity.duration, activity.priority)
+                  for activity, start in zip(originals, starts) if start is not None]
+        placed.sort(key=lambda activity: activity.start)
+        unplaced = [ScheduledActivity(activity.name, None, activity.duration, activity.priority)
+                    for activity, start in zip(originals, starts) if start is None]
+        return SolveResult(
+            status=result.status,
+            objective=result.objective,
+            bound=result.bound,
+            wallTime=result.wallTime,
+            placed=placed,
+            unplaced=unplaced,
+            solutionCount=result.solutionCount,
+            solutions=(),
+            penalties=result.penalties,
+            stages=result.stages,
+            solverConfig=result.solverConfig,
+        )
+
+
+# Solve userData in slots of slotMinutes and map the schedule back to minutes
+# With refine, the minute resolution model is then solved too, warm started from the slot
+# schedule (time limited by refineConfig, default solverConfig); its result is returned when it
+# finds a schedule, with the wall time of both solves
+def solveWithGranularity(userData, slotMinutes, refine=False, compactSchedule=True, penalizeOrderChanges=False,
+                         solverConfig=None, refineConfig=None, mode='weighted'):
+    timeScale = TimeScale(userData, slotMinutes)
+    coarseScheduler = ScheduleTasks(timeScale.scaledUserData, compactSchedule=compactSchedule,
+                                    penalizeOrderChanges=penalizeOrderChanges, solverConfig=solverConfig,
+                                    absent=timeScale.absent)
+    coarse = coarseScheduler.solve(mode=mode, keepSolutions=1)
+    result = timeScale.resultToMinutes(coarse, coarseScheduler.activityStarts())
+    if not refine:
+        return result
+
+    fineScheduler = ScheduleTasks(userData, compactSchedule=compactSchedule, penalizeOrderChanges=penalizeOrderChanges,
+                                  solverConfig=refineConfig or solverConfig)
+    if coarse.hasSolution():
+        fineScheduler.warmStart(timeScale.toMinutes(coarseScheduler.activityStarts()))
+    refined = fineScheduler.solve(mode=mode, keepSolutions=1)
+    if not refined.hasSolution():
+        return result
+    refined.wallTime += coarse.wallTime
+    return refined
@@ -0,0 +1,141 @@
+import bisect
+import collections
+
+from input_interfaces import Attention, BufferTime, Disturbance, resourcesOf
+from presolve import tracksOf
+
+
+# Free time of one unit of a track's capacity, as sorted disjoint (start, end) intervals
+class _Lane:
+    def __init__(self, startTime, endTime):
+        self.starts = [startTime]
+        self.ends = [endTime]
+
+    # Earliest start >= earliest of a free stretch of duration ending by latestEnd, None if there is none
+    def earliestFit(self, earliest, latestEnd, duration):
+        i = bisect.bisect_right(self.ends, earliest)
+        while i < len(self.starts) and self.starts[i] < latestEnd:
+            start = max(self.starts[i], earliest)
+            if start + duration <= min(self.ends[i], latestEnd):
+                return start
+            i += 1
+        return None
+
+    # Take [start, end), which must be free
+    def take(self, start, end):
+        i = bisect.bisect_right(self.starts, start) - 1
+        freeStart, freeEnd = self.starts[i], self.ends[i]
+        pieces = [(a, b) for a, b in ((freeStart, start), (end, freeEnd)) if a < b]
+        self.starts[i:i + 1] = [a for a, _ in pieces]
+        self.ends[i:i + 1] = [b for _, b in pieces]
+
+
+# A track (the schedule's own or a resource) as one lane per unit of capacity: activities kept
+# apart within each lane never overlap more than capacity at a time
+class _Track:
+    def __init__(self, capacity, startTime, endTime):
+        self.lanes = [_Lane(startTime, endTime) for _ in range(capacity)]
+
+    def earliestFit(self, earliest, latestEnd, duration):
+        starts = [start for start in (lane.earliestFit(earliest, latestEnd, duration) for lane in self.lanes)
+                  if start is not None]
+        return min(starts) if starts else None
+
+    def take(self, start, end):
+        lane = next(lane for lane in self.lanes if lane.earliestFit(start, end, end - start) == start)
+        lane.take(start, end)
+
+
+# Starts of a schedule of userData found without the solver (None for activities not fitted), in
+# the order of buffer-times + activities, e.g. to warm start ScheduleTasks
+# It keeps every rule of ScheduleTasks, so the schedule is always valid: priority levels are placed
+# in order, stopping after the first level not placed whole (no later level may then be present);
+# within a level fixed start activities come first, then movable ones by how early their windows
+# close, each at the earliest start free on all its tracks, preferring its wanted windows
+# (group or schedule time) to its second choice disturbance times
+# Runs in O(n log n) for n activities plus the free stretches scanned on each track
+def greedySchedule(userData):
+    scheduleTime = userData['schedule-time'][0]
+    startTime, endTime = scheduleTime.startTime, scheduleTime.endTime
+    groupWindows = {group.name: (group.startTime, group.endTime) for group in userData['activity-groups']}
+    disturbanceWindows = {
+        Attention.HIGH: sorted((dis.startTime, dis.endTime) for dis in userData['disturbance-marked-times'] if dis.disturbance == Disturbance.LOW),
+        Attention.LOW: sorted((dis.startTime, dis.endTime) for dis in userData['disturbance-marked-times'] if dis.disturbance == Disturbance.HIGH),
+    }
+    tracks = {None: _Track(1, startTime, endTime)}
+    tracks.update((resource.name, _Track(resource.capacity, startTime, endTime)) for resource in resourcesOf(userData))
+
+    activities = userData['buffer-times'] + userData['activities']
+    choicesByIndex = {index: _windowChoices(activity, startTime, endTime, groupWindows, disturbanceWindows)
+                      for index, activity in enumerate(activities) if activity.startTime is None}
+    levels = collections.defaultdict(list)
+    for index, activity in enumerate(activities):
+        levels[activity.priority].append(index)
+
+    starts = [None] * len(activities)
+    for priority in sorted(levels):
+        fixed = sorted((index for index in levels[priority] if activities[index].startTime is not None),
+                       key=lambda index: activities[index].startTime)
+        movable = sorted((index for index in levels[priority] if activities[index].startTime is None),
+                         key=lambda index: (_latestEnd(choicesByIndex[index]), -activities[index].duration, index))
+        complete = True
+        for index in fixed + movable:
+            activity = activities[index]
+            activityTracks = [tracks[track] for track in tracksOf(activity)]
+            if activity.startTime is not None:
+                start = activity.startTime
+                if _commonStart(activityTracks, start, start + activity.duration, activity.duration) != start:
+                    start = None
+            else:
+                start = None
+                for windows in choicesByIndex[index]:
+                    fits = [fit for fit in (_commonStart(activityTracks, windowStart, windowEnd, activity.duration)
+                                            for windowStart, windowEnd in windows) if fit is not None]
+                    if fits:
+                        start = min(fits)
+                        break
+            if start is None:
+                complete = False
+                continue
+            for track in activityTracks:
+                track.take(start, start + activity.duration)
+            starts[index] = start
+        if not complete:
+            break
+    return starts
+
+
+# Windows a movable buffer or activity may use, as ScheduleTasks builds them: wanted ones first,
+# then second choice ones (if any), each a list of (start, end)
+#   without a group the wanted windows are the disturbance times its attention allows (for
+#   attention other than normal) and the rest of the schedule the second choice
+#   with a group the group time is wanted and those disturbance times are the second choice
+def _windowChoices(activity, startTime, endTime, groupWindows, disturbanceWindows):
+    if isinstance(activity, BufferTime):
+        return [[(startTime, endTime)]]
+    windows = [groupWindows[activity.groupName]] if activity.groupName is not None else [(startTime, endTime)]
+    alternatives = disturbanceWindows.get(activity.attentionRequired, [])
+    if activity.groupName is None and alternatives:
+        return [alternatives, windows]
+    return [windows, alternatives] if alternatives else [windows]
+
+
+def _latestEnd(choices):
+    return max(end for windows in choices for _, end in windows)
+
+
+# Earliest start in [earliest, latestEnd - duration] free on every track, None if there is none
+# Each track pushes the start to its own earliest fit until all of them agree
+def _commonStart(tracks, earliest, latestEnd, duration):
+    start = earliest
+    while True:
+        moved = False
+        for track in tracks:
+            fit = track.earliestFit(start, latestEnd, duration)
+            if fit is None:
+                return None
+            if fit > start:
+                start = fit
+                moved = True
+        if not moved:
+            return start
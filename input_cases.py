@@ -109,8 +109,8 @@ case7['activities'] = [
 
 
 # Only priority 3 activities are provided they are scheduled normally
-case7 = createInputShell()
-case7['activities'] = [
+case8 = createInputShell()
+case8['activities'] = [
     Activity('A', 10, priority=3),
     Activity('B', 20, priority=3),
 ]
@@ -118,8 +118,8 @@ case7['activities'] = [
 
 
 # Only priority 1 and 3 activities are provided they are scheduled normally
-case7 = createInputShell()
-case7['activities'] = [
+case9 = createInputShell()
+case9['activities'] = [
     Activity('A', 10, priority=1),
     Activity('B', 20, priority=3),
     Activity('C', 30, priority=3),
@@ -128,12 +128,12 @@ case7['activities'] = [
 
 
 # Activities with groupName is scheduled inside group's alloted time
-case8 = createInputShell()
-case8['activities'] = [
+case10 = createInputShell()
+case10['activities'] = [
     Activity('A', 10, groupName='email'),
     Activity('B', 5, groupName='email'),
 ]
-case8['activity-groups'] = [
+case10['activity-groups'] = [
     ActivityGroup('email', 40, 60),
 ]
 
@@ -141,13 +141,13 @@ case8['activity-groups'] = [
 
 # Activities with groupName is scheduled inside group's alloted time
 # Activities that cannot fit inside alloted group time are not scheduled
-case9 = createInputShell()
-case9['activities'] = [
+case11 = createInputShell()
+case11['activities'] = [
     Activity('A', 10, groupName='email'),
     Activity('B', 5, groupName='email'),
     Activity('C', 20, groupName='email'),
 ]
-case9['activity-groups'] = [
+case11['activity-groups'] = [
     ActivityGroup('email', 40, 60),
 ]
 
@@ -156,8 +156,8 @@ case9['activity-groups'] = [
 # Multiple groups and also activities without groups
 # Activities with groupName is scheduled inside group's alloted time
 # Activities that cannot fit inside alloted group time are not scheduled
-case9 = createInputShell()
-case9['activities'] = [
+case12 = createInputShell()
+case12['activities'] = [
     Activity('A', 10, groupName='email'),
     Activity('B', 5, groupName='email'),
     Activity('C', 20, groupName='email'),
@@ -167,7 +167,7 @@ case9['activities'] = [
     Activity('G', 5),
     Activity('H', 15),
 ]
-case9['activity-groups'] = [
+case12['activity-groups'] = [
     ActivityGroup('email', 40, 60),
     ActivityGroup('interview', 50, 90),
 ]
@@ -1,3 +1,5 @@
+import enum
+
 
 def createInputShell():
     return {
@@ -7,44 +9,229 @@ def createInputShell():
     'buffer-times': [],
     'activity-groups': [],
     'activities' : [],
-    'disturbance-marked-times': []
+    'disturbance-marked-times': [],
+    'resources': []
 }
 
 
-class ScheduleTime:
+# Priority levels, 1 is the most important
+# Levels beyond LOW are allowed and stay plain ints
+class Priority(enum.IntEnum):
+    HIGH = 1
+    MEDIUM = 2
+    LOW = 3
+
+
+# Attention an activity needs
+# HIGH attention activities may also be fitted into low disturbance times,
+# LOW attention activities may also be fitted into high disturbance times
+class Attention(enum.IntEnum):
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
+
+
+class Disturbance(str, enum.Enum):
+    HIGH = 'high'
+    LOW = 'low'
+
+
+class InvalidInputError(ValueError):
+    pass
+
+
+# Base of the input records: fixed attributes (__slots__), immutable once constructed,
+# compared and hashed by value
+class _Record:
+    __slots__ = ()
+
+    def _set(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(type(self).__name__ + ' is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(type(self).__name__ + ' is immutable')
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        self._set(**dict(zip(self.__slots__, state)))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.__getstate__() == other.__getstate__()
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.__getstate__()))
+
+    def __repr__(self):
+        return type(self).__name__ + '(' + ', '.join(
+            name + '=' + repr(getattr(self, name)) for name in self.__slots__) + ')'
+
+
+# Whether value is an int; bool is an int subclass but True and False are no durations or times
+def _isInt(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _toPriority(priority):
+    if not _isInt(priority) or priority < 1:
+        raise InvalidInputError('Priority must be a positive int, got ' + repr(priority))
+    if priority in Priority._value2member_map_:
+        return Priority(priority)
+    return priority
+
+
+def _toAttention(attentionRequired):
+    if not _isInt(attentionRequired) or attentionRequired not in Attention._value2member_map_:
+        raise InvalidInputError('Attention must be 1, 2 or 3, got ' + repr(attentionRequired))
+    return Attention(attentionRequired)
+
+
+class ScheduleTime(_Record):
+    __slots__ = ('startTime', 'endTime')
+
     def __init__ (self, startTime, endTime):
-        self.startTime = startTime
-        self.endTime = endTime
+        self._set(startTime=startTime, endTime=endTime)
+
 
+class BufferTime(_Record):
+    __slots__ = ('name', 'duration', 'startTime', 'priority')
 
-class BufferTime:
     def __init__ (self, duration, startTime=None):
-        self.name = 'Buffer'
-        self.duration = duration
-        self.startTime = startTime
-        self.priority = 1
+        self._set(name='Buffer', duration=duration, startTime=startTime, priority=Priority.HIGH)
+
+
+# resources are the names of the Resources the activity needs, one unit of each, all at the
+# same time (a meeting lists every attendee); an activity without resources takes the
+# schedule's own single track, like every activity of a one person day
+class Activity(_Record):
+    __slots__ = ('name', 'duration', 'startTime', 'groupName', 'priority', 'attentionRequired', 'resources')
 
+    def __init__(self, name, duration, startTime=None, groupName=None, priority=3, attentionRequired=2, resources=()):
+        self._set(
+            name=name,
+            duration=duration,
+            startTime=startTime,
+            groupName=groupName,
+            priority=_toPriority(priority),
+            attentionRequired=_toAttention(attentionRequired),
+            resources=tuple(resources),
+        )
 
-class Activity:
-    def __init__(self, name, duration, startTime=None, groupName=None, priority=3, attentionRequired=2):
-        self.name = name
-        self.duration = duration
-        self.startTime = startTime
-        self.groupName = groupName
-        self.priority = priority
-        self.attentionRequired = attentionRequired
 
+class ActivityGroup(_Record):
+    __slots__ = ('name', 'startTime', 'endTime')
 
-class ActivityGroup:
     def __init__(self, name, startTime, endTime):
-        self.name = name
-        self.startTime = startTime
-        self.endTime = endTime
+        self._set(name=name, startTime=startTime, endTime=endTime)
+
+
+# A person or room that activities need; up to capacity activities may use it at the same time
+class Resource(_Record):
+    __slots__ = ('name', 'capacity')
+
+    def __init__(self, name, capacity=1):
+        self._set(name=name, capacity=capacity)
 
 
-# disturbance is a string either 'high' or 'low'
-class DisturbanceMarkedTimes:
+# disturbance is a Disturbance or a string either 'high' or 'low'
+class DisturbanceMarkedTimes(_Record):
+    __slots__ = ('disturbance', 'startTime', 'endTime')
+
     def __init__(self, disturbance, startTime, endTime):
-        self.disturbance = disturbance
-        self.startTime = startTime
-        self.endTime = endTime
+        self._set(disturbance=Disturbance(disturbance), startTime=startTime, endTime=endTime)
+
+
+# Resources of userData, which may leave out the 'resources' key
+def resourcesOf(userData):
+    return userData.get('resources', [])
+
+
+# Resources a buffer or activity needs (buffers need none)
+def neededResources(activity):
+    return getattr(activity, 'resources', ())
+
+
+# Check userData once before any model is built and raise InvalidInputError listing every problem
+def validateUserData(userData):
+    problems = []
+    for key in ('schedule-time', 'buffer-times', 'activity-groups', 'activities', 'disturbance-marked-times'):
+        if key not in userData:
+            problems.append('Missing ' + repr(key))
+    if problems:
+        raise InvalidInputError('; '.join(problems))
+
+    if len(userData['schedule-time']) != 1:
+        raise InvalidInputError("'schedule-time' must hold exactly one ScheduleTime")
+    scheduleTime = userData['schedule-time'][0]
+    if not _isTime(scheduleTime.startTime) or not _isTime(scheduleTime.endTime) or scheduleTime.startTime >= scheduleTime.endTime:
+        raise InvalidInputError('Schedule time must satisfy 0 <= startTime < endTime, got ' + repr(scheduleTime))
+
+    groupNames = set()
+    for group in userData['activity-groups']:
+        if group.name in groupNames:
+            problems.append('Activity group ' + repr(group.name) + ' is defined twice')
+        groupNames.add(group.name)
+        problems += _windowProblems(group, scheduleTime)
+    for disturbanceTime in userData['disturbance-marked-times']:
+        problems += _windowProblems(disturbanceTime, scheduleTime)
+    resourceNames = set()
+    for resource in resourcesOf(userData):
+        if resource.name in resourceNames:
+            problems.append('Resource ' + repr(resource.name) + ' is defined twice')
+        resourceNames.add(resource.name)
+        if not _isInt(resource.capacity) or resource.capacity < 1:
+            problems.append(repr(resource) + ' must have a positive int capacity')
+    for activity in userData['buffer-times'] + userData['activities']:
+        problems += _activityProblems(activity, scheduleTime, groupNames, resourceNames)
+
+    if problems:
+        raise InvalidInputError('; '.join(problems))
+
+
+# Check one buffer or activity against the schedule time and the groups of userData
+def validateActivity(activity, userData):
+    groupNames = set(group.name for group in userData['activity-groups'])
+    resourceNames = set(resource.name for resource in resourcesOf(userData))
+    problems = _activityProblems(activity, userData['schedule-time'][0], groupNames, resourceNames)
+    if problems:
+        raise InvalidInputError('; '.join(problems))
+
+
+def _isTime(value):
+    return _isInt(value) and value >= 0
+
+
+def _windowProblems(window, scheduleTime):
+    if not _isTime(window.startTime) or not _isTime(window.endTime) or window.startTime >= window.endTime:
+        return [repr(window) + ' must satisfy 0 <= startTime < endTime']
+    if window.startTime < scheduleTime.startTime or window.endTime > scheduleTime.endTime:
+        return [repr(window) + ' lies outside the schedule time']
+    return []
+
+
+def _activityProblems(activity, scheduleTime, groupNames, resourceNames):
+    name = activity.name
+    if not _isInt(activity.duration) or activity.duration <= 0:
+        return [repr(name) + ' must have a positive int duration']
+    if activity.duration > scheduleTime.endTime - scheduleTime.startTime:
+        return [repr(name) + ' is longer than the schedule time']
+    if activity.startTime is not None:
+        if not _isTime(activity.startTime):
+            return [repr(name) + ' must have a non-negative int start time']
+        if activity.startTime < scheduleTime.startTime or activity.startTime + activity.duration > scheduleTime.endTime:
+            return [repr(name) + ' starts or ends outside the schedule time']
+    groupName = getattr(activity, 'groupName', None)
+    if groupName is not None and groupName not in groupNames:
+        return [repr(name) + ' refers to unknown activity group ' + repr(groupName)]
+    resources = neededResources(activity)
+    if len(set(resources)) != len(resources):
+        return [repr(name) + ' needs the same resource twice']
+    unknown = [resource for resource in resources if resource not in resourceNames]
+    if unknown:
+        return [repr(name) + ' refers to unknown resource ' + repr(unknown[0])]
+    return []
@@ -0,0 +1,108 @@
+import random
+
+from input_interfaces import (Activity, ActivityGroup, BufferTime, DisturbanceMarkedTimes, ScheduleTime,
+                              createInputShell)
+
+
+# Random userData of one day, the same for the same arguments
+#   numActivities        number of activities
+#   priorityWeights      relative share of each priority level, first entry priority 1
+#   numGroups            number of activity groups
+#   groupShare           share of the movable activities that belong to a group
+#   groupTightness       total duration of a group's activities over the length of its window
+#                        (above 1 they cannot all fit)
+#   numDisturbanceTimes  number of disturbance times, alternating high and low, disjoint
+#   attentionShare       share of the activities needing high or low attention
+#   numBuffers           number of buffer times (as likely as activities to be fixed)
+#   fixedStartShare      share of the activities without group that get a fixed start time
+#   load                 total duration of the activities over the schedule length
+#   durations            (shortest, longest) duration
+def generateUserData(numActivities, seed=0, priorityWeights=(1, 1, 2), numGroups=2, groupShare=0.4,
+                     groupTightness=1.2, numDisturbanceTimes=0, attentionShare=0.3, numBuffers=0,
+                     fixedStartShare=0.05, load=1.2, durations=(5, 30)):
+    rng = random.Random(seed)
+    activityDurations = [rng.randint(*durations) for _ in range(numActivities)]
+    endTime = max(durations[1], int(sum(activityDurations) / load))
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, endTime)]
+
+    # Activities first, so that each group's window can be sized to its activities
+    groupNames = ['G' + str(i) for i in range(numGroups)]
+    activities = []
+    for i, duration in enumerate(activityDurations):
+        startTime = groupName = None
+        if groupNames and rng.random() < groupShare:
+            groupName = rng.choice(groupNames)
+        elif rng.random() < fixedStartShare:
+            startTime = rng.randint(0, endTime - duration)
+        attentionRequired = rng.choice([1, 3]) if rng.random() < attentionShare else 2
+        priority = rng.choices(range(1, len(priorityWeights) + 1), weights=priorityWeights)[0]
+        activities.append((i, duration, startTime, groupName, priority, attentionRequired))
+
+    for groupName in groupNames:
+        groupDurations = [duration for _, duration, _, name, _, _ in activities if name == groupName]
+        length = int(sum(groupDurations) / groupTightness) if groupDurations else durations[1]
+        length = min(endTime, max([length, durations[1]] + groupDurations))
+        start = rng.randint(0, endTime - length)
+        userData['activity-groups'].append(ActivityGroup(groupName, start, start + length))
+
+    userData['activities'] = [
+        Activity('A' + str(i), duration, startTime=startTime, groupName=groupName, priority=priority,
+                 attentionRequired=attentionRequired)
+        for i, duration, startTime, groupName, priority, attentionRequired in activities]
+
+    for _ in range(numBuffers):
+        duration = rng.randint(*durations)
+        startTime = rng.randint(0, endTime - duration) if rng.random() < fixedStartShare else None
+        userData['buffer-times'].append(BufferTime(duration, startTime=startTime))
+
+    # Disjoint windows: one per slot of an even split of the day, placed at random inside it
+    numDisturbanceTimes = min(numDisturbanceTimes, endTime // 2)
+    if numDisturbanceTimes:
+        slotLength = endTime // numDisturbanceTimes
+        for i in range(numDisturbanceTimes):
+            length = max(1, slotLength // 2)
+            start = i * slotLength + rng.randint(0, slotLength - length)
+            userData['disturbance-marked-times'].append(
+                DisturbanceMarkedTimes('high' if i % 2 == 0 else 'low', start, start + length))
+    return userData
+
+
+# Plan of numDays working days of DAY_LENGTH minutes back to back, each with activitiesPerDay
+# activities that slightly overflow it: most belong to the day (a group per day, a morning email
+# group, a tenth at fixed times), a tenth float over the whole plan, and each day has two disturbance times
+DAY_LENGTH = 480
+
+
+def multiDayUserData(numDays, activitiesPerDay=20, seed=0):
+    rng = random.Random(seed)
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, numDays * DAY_LENGTH)]
+    scale = DAY_LENGTH * 1.2 / (activitiesPerDay * 17.5)
+    for day in range(numDays):
+        dayStart = day * DAY_LENGTH
+        userData['activity-groups'] += [
+            ActivityGroup('day' + str(day), dayStart, dayStart + DAY_LENGTH),
+            ActivityGroup('email' + str(day), dayStart, dayStart + 60),
+        ]
+        for start in sorted(rng.sample(range(dayStart, dayStart + DAY_LENGTH - 60, 30), 2)):
+            userData['disturbance-marked-times'].append(DisturbanceMarkedTimes(rng.choice(['high', 'low']), start, start + 60))
+        for i in range(activitiesPerDay):
+            duration = max(1, int(rng.randint(5, 30) * scale))
+            kind = rng.random()
+            startTime = groupName = None
+            if kind < 0.1:
+                startTime = rng.randint(dayStart, dayStart + DAY_LENGTH - duration)
+            elif kind < 0.2:
+                groupName = 'email' + str(day)
+            elif kind < 0.9:
+                groupName = 'day' + str(day)
+            userData['activities'].append(Activity(
+                'D' + str(day) + '-' + str(i),
+                duration,
+                startTime=startTime,
+                groupName=groupName,
+                priority=rng.choice([1, 2, 3, 3]),
+                attentionRequired=rng.choice([1, 2, 2, 3]),
+            ))
+    return userData
@@ -0,0 +1,296 @@
+import argparse
+import collections
+import itertools
+import json
+import sys
+import traceback
+
+from batch import errorResult, solveMany
+from input_interfaces import (Activity, ActivityGroup, BufferTime, DisturbanceMarkedTimes, InvalidInputError,
+                              Resource, ScheduleTime, resourcesOf, validateUserData)
+from solver_config import SolverConfig
+
+
+# JSON form of userData, one object per user (one per line in NDJSON files):
+# {
+#     "id": "user-42",                                   optional, copied to the result line
+#     "schedule-time": {"start-time": 0, "end-time": 120},
+#     "buffer-times": [{"duration": 20, "start-time": 10}],
+#     "activity-groups": [{"name": "email", "start-time": 30, "end-time": 60}],
+#     "activities": [{"name": "A", "duration": 30, "start-time": null, "group-name": null,
+#                     "priority": 3, "attention-required": 2, "resources": ["alice", "room-1"]}],
+#     "disturbance-marked-times": [{"disturbance": "high", "start-time": 0, "end-time": 30}],
+#     "resources": [{"name": "alice", "capacity": 1}, {"name": "room-1", "capacity": 1}]
+# }
+# Times are minutes, priority 1 is the most important and attention-required is
+# 1 (may use low disturbance times), 2 (neither) or 3 (may use high disturbance times)
+# An activity needs every resource it lists at once; one without resources takes the schedule's own track
+# Lists may be left out when empty; optional activity fields may be left out or null
+_TIME = {'type': 'integer', 'minimum': 0}
+_OPTIONAL_TIME = {'type': ['integer', 'null'], 'minimum': 0}
+_WINDOW_FIELDS = {'start-time': _TIME, 'end-time': _TIME}
+USER_DATA_SCHEMA = {
+    '$schema': 'http://json-schema.org/draft-07/schema#',
+    'title': 'userData',
+    'type': 'object',
+    'required': ['schedule-time'],
+    'additionalProperties': False,
+    'properties': {
+        'id': {'type': ['string', 'integer']},
+        'schedule-time': {
+            'type': 'object', 'required': ['start-time', 'end-time'], 'additionalProperties': False,
+            'properties': _WINDOW_FIELDS,
+        },
+        'buffer-times': {'type': 'array', 'items': {
+            'type': 'object', 'required': ['duration'], 'additionalProperties': False,
+            'properties': {'duration': {'type': 'integer', 'minimum': 1}, 'start-time': _OPTIONAL_TIME},
+        }},
+        'activity-groups': {'type': 'array', 'items': {
+            'type': 'object', 'required': ['name', 'start-time', 'end-time'], 'additionalProperties': False,
+            'properties': dict(_WINDOW_FIELDS, name={'type': 'string'}),
+        }},
+        'activities': {'type': 'array', 'items': {
+            'type': 'object', 'required': ['name', 'duration'], 'additionalProperties': False,
+            'properties': {
+                'name': {'type': 'string'},
+                'duration': {'type': 'integer', 'minimum': 1},
+                'start-time': _OPTIONAL_TIME,
+                'group-name': {'type': ['string', 'null']},
+                'priority': {'type': 'integer', 'minimum': 1, 'default': 3},
+                'attention-required': {'enum': [1, 2, 3], 'default': 2},
+                'resources': {'type': 'array', 'items': {'type': 'string'}, 'uniqueItems': True, 'default': []},
+            },
+        }},
+        'disturbance-marked-times': {'type': 'array', 'items': {
+            'type': 'object', 'required': ['disturbance', 'start-time', 'end-time'], 'additionalProperties': False,
+            'properties': dict(_WINDOW_FIELDS, disturbance={'enum': ['high', 'low']}),
+        }},
+        'resources': {'type': 'array', 'items': {
+            'type': 'object', 'required': ['name'], 'additionalProperties': False,
+            'properties': {'name': {'type': 'string'}, 'capacity': {'type': 'integer', 'minimum': 1, 'default': 1}},
+        }},
+    },
+}
+
+
+# Build and validate userData from its parsed JSON form
+# Raises InvalidInputError for unknown or missing fields and for anything validateUserData rejects
+def userDataFromJson(obj):
+    if not isinstance(obj, dict):
+        raise InvalidInputError('userData must be a JSON object')
+    _checkFields(obj, USER_DATA_SCHEMA, 'userData')
+    scheduleTime = obj['schedule-time']
+    _checkFields(scheduleTime, USER_DATA_SCHEMA['properties']['schedule-time'], 'schedule-time')
+
+    userData = {
+        'schedule-time': [ScheduleTime(scheduleTime['start-time'], scheduleTime['end-time'])],
+        'buffer-times': [],
+        'activity-groups': [],
+        'activities': [],
+        'disturbance-marked-times': [],
+        'resources': [],
+    }
+    for key, build in _RECORD_BUILDERS.items():
+        itemSchema = USER_DATA_SCHEMA['properties'][key]['items']
+        for item in obj.get(key) or []:
+            _checkFields(item, itemSchema, key)
+            try:
+                userData[key].append(build(item))
+            except ValueError as error:
+                raise InvalidInputError(key + ': ' + str(error))
+    validateUserData(userData)
+    return userData
+
+
+# JSON form of userData, the inverse of userDataFromJson
+def userDataToJson(userData, userId=None):
+    scheduleTime = userData['schedule-time'][0]
+    obj = collections.OrderedDict()
+    if userId is not None:
+        obj['id'] = userId
+    obj['schedule-time'] = {'start-time': scheduleTime.startTime, 'end-time': scheduleTime.endTime}
+    obj['buffer-times'] = [
+        {'duration': buffer.duration, 'start-time': buffer.startTime} for buffer in userData['buffer-times']]
+    obj['activity-groups'] = [
+        {'name': group.name, 'start-time': group.startTime, 'end-time': group.endTime}
+        for group in userData['activity-groups']]
+    obj['activities'] = [{
+        'name': activity.name,
+        'duration': activity.duration,
+        'start-time': activity.startTime,
+        'group-name': activity.groupName,
+        'priority': int(activity.priority),
+        'attention-required': int(activity.attentionRequired),
+        'resources': list(activity.resources),
+    } for activity in userData['activities']]
+    obj['disturbance-marked-times'] = [
+        {'disturbance': dis.disturbance.value, 'start-time': dis.startTime, 'end-time': dis.endTime}
+        for dis in userData['disturbance-marked-times']]
+    obj['resources'] = [{'name': resource.name, 'capacity': resource.capacity} for resource in resourcesOf(userData)]
+    return obj
+
+
+# JSON form of a SolveResult, tagged with the id of the user it belongs to
+def resultToJson(result, userId=None):
+    obj = collections.OrderedDict(id=userId)
+    obj.update(result.asDict())
+    return obj
+
+
+# Read NDJSON from a stream one line at a time, yielding (lineNumber, parsed object or ValueError)
+# Blank lines are skipped; a malformed line yields its error instead of stopping the stream
+def readNdjson(stream):
+    for lineNumber, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield lineNumber, json.loads(line)
+        except ValueError as error:
+            yield lineNumber, error
+
+
+# Write one object as a single NDJSON line and flush it so that readers see it immediately
+def writeNdjson(stream, obj):
+    stream.write(json.dumps(obj, separators=(',', ':')) + '\n')
+    stream.flush()
+
+
+# Solve every user of an NDJSON stream and write one result line per user as each solve completes
+# Lines are read lazily (solveMany keeps only a bounded number of users in flight), so the
+# input may be arbitrarily large; result lines come out in completion order, tagged with
+# the user's id (or its line number when it has none)
+def solveNdjson(inputStream, outputStream, workers=None, solverConfig=None, mode='weighted'):
+    # solveMany index -> user id, only for users still being solved
+    pendingIds = {}
+    # Result lines of users that could not be parsed, written between solved ones
+    invalidLines = collections.deque()
+    # Index solveMany gives the next valid user
+    caseIndex = itertools.count()
+
+    def validCases():
+        for lineNumber, obj in readNdjson(inputStream):
+            userId = obj.get('id', lineNumber) if isinstance(obj, dict) else lineNumber
+            try:
+                if isinstance(obj, Exception):
+                    raise InvalidInputError('Line %d is not valid JSON: %s' % (lineNumber, obj))
+                userData = userDataFromJson(obj)
+            except InvalidInputError as error:
+                invalidLines.append(resultToJson(errorResult(str(error)), userId))
+                continue
+            except Exception:
+                # Anything else is a bug, but it only fails this user
+                invalidLines.append(resultToJson(errorResult(traceback.format_exc(limit=5)), userId))
+                continue
+            pendingIds[next(caseIndex)] = userId
+            yield userData
+
+    for batchResult in solveMany(validCases(), workers=workers, solverConfig=solverConfig, mode=mode):
+        while invalidLines:
+            writeNdjson(outputStream, invalidLines.popleft())
+        writeNdjson(outputStream, resultToJson(batchResult.result, pendingIds.pop(batchResult.index)))
+    while invalidLines:
+        writeNdjson(outputStream, invalidLines.popleft())
+
+
+def _checkFields(obj, schema, where):
+    if not isinstance(obj, dict):
+        raise InvalidInputError(where + ' entries must be JSON objects')
+    unknown = set(obj) - set(schema['properties'])
+    if unknown:
+        raise InvalidInputError(where + ': unknown fields ' + ', '.join(sorted(unknown)))
+    missing = [field for field in schema['required'] if field not in obj]
+    if missing:
+        raise InvalidInputError(where + ': missing fields ' + ', '.join(missing))
+    # Optional fields may also be null
+    for field, value in obj.items():
+        if value is None and field not in schema['required']:
+            continue
+        if not _hasSchemaType(value, schema['properties'][field]):
+            raise InvalidInputError('%s: %s must be %s, got %s' % (
+                where, field, _schemaTypeName(schema['properties'][field]), json.dumps(value)))
+
+
+# JSON schema types of USER_DATA_SCHEMA as Python checks (a JSON true is no integer)
+_TYPE_CHECKS = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'null': lambda value: value is None,
+}
+
+
+# Whether value has the type (or is one of the enum values) of a property of USER_DATA_SCHEMA;
+# the items of an array are checked too unless they are objects, which _checkFields checks
+def _hasSchemaType(value, propertySchema):
+    if 'enum' in propertySchema:
+        return any(type(value) is type(option) and value == option for option in propertySchema['enum'])
+    types = propertySchema['type']
+    types = [types] if isinstance(types, str) else types
+    if not any(_TYPE_CHECKS[name](value) for name in types):
+        return False
+    items = propertySchema.get('items')
+    if isinstance(value, list) and items is not None and items['type'] != 'object':
+        return all(_hasSchemaType(item, items) for item in value)
+    return True
+
+
+def _schemaTypeName(propertySchema):
+    if 'enum' in propertySchema:
+        return 'one of ' + json.dumps(propertySchema['enum'])
+    types = propertySchema['type']
+    name = ' or '.join([types] if isinstance(types, str) else types)
+    if propertySchema.get('items', {}).get('type') not in (None, 'object'):
+        name += ' of ' + propertySchema['items']['type'] + 's'
+    return name
+
+
+_RECORD_BUILDERS = collections.OrderedDict([
+    ('buffer-times', lambda item: BufferTime(item['duration'], item.get('start-time'))),
+    ('activity-groups', lambda item: ActivityGroup(item['name'], item['start-time'], item['end-time'])),
+    ('activities', lambda item: Activity(
+        item['name'],
+        item['duration'],
+        startTime=item.get('start-time'),
+        groupName=item.get('group-name'),
+        priority=3 if item.get('priority') is None else item['priority'],
+        attentionRequired=2 if item.get('attention-required') is None else item['attention-required'],
+        resources=item.get('resources') or (),
+    )),
+    ('disturbance-marked-times', lambda item: DisturbanceMarkedTimes(
+        item['disturbance'], item['start-time'], item['end-time'])),
+    ('resources', lambda item: Resource(item['name'], 1 if item.get('capacity') is None else item['capacity'])),
+])
+
+
+# Batch job: python json_format.py [input.ndjson] [--output results.ndjson] [--workers N] [--time-limit S]
+# Reads stdin and writes stdout by default; --schema prints USER_DATA_SCHEMA instead
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve one schedule per NDJSON userData line.')
+    parser.add_argument('input', nargs='?', default='-', help='NDJSON file of userData objects, - for stdin')
+    parser.add_argument('--output', default='-', help='NDJSON file for the results, - for stdout')
+    parser.add_argument('--workers', type=int, default=None, help='solver processes (default: one per core)')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds per solve')
+    parser.add_argument('--mode', default='weighted', choices=['weighted', 'lexicographic'])
+    parser.add_argument('--schema', action='store_true', help='print the userData JSON schema and exit')
+    args = parser.parse_args(argv)
+
+    if args.schema:
+        json.dump(USER_DATA_SCHEMA, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    inputStream = sys.stdin if args.input == '-' else open(args.input)
+    outputStream = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        solveNdjson(inputStream, outputStream, workers=args.workers,
+                    solverConfig=SolverConfig(maxTimeInSeconds=args.time_limit), mode=args.mode)
+    finally:
+        if inputStream is not sys.stdin:
+            inputStream.close()
+        if outputStream is not sys.stdout:
+            outputStream.close()
+
+
+if __name__ == '__main__':
+    main()
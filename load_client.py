@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+from instance_generator import generateUserData
+from json_format import userDataToJson
+
+
+# Synthetic load for service.py: concurrency connections each send POST /schedule requests
+# back to back (keep-alive) until numRequests have been sent, then latency percentiles,
+# throughput and the count of each response status are printed
+async def runLoad(host, port, numRequests, concurrency, caseSize, deadline, distinctCases=20):
+    bodies = [json.dumps(userDataToJson(generateUserData(caseSize, seed=seed), 'load-' + str(seed))).encode()
+              for seed in range(distinctCases)]
+    remaining = [numRequests]
+    latencies = []
+    statusCounts = collections.Counter()
+
+    async def connectionWorker(workerIndex):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                body = bodies[(remaining[0] + workerIndex) % len(bodies)]
+                head = ('POST /schedule HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n'
+                        'Content-Length: %d\r\nX-Deadline-Seconds: %g\r\n\r\n' % (host, len(body), deadline))
+                start = time.perf_counter()
+                writer.write(head.encode('latin-1') + body)
+                await writer.drain()
+                status = await _readResponse(reader)
+                latencies.append(time.perf_counter() - start)
+                statusCounts[status] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[connectionWorker(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print('requests: %d in %.2f s (%.1f/s)' % (len(latencies), elapsed, len(latencies) / elapsed))
+    print('status: ' + ', '.join('%d x %d' % (count, status) for status, count in sorted(statusCounts.items())))
+    for percentile in (50, 90, 99):
+        index = min(len(latencies) - 1, len(latencies) * percentile // 100)
+        print('p%d latency: %.3f s' % (percentile, latencies[index]))
+
+
+# Status code of the next response, after reading and dropping its body
+async def _readResponse(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test for service.py.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--size', type=int, default=30, help='activities per request')
+    parser.add_argument('--deadline', type=float, default=5.0, help='X-Deadline-Seconds of each request')
+    args = parser.parse_args(argv)
+    asyncio.run(runLoad(args.host, args.port, args.requests, args.concurrency, args.size, args.deadline))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,8 @@
 from scheduler import ScheduleTasks
-from input_cases import case
+from solve_result import ConsoleReporter
+from input_cases import case12
 
-from input_cases import case1, case2, case3, case4, case5, case6, case7, case8, case9
 
+scheduler = ScheduleTasks(case12)
 
-scheduler = ScheduleTasks(case9)
-
-scheduler.solve()
\ No newline at end of file
+scheduler.solve(reporter=ConsoleReporter())
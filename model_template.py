@@ -0,0 +1,141 @@
+import hashlib
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from input_interfaces import BufferTime, neededResources, resourcesOf
+from scheduler import ScheduleTasks
+
+
+# File layout: _MAGIC, header length (uint32, little endian), JSON header, serialized CpModelProto,
+# then the index arrays (int32, little endian), each at the offset (from the model's start) and with
+# the shape the header gives
+_MAGIC = b'SCHEDULE-TEMPLATE-1\n'
+_HEADER_SIZE = struct.Struct('<I')
+_ARRAY_ALIGNMENT = 8
+
+# Templates loaded by loadTemplate in this process, by path
+_loadedTemplates = {}
+
+
+# Identity of a model template: hash of userData and the objective options, in input order, without
+# activity names and fixed start times; days with the same key build the same model but for the
+# domains of the fixed start and end variables
+def templateKey(userData, compactSchedule=True, penalizeOrderChanges=False):
+    groupWindows = {group.name: (group.startTime, group.endTime) for group in userData['activity-groups']}
+    entries = []
+    for activity in userData['buffer-times'] + userData['activities']:
+        isBuffer = isinstance(activity, BufferTime)
+        groupWindow = groupWindows[activity.groupName] if not isBuffer and activity.groupName is not None else (-1, -1)
+        entries.append((
+            0 if isBuffer else 1,
+            int(activity.priority),
+            2 if isBuffer else int(activity.attentionRequired),
+            groupWindow,
+            list(neededResources(activity)),
+            activity.startTime is not None,
+            activity.duration,
+        ))
+    scheduleTime = userData['schedule-time'][0]
+    canonical = [
+        [bool(compactSchedule), bool(penalizeOrderChanges)],
+        [scheduleTime.startTime, scheduleTime.endTime],
+        [[dis.disturbance.value, dis.startTime, dis.endTime] for dis in userData['disturbance-marked-times']],
+        [[resource.name, resource.capacity] for resource in resourcesOf(userData)],
+        entries,
+    ]
+    return hashlib.sha256(json.dumps(canonical, separators=(',', ':')).encode()).hexdigest()
+
+
+# A built model with its index map (see ScheduleTasks.modelIndex), reusable for every day with the
+# same templateKey, e.g. the same routine of many users that only differ in a few fixed start times
+# The model is built once, with fixed start times as variables; instantiate parses it into a new
+# ScheduleTasks and sets the day's fixed start times as the bounds of those variables
+# save writes it to a file that load memory-maps: the index arrays are views of the mapped file
+class ModelTemplate:
+    def __init__(self, key, compactSchedule, penalizeOrderChanges, modelBytes, index):
+        self.key = key
+        self.compactSchedule = compactSchedule
+        self.penalizeOrderChanges = penalizeOrderChanges
+        # Serialized CpModelProto (bytes, or a memoryview of the mapped file)
+        self.modelBytes = modelBytes
+        # name -> int32 array, see ScheduleTasks.modelIndex
+        self.index = index
+        self._mapped = None
+
+    # Build the template of userData's structure; its own fixed start times do not matter
+    @classmethod
+    def build(cls, userData, compactSchedule=True, penalizeOrderChanges=False):
+        scheduler = ScheduleTasks(userData, compactSchedule=compactSchedule, penalizeOrderChanges=penalizeOrderChanges,
+                                  presolve=False, variableFixedStarts=True)
+        return cls(templateKey(userData, compactSchedule, penalizeOrderChanges), compactSchedule, penalizeOrderChanges,
+                   scheduler.model.Proto().SerializeToString(), scheduler.modelIndex())
+
+    def matches(self, userData, compactSchedule=True, penalizeOrderChanges=False):
+        return templateKey(userData, compactSchedule, penalizeOrderChanges) == self.key
+
+    # A ScheduleTasks of userData with the template's model; options are passed on to ScheduleTasks
+    # (presolve, deferrable and variableNames do not apply)
+    # Raises input_interfaces.InvalidInputError if userData does not match the template
+    def instantiate(self, userData, **options):
+        return ScheduleTasks(userData, compactSchedule=self.compactSchedule, penalizeOrderChanges=self.penalizeOrderChanges,
+                             template=self, **options)
+
+    def save(self, path):
+        header = {
+            'key': self.key,
+            'compactSchedule': self.compactSchedule,
+            'penalizeOrderChanges': self.penalizeOrderChanges,
+            'arrays': {},
+        }
+        modelBytes = bytes(self.modelBytes)
+        offset = len(modelBytes)
+        arrays = []
+        for name, array in self.index.items():
+            offset = -(-offset // _ARRAY_ALIGNMENT) * _ARRAY_ALIGNMENT
+            header['arrays'][name] = [offset, list(array.shape)]
+            arrays.append((offset, np.ascontiguousarray(array, dtype='<i4').tobytes()))
+            offset += array.nbytes
+        header['model'] = len(modelBytes)
+        headerBytes = json.dumps(header, separators=(',', ':')).encode()
+        # Pad the header so that the model, and with it every array, starts aligned
+        headerBytes += b' ' * (-(len(_MAGIC) + _HEADER_SIZE.size + len(headerBytes)) % _ARRAY_ALIGNMENT)
+
+        with open(path, 'wb') as templateFile:
+            templateFile.write(_MAGIC + _HEADER_SIZE.pack(len(headerBytes)) + headerBytes)
+            templateFile.write(modelBytes)
+            end = len(modelBytes)
+            for offset, data in arrays:
+                templateFile.write(b'\0' * (offset - end) + data)
+                end = offset + len(data)
+
+    # Template saved at path, memory-mapped: only the parts a model is made from are read, and
+    # processes loading the same file share its pages
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as templateFile:
+            mapped = mmap.mmap(templateFile.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(_MAGIC)] != _MAGIC:
+            mapped.close()
+            raise ValueError('Not a model template file: ' + str(path))
+        headerStart = len(_MAGIC) + _HEADER_SIZE.size
+        headerLength, = _HEADER_SIZE.unpack_from(mapped, len(_MAGIC))
+        header = json.loads(mapped[headerStart:headerStart + headerLength])
+        modelStart = headerStart + headerLength
+        index = {}
+        for name, (offset, shape) in header['arrays'].items():
+            index[name] = np.frombuffer(mapped, dtype='<i4', count=int(np.prod(shape)),
+                                        offset=modelStart + offset).reshape(shape)
+        template = cls(header['key'], header['compactSchedule'], header['penalizeOrderChanges'],
+                       memoryview(mapped)[modelStart:modelStart + header['model']], index)
+        template._mapped = mapped
+        return template
+
+
+# ModelTemplate.load of path, loaded once per process (e.g. in the workers of batch.solveMany)
+def loadTemplate(path):
+    if path not in _loadedTemplates:
+        _loadedTemplates[path] = ModelTemplate.load(path)
+    return _loadedTemplates[path]
@@ -0,0 +1,180 @@
+import bisect
+import collections
+import time
+
+from input_interfaces import Attention, BufferTime, Disturbance, neededResources, resourcesOf
+
+
+# Deductions made from userData before the model is built, all following from the priority cascade
+# (an activity of priority p can only be present when every activity of a level before p is, leaving
+# out deferrable ones, see ScheduleTasks)
+# Every deduction is made per track: the schedule's own track (None), used by activities without
+# resources, and each resource, which holds up to its capacity activities at a time
+#   pruned         id(activity) -> (activity, reason) for activities that can never be present
+#   blockedPriority lowest priority level that can never be complete (None if every level can be);
+#                   every activity of a later level is pruned
+#   forbiddenByPriority priority -> track -> sorted, merged (start, end) intervals taken on a track
+#                   of capacity 1 by fixed start activities of the levels before it, which no
+#                   activity of that level using the track may overlap
+#   wallTime       seconds spent
+class Presolve:
+    def __init__(self):
+        self.pruned = collections.OrderedDict()
+        self.blockedPriority = None
+        self.forbiddenByPriority = {}
+        self.wallTime = 0.0
+
+    def isPruned(self, activity):
+        return id(activity) in self.pruned
+
+    # Start ranges [[first, last], ...] of activity inside [windowStart, latestStart] that do not
+    # overlap the fixed activities of the levels before its own
+    def allowedStarts(self, activity, windowStart, latestStart):
+        forbiddenByTrack = self.forbiddenByPriority.get(activity.priority, {})
+        forbidden = [forbiddenByTrack[track] for track in tracksOf(activity) if track in forbiddenByTrack]
+        forbidden = forbidden[0] if len(forbidden) == 1 else _merge(interval for intervals in forbidden for interval in intervals)
+        starts = []
+        nextStart = windowStart
+        # Only fixed intervals ending after windowStart can cut into the window
+        first = bisect.bisect_right(forbidden, (windowStart, windowStart))
+        if first > 0 and forbidden[first - 1][1] > windowStart:
+            first -= 1
+        for fixedStart, fixedEnd in forbidden[first:]:
+            lastStart = min(latestStart, fixedStart - activity.duration)
+            if lastStart >= nextStart:
+                starts.append([nextStart, lastStart])
+            nextStart = max(nextStart, fixedEnd)
+            if nextStart > latestStart:
+                break
+        if nextStart <= latestStart:
+            starts.append([nextStart, latestStart])
+        return starts
+
+
+# deferrable holds the ids of the deferrable buffers and activities: they can be pruned like any
+# other, but no level waits for them, so they take no part in the deductions about later levels
+def presolveUserData(userData, deferrable=()):
+    startTime = time.time()
+    presolve = Presolve()
+    scheduleTime = userData['schedule-time'][0]
+    scheduleLength = scheduleTime.endTime - scheduleTime.startTime
+    groupWindows = {group.name: (group.startTime, group.endTime) for group in userData['activity-groups']}
+    disturbanceWindows = {
+        Attention.HIGH: [(dis.startTime, dis.endTime) for dis in userData['disturbance-marked-times'] if dis.disturbance == Disturbance.LOW],
+        Attention.LOW: [(dis.startTime, dis.endTime) for dis in userData['disturbance-marked-times'] if dis.disturbance == Disturbance.HIGH],
+    }
+
+    capacities = {None: 1}
+    capacities.update((resource.name, resource.capacity) for resource in resourcesOf(userData))
+
+    activitiesByPriority = collections.defaultdict(list)
+    for activity in userData['buffer-times'] + userData['activities']:
+        activitiesByPriority[activity.priority].append(activity)
+
+    # Per track: fixed intervals (on tracks of capacity 1), total duration and per group duration
+    # (keyed by (track, group name)) of the levels processed so far
+    fixedIntervals = collections.defaultdict(list)
+    cumulativeDuration = collections.Counter()
+    groupLoad = collections.Counter()
+    for priority in sorted(activitiesByPriority):
+        levelActivities = activitiesByPriority[priority]
+        if presolve.blockedPriority is not None:
+            for activity in levelActivities:
+                presolve.pruned[id(activity)] = (activity, 'priority %d can never be complete' % presolve.blockedPriority)
+            continue
+
+        forbidden = {track: _merge(intervals) for track, intervals in fixedIntervals.items()}
+        presolve.forbiddenByPriority[priority] = forbidden
+        blocked = False
+        levelFixed = []
+        for activity in levelActivities:
+            tracks = tracksOf(activity)
+            window, hasAlternatives = _windows(activity, scheduleTime, groupWindows, disturbanceWindows)
+            fullTracks = [track for track in tracks
+                          if cumulativeDuration[track] + activity.duration > capacities[track] * scheduleLength]
+            reason = None
+            if window is None and not hasAlternatives:
+                reason = 'longer than every window it may use'
+            elif fullTracks:
+                reason = 'activities of earlier priority levels fill ' + _describe(fullTracks[0])
+            elif window is not None and not hasAlternatives and _isGroupBound(activity) and any(
+                    groupLoad[(track, activity.groupName)] + activity.duration > capacities[track] * (window[1] - window[0])
+                    for track in tracks):
+                reason = 'activities of earlier priority levels fill group ' + repr(activity.groupName)
+            elif activity.startTime is not None and any(
+                    _overlapsAny(forbidden.get(track, ()), activity.startTime, activity.startTime + activity.duration)
+                    for track in tracks):
+                reason = 'overlaps a fixed activity of an earlier priority level'
+            if reason is not None:
+                presolve.pruned[id(activity)] = (activity, reason)
+                blocked = blocked or id(activity) not in deferrable
+                continue
+            if activity.startTime is not None and id(activity) not in deferrable:
+                levelFixed += [(track, (activity.startTime, activity.startTime + activity.duration))
+                               for track in tracks if capacities[track] == 1]
+
+        # Level capacity, group capacity and fixed activities overlapping each other
+        for activity in levelActivities:
+            if id(activity) in deferrable:
+                continue
+            groupBound = _isGroupBound(activity) and not _windows(activity, scheduleTime, groupWindows, disturbanceWindows)[1]
+            for track in tracksOf(activity):
+                cumulativeDuration[track] += activity.duration
+                if groupBound:
+                    groupLoad[(track, activity.groupName)] += activity.duration
+        blocked = blocked or any(duration > capacities[track] * scheduleLength for track, duration in cumulativeDuration.items())
+        blocked = blocked or any(load > capacities[track] * (groupWindows[name][1] - groupWindows[name][0])
+                                 for (track, name), load in groupLoad.items())
+        for track, interval in levelFixed:
+            fixedIntervals[track].append(interval)
+        for intervals in fixedIntervals.values():
+            merged = _merge(intervals)
+            blocked = blocked or sum(end - start for start, end in merged) < sum(end - start for start, end in intervals)
+        if blocked:
+            presolve.blockedPriority = priority
+
+    presolve.wallTime = time.time() - startTime
+    return presolve
+
+
+# (main window, whether disturbance-time alternatives exist) of an activity that may move
+# main window is the group or schedule window, None when the activity does not fit it
+def _windows(activity, scheduleTime, groupWindows, disturbanceWindows):
+    if activity.startTime is not None:
+        return (activity.startTime, activity.startTime + activity.duration), False
+    window = (scheduleTime.startTime, scheduleTime.endTime)
+    if not isinstance(activity, BufferTime) and activity.groupName is not None:
+        window = groupWindows[activity.groupName]
+    if window[1] - window[0] < activity.duration:
+        window = None
+    alternatives = [] if isinstance(activity, BufferTime) else disturbanceWindows.get(activity.attentionRequired, [])
+    hasAlternatives = any(end - start >= activity.duration for start, end in alternatives)
+    return window, hasAlternatives
+
+
+# Tracks an activity takes: its resources, or the schedule's own track (None)
+def tracksOf(activity):
+    return neededResources(activity) or (None,)
+
+
+def _describe(track):
+    return 'the schedule' if track is None else 'resource ' + repr(track)
+
+
+def _isGroupBound(activity):
+    return not isinstance(activity, BufferTime) and activity.groupName is not None and activity.startTime is None
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start < merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _overlapsAny(merged, start, end):
+    index = bisect.bisect_left(merged, (end, end))
+    return index > 0 and merged[index - 1][1] > start
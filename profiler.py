@@ -0,0 +1,148 @@
+import collections
+import contextlib
+import json
+import re
+import time
+
+
+# Lines of the CP-SAT search log that report progress, e.g.
+#   #Bound   0.05s best:inf   next:[648306,1315068] initial_domain
+#   #3       0.34s best:678363 next:[673991,678362]  (fixed_bools=129/687)
+#   #Done    0.86s
+_PROGRESS_LINE = re.compile(r'^#(\w+)\s+([\d.]+)s(?:\s+best:(\S+)\s+next:\[([^,\]]*)(?:,[^\]]*)?\])?')
+
+# Counters of one build phase
+PHASE_FIELDS = ('calls', 'time', 'variables', 'intervals', 'constraints')
+
+
+# Opt-in instrumentation of ScheduleTasks (see ScheduleTasks(profile=True))
+# Build phases are timed and charged the variables, intervals and constraints they add to the model
+# Phases nest and each is charged only its own work (a phase running inside another one is not
+# counted in the outer one), so the phases add up to the whole build
+# Every solve stage records CP-SAT's response stats and the objective and bound progression read
+# from its search log
+class Profiler:
+    def __init__(self, model):
+        self.model = model
+        # phase name -> counters (PHASE_FIELDS)
+        self.phases = collections.OrderedDict()
+        # One dict per solve stage, see recordSolve
+        self.solves = []
+        # (name, start, duration) of outermost phases and solve stages, times since the profiler started
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._stack = []
+        self._checkpoint = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._charge()
+        if name not in self.phases:
+            self.phases[name] = dict.fromkeys(PHASE_FIELDS, 0)
+        self.phases[name]['calls'] += 1
+        self._stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._charge()
+            self._stack.pop()
+            if not self._stack:
+                self.spans.append((name, start - self._origin, time.perf_counter() - start))
+
+    # Charge the time and model growth since the last checkpoint to the innermost running phase
+    def _charge(self):
+        now = time.perf_counter()
+        proto = self.model.Proto()
+        numVariables = len(proto.variables)
+        numConstraints = len(proto.constraints)
+        if self._stack and self._checkpoint is not None:
+            lastTime, lastVariables, lastConstraints = self._checkpoint
+            counters = self.phases[self._stack[-1]]
+            counters['time'] += now - lastTime
+            counters['variables'] += numVariables - lastVariables
+            newConstraints = [proto.constraints[i].WhichOneof('constraint') for i in range(lastConstraints, numConstraints)]
+            numIntervals = newConstraints.count('interval')
+            counters['intervals'] += numIntervals
+            counters['constraints'] += len(newConstraints) - numIntervals
+        self._checkpoint = (now, numVariables, numConstraints)
+
+    # Solver parameters for a profiled solve: the search log goes to the response (and to stdout
+    # only if the config asked for it)
+    def prepareSolver(self, solverParameters):
+        solverParameters.log_to_stdout = solverParameters.log_search_progress
+        solverParameters.log_search_progress = True
+        solverParameters.log_to_response = True
+
+    # Record one solve stage from the solver after Solve returned; start is its time.perf_counter()
+    #   presolve-time        time of the first search event, i.e. CP-SAT presolve and model loading
+    #   first-solution-time  time of the first solution (None if none was found)
+    #   progress             [time, best objective (None before a solution), best bound] at every
+    #                        search event
+    def recordSolve(self, stageName, solver, start):
+        response = solver.ResponseProto()
+        progress = []
+        for line in response.solve_log.splitlines():
+            match = _PROGRESS_LINE.match(line)
+            if match is None or match.group(1) in ('Model', 'Done'):
+                continue
+            best = match.group(3)
+            bound = match.group(4)
+            progress.append([
+                float(match.group(2)),
+                None if best in (None, 'inf') else float(best),
+                # An empty next interval means the best objective is proved optimal
+                float(bound) if bound else (None if best in (None, 'inf') else float(best)),
+            ])
+        firstSolution = next((event[0] for event in progress if event[1] is not None), None)
+        self.solves.append({
+            'stage': stageName,
+            'status': solver.StatusName(response.status),
+            'wall-time': response.wall_time,
+            'user-time': response.user_time,
+            'deterministic-time': response.deterministic_time,
+            'presolve-time': progress[0][0] if progress else None,
+            'first-solution-time': firstSolution,
+            'branches': response.num_branches,
+            'conflicts': response.num_conflicts,
+            'booleans': response.num_booleans,
+            'integers': response.num_integers,
+            'lp-iterations': response.num_lp_iterations,
+            'restarts': response.num_restarts,
+            'progress': progress,
+        })
+        self.spans.append(('solve ' + stageName if stageName else 'solve', start - self._origin, time.perf_counter() - start))
+
+    def asDict(self):
+        proto = self.model.Proto()
+        kinds = collections.Counter(constraint.WhichOneof('constraint') for constraint in proto.constraints)
+        # Constraints cleared by edits to the model have no kind and are left out
+        kinds.pop(None, None)
+        intervals = kinds.pop('interval', 0)
+        return {
+            'model': {
+                'variables': len(proto.variables),
+                'intervals': intervals,
+                'constraints': sum(kinds.values()),
+            },
+            'build': {name: dict(counters) for name, counters in self.phases.items()},
+            'solves': list(self.solves),
+        }
+
+    # Trace of the outermost phases and solve stages in the Chrome trace event format (JSON), which
+    # chrome://tracing and Perfetto open; objective and bound progression are counter tracks
+    def trace(self):
+        events = []
+        for name, start, duration in self.spans:
+            events.append({'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': 0, 'tid': 0})
+        solveSpans = [span for span in self.spans if span[0].startswith('solve')]
+        for (_, start, _), solve in zip(solveSpans, self.solves):
+            for eventTime, best, bound in solve['progress']:
+                values = {name: value for name, value in (('objective', best), ('bound', bound)) if value is not None}
+                if values:
+                    events.append({'name': 'progress', 'ph': 'C', 'ts': (start + eventTime) * 1e6, 'pid': 0, 'args': values})
+        return {'traceEvents': events, 'otherData': self.asDict()}
+
+    def writeTrace(self, path):
+        with open(path, 'w') as traceFile:
+            json.dump(self.trace(), traceFile)
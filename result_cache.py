@@ -0,0 +1,177 @@
+import collections
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from input_interfaces import BufferTime, neededResources, resourcesOf
+
+
+# Identity of a problem for the cache
+# fingerprint: hash of the canonical form of userData and the objective options; identical for
+#   days that differ only in activity names and input order (input order is kept when order
+#   changes are penalized, since the objective depends on it); resources keep their names
+# structureKey: the same without durations and fixed start times, shared by near-identical days
+# order: canonical position -> index into buffer-times + activities, to map cached starts back
+ProblemKey = collections.namedtuple('ProblemKey', 'fingerprint, structureKey, order')
+
+
+def problemKey(userData, compactSchedule=True, penalizeOrderChanges=False):
+    groupWindows = {group.name: (group.startTime, group.endTime) for group in userData['activity-groups']}
+    entries = []
+    for activity in userData['buffer-times'] + userData['activities']:
+        isBuffer = isinstance(activity, BufferTime)
+        groupWindow = groupWindows[activity.groupName] if not isBuffer and activity.groupName is not None else (-1, -1)
+        entries.append((
+            0 if isBuffer else 1,
+            int(activity.priority),
+            2 if isBuffer else int(activity.attentionRequired),
+            groupWindow,
+            sorted(neededResources(activity)),
+            activity.startTime is not None,
+            activity.duration,
+            -1 if activity.startTime is None else activity.startTime,
+        ))
+    order = list(range(len(entries)))
+    if not penalizeOrderChanges:
+        order.sort(key=entries.__getitem__)
+    entries = [entries[i] for i in order]
+
+    scheduleTime = userData['schedule-time'][0]
+    common = [
+        [bool(compactSchedule), bool(penalizeOrderChanges)],
+        [scheduleTime.startTime, scheduleTime.endTime],
+        sorted([dis.disturbance.value, dis.startTime, dis.endTime] for dis in userData['disturbance-marked-times']),
+        sorted([resource.name, resource.capacity] for resource in resourcesOf(userData)),
+    ]
+    fingerprint = _hash(common + [entries])
+    structureKey = _hash(common + [[entry[:6] for entry in entries]])
+    return ProblemKey(fingerprint, structureKey, order)
+
+
+def _hash(canonical):
+    return hashlib.sha256(json.dumps(canonical, separators=(',', ':')).encode()).hexdigest()
+
+
+# LRU cache of solved schedules keyed by ProblemKey.fingerprint, in memory and optionally on disk
+# An entry maps each solve mode to a dict with the SolveResult fields that do not depend on
+# names, plus 'starts': the start of each activity in canonical order (None if not fitted) and
+# 'proven': whether it holds whatever the time limit (see ScheduleTasks._isProven); only proven
+# entries answer a solve, the others warm start it
+# Entries are written through to directory (one pickle per fingerprint) when it is given;
+# the least recently used files are deleted once they take more than maxDiskBytes
+# Only the latest entry of each structureKey (stored or read from disk) is remembered for
+# near-miss lookups, in memory
+class ResultCache:
+    def __init__(self, maxEntries=1024, directory=None, maxDiskBytes=256 * 1024 * 1024):
+        self.maxEntries = maxEntries
+        self.directory = directory
+        self.maxDiskBytes = maxDiskBytes
+        self.entries = collections.OrderedDict()
+        # structureKey -> fingerprint of the latest entry with that structure
+        self.structures = collections.OrderedDict()
+        self.hits = 0
+        self.nearHits = 0
+        self.misses = 0
+        self.diskBytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.diskBytes = sum(os.path.getsize(path) for path in self._diskFiles())
+
+    # Entry stored for the ProblemKey key, or None
+    # Lookups are counted by countSolve, since only the caller knows whether the entry answers it
+    def get(self, key):
+        entry = self.entries.get(key.fingerprint)
+        if entry is not None:
+            self.entries.move_to_end(key.fingerprint)
+        elif self.directory is not None:
+            entry = self._readDisk(key.fingerprint)
+            if entry is not None:
+                self._remember(key, entry)
+        return entry
+
+    # Counts a solve answered from the cache (hit) or solved (miss), see ScheduleTasks.solve
+    def countSolve(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    # Entry of the latest problem with the same structure, or None (called after a missed get)
+    def getSimilar(self, structureKey):
+        fingerprint = self.structures.get(structureKey)
+        entry = self.entries.get(fingerprint) if fingerprint is not None else None
+        if entry is not None:
+            self.nearHits += 1
+        return entry
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        if self.directory is not None:
+            self._writeDisk(key.fingerprint, entry)
+
+    # Share of solves answered from the cache
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'near-hits': self.nearHits,
+            'misses': self.misses,
+            'hit-rate': self.hitRate(),
+            'entries': len(self.entries),
+            'disk-bytes': self.diskBytes,
+        }
+
+    # Keep entry in memory as the latest of its structure
+    def _remember(self, key, entry):
+        self.entries[key.fingerprint] = entry
+        self.entries.move_to_end(key.fingerprint)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+        self.structures[key.structureKey] = key.fingerprint
+        self.structures.move_to_end(key.structureKey)
+        while len(self.structures) > self.maxEntries:
+            self.structures.popitem(last=False)
+
+    def _diskFiles(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.pickle')]
+
+    def _readDisk(self, fingerprint):
+        path = os.path.join(self.directory, fingerprint + '.pickle')
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+            # The modification time orders the files for eviction
+            os.utime(path)
+            return entry
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _writeDisk(self, fingerprint, entry):
+        path = os.path.join(self.directory, fingerprint + '.pickle')
+        previousSize = os.path.getsize(path) if os.path.exists(path) else 0
+        # Write to a temporary file first so readers never see half an entry
+        fd, temporaryPath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryPath, path)
+        self.diskBytes += os.path.getsize(path) - previousSize
+        if self.maxDiskBytes is not None and self.diskBytes > self.maxDiskBytes:
+            self._evictDisk()
+
+    # Delete the least recently used files until the cache is back under 90% of maxDiskBytes
+    def _evictDisk(self):
+        files = sorted((os.path.getmtime(path), path) for path in self._diskFiles())
+        for _, path in files:
+            if self.diskBytes <= 0.9 * self.maxDiskBytes:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.diskBytes -= size
+            except OSError:
+                pass
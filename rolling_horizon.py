@@ -0,0 +1,357 @@
+import time
+
+from input_interfaces import (Activity, ActivityGroup, Attention, BufferTime, Disturbance, DisturbanceMarkedTimes,
+                              InvalidInputError, ScheduleTime, resourcesOf, validateUserData)
+from presolve import tracksOf
+from scheduler import ScheduleTasks
+from solve_result import ScheduledActivity, SolveResult
+from solver_config import SolverConfig
+
+
+# Solve a long plan (e.g. a week) window by window instead of in one model
+# Each window commits windowLength minutes of the plan and is solved together with lookahead minutes
+# after them (default half a window): activities it places to start before the end of the window are
+# frozen, while activities it places in the lookahead or does not fit are carried forward to the next
+# window, warm started from where this window put them. Activities that run past the end of a window
+# stay in place as frozen activities of the next one
+# Every window gets windowConfig (default no time limit), so the run time grows linearly with the
+# length of the plan. Movable activities enter a window in priority order while each of their tracks
+# holds less than admissionFactor times its capacity over the window, so that a window's model stays
+# small however many activities may float over the whole plan. Since a later window can still place
+# them, these activities (and fixed ones in the lookahead) do not hold back the window's later levels
+# An activity a window could start but left unplaced takes precedence in the next windows, which
+# place it before their own activities of later levels. Once no window can place an activity any more,
+# its level is incomplete and, by the priority cascade of the whole plan, every later level is lost:
+# windows stop admitting those, and the ones committed earlier are taken out at the end
+# The plan is then scored by the model of the whole plan with every variable fixed to the schedule, so
+# objective and penalties are those of a one model solve (which makes the last step a model build,
+# linear in the plan's length)
+def solveRollingHorizon(userData, windowLength, lookahead=None, compactSchedule=True, windowConfig=None,
+                        mode='weighted', admissionFactor=1):
+    startTime = time.time()
+    validateUserData(userData)
+    if not isinstance(windowLength, int) or windowLength < 1:
+        raise InvalidInputError('windowLength must be a positive int, got ' + repr(windowLength))
+    lookahead = windowLength // 2 if lookahead is None else lookahead
+    windowConfig = windowConfig or SolverConfig()
+    plan = _Plan(userData)
+
+    windowReports = []
+    boundary = plan.startTime
+    while boundary < plan.endTime:
+        windowEnd = min(plan.endTime, boundary + windowLength)
+        window = plan.window(boundary, windowEnd, lookahead, admissionFactor)
+        scheduler = ScheduleTasks(window.userData, compactSchedule=compactSchedule, solverConfig=windowConfig,
+                                  deferrable=window.deferrable)
+        if window.straddlers:
+            scheduler.warmStart(window.hints, freezeBefore=boundary)
+        elif window.hints:
+            scheduler.warmStart(window.hints)
+        result = scheduler.solve(mode=mode, keepSolutions=0)
+        committed = plan.commit(window, scheduler.activityStarts() or [None] * len(window.indices), windowEnd)
+        windowReports.append({
+            'start': boundary,
+            'end': windowEnd,
+            'horizon-end': window.horizonEnd,
+            'activities': len(window.indices),
+            'committed': committed,
+            'status': result.status,
+            'wall-time': result.wallTime,
+        })
+        boundary = windowEnd
+
+    dropped = plan.reconcile()
+    report = {'windows': windowReports, 'dropped-by-cascade': dropped}
+    result = _score(userData, plan.starts, compactSchedule, mode, windowConfig, report)
+    result.wallTime = time.time() - startTime
+    return result
+
+
+# SolveResult of the whole plan for the given starts, scored by its full model with every variable
+# fixed to them; the result has no bound and is FEASIBLE when the full model accepts the plan
+# (rolling horizon proves nothing), else it keeps the status of the fixed solve (e.g. INFEASIBLE)
+# with the plan's starts and no objective
+def _score(userData, starts, compactSchedule, mode, windowConfig, report):
+    scheduler = ScheduleTasks(userData, compactSchedule=compactSchedule,
+                              solverConfig=SolverConfig(numSearchWorkers=windowConfig.numSearchWorkers))
+    scheduler.warmStart(starts)
+    scheduler.solver.parameters.fix_variables_to_their_hinted_value = True
+    result = scheduler.solve(mode=mode, keepSolutions=0)
+    report['scoring-time'] = result.wallTime
+    if not result.hasSolution():
+        activities = userData['buffer-times'] + userData['activities']
+        placed = [ScheduledActivity(activity.name, start, activity.duration, activity.priority)
+                  for activity, start in zip(activities, starts) if start is not None]
+        placed.sort(key=lambda activity: activity.start)
+        unplaced = [ScheduledActivity(activity.name, None, activity.duration, activity.priority)
+                    for activity, start in zip(activities, starts) if start is None]
+        result = SolveResult(status=result.status, objective=None, bound=None, wallTime=0.0, placed=placed, unplaced=unplaced)
+    else:
+        result.status = 'FEASIBLE'
+    result.bound = None
+    result.horizon = report
+    return result
+
+
+# The model of one window
+#   userData    the window's day: schedule time [solveStart, horizonEnd), groups and disturbance
+#               times cut to it, frozen activities then admitted ones
+#   indices     index into buffer-times + activities of the plan of each buffer and activity of
+#               userData, in model order
+#   straddlers  indices of the frozen activities, committed by an earlier window and running past its end
+#   hints       starts of the first buffers and activities of userData (see ScheduleTasks.warmStart)
+#   deferrable  buffers and activities of userData a later window can still place, which do not hold
+#               back the window's later priority levels (see ScheduleTasks)
+class _Window:
+    def __init__(self, userData, indices, straddlers, hints, horizonEnd, deferrable):
+        self.userData = userData
+        self.indices = indices
+        self.straddlers = straddlers
+        self.hints = hints
+        self.horizonEnd = horizonEnd
+        self.deferrable = deferrable
+
+
+# State of a rolling horizon solve: the buffers and activities of the plan and what was committed
+class _Plan:
+    def __init__(self, userData):
+        self.userData = userData
+        scheduleTime = userData['schedule-time'][0]
+        self.startTime = scheduleTime.startTime
+        self.endTime = scheduleTime.endTime
+        self.activities = userData['buffer-times'] + userData['activities']
+        self.capacities = {None: 1}
+        self.capacities.update((resource.name, resource.capacity) for resource in resourcesOf(userData))
+        self.groupWindows = {group.name: (group.startTime, group.endTime) for group in userData['activity-groups']}
+
+        # Committed start of each buffer and activity (None while not committed)
+        self.starts = [None] * len(self.activities)
+        # Start of each buffer and activity in the last window that had it (None if not fitted there)
+        self.lastStarts = {}
+        # Fixed start ones by start, movable ones by the first start of their windows, consumed
+        # as windows reach them
+        self.fixed = sorted((index for index, activity in enumerate(self.activities) if activity.startTime is not None),
+                            key=lambda index: self.activities[index].startTime)
+        # (start, end) times each movable buffer or activity may take (see _windows)
+        self.windowsByIndex = {index: self._windows(index) for index, activity in enumerate(self.activities)
+                               if activity.startTime is None}
+        self.movable = sorted(self.windowsByIndex,
+                              key=lambda index: min([start for start, _ in self.windowsByIndex[index]] or [self.endTime]))
+        self.nextFixed = 0
+        self.nextMovable = 0
+        # Movable activities reached by a window and not committed yet
+        self.pending = set()
+        # Fixed start activities a window placed in its lookahead, to be solved again by the next one
+        self.carriedFixed = []
+        # Movable activities a window could start before its end but did not admit or left unplaced
+        self.leftUnplaced = set()
+        # Committed activities that may still run past the start of the next window
+        self.running = set()
+        # Highest level (lowest priority number) with an activity no window can place any more; the
+        # priority cascade of the plan takes out every later level, so windows no longer admit them
+        self.lostPriority = None
+
+    # (start, end) times a movable buffer or activity may take: its group or the whole plan, and
+    # the disturbance times its attention allows
+    def _windows(self, index):
+        activity = self.activities[index]
+        windows = [(self.startTime, self.endTime)]
+        if not isinstance(activity, BufferTime):
+            if activity.groupName is not None:
+                windows = [self.groupWindows[activity.groupName]]
+            disturbance = {Attention.HIGH: Disturbance.LOW, Attention.LOW: Disturbance.HIGH}.get(activity.attentionRequired)
+            windows += [(dis.startTime, dis.endTime) for dis in self.userData['disturbance-marked-times']
+                        if dis.disturbance == disturbance]
+        return [(start, end) for start, end in windows if end - start >= activity.duration]
+
+    # Record that no window can place the buffer or activity at index any more
+    def _lose(self, index):
+        priority = self.activities[index].priority
+        if self.lostPriority is None or priority < self.lostPriority:
+            self.lostPriority = priority
+
+    # Whether the plan's priority cascade already takes out the level of the buffer or activity at index
+    def _isLostLevel(self, index):
+        return self.lostPriority is not None and self.activities[index].priority > self.lostPriority
+
+    # The window committing [boundary, windowEnd)
+    def window(self, boundary, windowEnd, lookahead, admissionFactor):
+        self.running = set(index for index in self.running
+                           if self.starts[index] is not None and self.starts[index] + self.activities[index].duration > boundary)
+        straddlers = sorted(self.running)
+        for index in self.carriedFixed:
+            if self.activities[index].startTime < boundary:
+                self._lose(index)
+        carriedFixed = [index for index in self.carriedFixed if self.activities[index].startTime >= boundary]
+        for index in self.pending:
+            if not self._isReachable(index, boundary):
+                self._lose(index)
+        self.pending = set(index for index in self.pending if self._isReachable(index, boundary))
+        horizonEnd = min(self.endTime, windowEnd + lookahead)
+        horizonEnd = max([horizonEnd] + [self.starts[index] + self.activities[index].duration for index in straddlers] +
+                         [self.activities[index].startTime + self.activities[index].duration for index in carriedFixed])
+
+        # Fixed start activities the window reaches; the horizon grows to hold each of them whole
+        fixed = []
+        while self.nextFixed < len(self.fixed):
+            index = self.fixed[self.nextFixed]
+            activity = self.activities[index]
+            if activity.startTime >= horizonEnd:
+                break
+            if activity.startTime >= boundary:
+                fixed.append(index)
+                horizonEnd = max(horizonEnd, activity.startTime + activity.duration)
+            else:
+                self._lose(index)
+            self.nextFixed += 1
+        fixed = [index for index in carriedFixed + fixed if not self._isLostLevel(index)]
+
+        while self.nextMovable < len(self.movable):
+            index = self.movable[self.nextMovable]
+            if min([start for start, _ in self.windowsByIndex[index]] or [self.endTime]) >= horizonEnd:
+                break
+            self.pending.add(index)
+            self.nextMovable += 1
+
+        groups = [ActivityGroup(group.name, max(group.startTime, boundary), min(group.endTime, horizonEnd))
+                  for group in self.userData['activity-groups']
+                  if max(group.startTime, boundary) < min(group.endTime, horizonEnd)]
+        groupWindows = {group.name: (group.startTime, group.endTime) for group in groups}
+        disturbanceTimes = [DisturbanceMarkedTimes(dis.disturbance, max(dis.startTime, boundary), min(dis.endTime, horizonEnd))
+                            for dis in self.userData['disturbance-marked-times']
+                            if max(dis.startTime, boundary) < min(dis.endTime, horizonEnd)]
+
+        # Movable activities that fit the window: those that can start in it in priority order, at each
+        # level first those for which this is the last window (always), then those that may also start
+        # later, and after all of them those that can only start in the lookahead (the last two while
+        # their tracks hold less than admissionFactor times their capacity over the window)
+        # Activities an earlier window could start but did not admit or place take precedence: they are
+        # always admitted, and are not deferrable while they can start in the window, so that its later
+        # levels wait for them instead of taking their time. Nor are activities no window after this
+        # one's horizon can place, as the window sees all their chances. Lost levels are left out
+        admitted = []
+        deferrable = set(index for index in fixed if self.activities[index].startTime >= windowEnd)
+        budget = {track: admissionFactor * capacity * (horizonEnd - boundary) for track, capacity in self.capacities.items()}
+        candidates = []
+        for index in self.pending:
+            activity = self.activities[index]
+            windows = self.windowsByIndex[index]
+            if self._isLostLevel(index):
+                continue
+            starts = [max(start, boundary) for start, end in windows if min(end, horizonEnd) - max(start, boundary) >= activity.duration]
+            if not starts or not self._groupInWindow(activity, groupWindows):
+                continue
+            if not self._isReachable(index, windowEnd):
+                rank = 0
+            elif min(starts) < windowEnd:
+                rank = 1
+            else:
+                rank = 2
+            candidates.append((rank == 2, activity.priority, rank, index))
+        for _, _, rank, index in sorted(candidates):
+            tracks = tracksOf(self.activities[index])
+            duration = self.activities[index].duration
+            leftUnplaced = index in self.leftUnplaced
+            if rank > 0 and not leftUnplaced and any(budget[track] < duration for track in tracks):
+                if rank == 1:
+                    self.leftUnplaced.add(index)
+                continue
+            for track in tracks:
+                budget[track] -= duration
+            admitted.append(index)
+            if self._isReachable(index, horizonEnd) and (rank == 2 or not leftUnplaced):
+                deferrable.add(index)
+
+        # Known activities first so that the hints cover them
+        known = [index for index in fixed + admitted if index in self.lastStarts]
+        new = [index for index in fixed + admitted if index not in self.lastStarts]
+        ordered = straddlers + known + new
+        buffers = [index for index in ordered if isinstance(self.activities[index], BufferTime)]
+        others = [index for index in ordered if not isinstance(self.activities[index], BufferTime)]
+        indices = buffers + others
+        # Buffers are always hinted (new movable ones as not fitted), so that the hints reach the
+        # frozen activities, which warmStart keeps in place
+        hints = []
+        for index in indices:
+            if index in self.running:
+                hints.append(self.starts[index])
+            elif index in self.lastStarts:
+                hints.append(self.lastStarts[index])
+            elif self.activities[index].startTime is not None or isinstance(self.activities[index], BufferTime):
+                hints.append(self.activities[index].startTime)
+            else:
+                break
+
+        solveStart = min([boundary] + [self.starts[index] for index in straddlers])
+        userData = {
+            'schedule-time': [ScheduleTime(solveStart, horizonEnd)],
+            'buffer-times': [self._windowActivity(index, index in self.running, groupWindows) for index in buffers],
+            'activity-groups': groups,
+            'activities': [self._windowActivity(index, index in self.running, groupWindows) for index in others],
+            'disturbance-marked-times': disturbanceTimes,
+            'resources': resourcesOf(self.userData),
+        }
+        windowActivities = userData['buffer-times'] + userData['activities']
+        return _Window(userData, indices, set(straddlers), hints, horizonEnd,
+                       [activity for index, activity in zip(indices, windowActivities) if index in deferrable])
+
+    # Whether a window starting at boundary can still place the movable buffer or activity at index:
+    # one of its times leaves room for it after boundary, and its group (if any) has not ended
+    def _isReachable(self, index, boundary):
+        activity = self.activities[index]
+        if getattr(activity, 'groupName', None) is not None and self.groupWindows[activity.groupName][1] <= boundary:
+            return False
+        return any(end - activity.duration >= boundary for _, end in self.windowsByIndex[index])
+
+    # An activity whose group the window cut off cannot enter it, even to go in a disturbance time
+    def _groupInWindow(self, activity, groupWindows):
+        return getattr(activity, 'groupName', None) is None or activity.groupName in groupWindows
+
+    # Buffer or activity as it enters a window: frozen ones become fixed priority 1 activities, so the
+    # window's priority cascade does not depend on them, and fixed ones leave groups the window cut off
+    def _windowActivity(self, index, frozen, groupWindows):
+        activity = self.activities[index]
+        if isinstance(activity, BufferTime):
+            return BufferTime(activity.duration, startTime=self.starts[index]) if frozen else activity
+        if frozen:
+            return Activity(activity.name, activity.duration, startTime=self.starts[index], priority=1,
+                            resources=activity.resources)
+        if activity.startTime is not None and activity.groupName is not None and activity.groupName not in groupWindows:
+            return Activity(activity.name, activity.duration, startTime=activity.startTime, priority=activity.priority,
+                            attentionRequired=activity.attentionRequired, resources=activity.resources)
+        return activity
+
+    # Commit what a window placed to start before windowEnd (everything it placed at the end of the
+    # plan) and remember where it put the rest; returns the number of activities committed
+    def commit(self, window, windowStarts, windowEnd):
+        committed = 0
+        self.carriedFixed = []
+        for index, start in zip(window.indices, windowStarts):
+            if index in window.straddlers:
+                continue
+            self.lastStarts[index] = start
+            self.leftUnplaced.discard(index)
+            if start is not None and (start < windowEnd or windowEnd == self.endTime):
+                self.starts[index] = start
+                self.pending.discard(index)
+                self.running.add(index)
+                committed += 1
+            elif self.activities[index].startTime is not None:
+                self.carriedFixed.append(index)
+            elif start is None and min(windowStart for windowStart, _ in self.windowsByIndex[index]) < windowEnd:
+                self.leftUnplaced.add(index)
+        return committed
+
+    # Take out committed activities of levels after the first level the plan leaves incomplete
+    # (the priority cascade of the whole plan); returns how many were taken out
+    def reconcile(self):
+        unplacedLevels = [activity.priority for activity, start in zip(self.activities, self.starts) if start is None]
+        if not unplacedLevels:
+            return 0
+        blockedPriority = min(unplacedLevels)
+        dropped = 0
+        for index, activity in enumerate(self.activities):
+            if self.starts[index] is not None and activity.priority > blockedPriority:
+                self.starts[index] = None
+                dropped += 1
+        return dropped
@@ -1,15 +1,101 @@
 import collections
+import contextlib
 import time
+import numpy as np
 from ortools.sat.python import cp_model
 
+from activity_columns import ActivityColumns
+from anytime import AnytimeSolve
+from greedy import greedySchedule
+from input_interfaces import (Attention, BufferTime, Disturbance, InvalidInputError, resourcesOf, validateActivity,
+                              validateUserData)
+from presolve import presolveUserData, tracksOf
+from profiler import Profiler
+from result_cache import problemKey
+from solve_result import ScheduledActivity, SolutionSnapshot, SolveResult
+from solver_config import SolverConfig
+
+
+# Model variables of one activity interval
+ActivityVar = collections.namedtuple('ActivityVars', 'start, end, interval, isPresent, data')
+
+# Constraints of one track: the schedule's own track (key None), taken by activities without
+# resources, or a resource, holding up to capacity activities at a time
+# Both constraints are given by their index in the model proto
+#   constraint          NoOverlap of the track's intervals for capacity 1, else Cumulative with demand 1
+#   capacityConstraint  redundant sum(duration * isPresent) in [0, capacity * schedule length]
+#   lastEnd             every present interval of the track ends before it (compact schedules only)
+Track = collections.namedtuple('Track', 'capacity, constraint, capacityConstraint, lastEnd')
+
+# Stands in for a profiler phase when profiling is off
+_NO_PHASE = contextlib.nullcontext()
+
+
+# Flattened domain [first, last, ...] of start ranges [[first, last], ...], which may overlap
+def _flatDomain(ranges):
+    if len(ranges) == 1:
+        return ranges[0]
+    return cp_model.Domain.FromIntervals(ranges).FlattenedIntervals()
+
+
+# sum(coeffs[i] * variables[i]) + constant as one flat expression (constant without variables):
+# cp_model reads it much faster than the nested sums sum() builds, which matters for the objective
+# terms of large inputs since Minimize and the solution callback read the whole expression
+def _weightedSum(variables, coeffs, constant=0):
+    if not variables:
+        return constant
+    return cp_model.LinearExpr.WeightedSum(variables, coeffs) + constant
+
+
+# Rows of model proto indices as an int32 array of the given number of columns (see ScheduleTasks.modelIndex)
+def _indexArray(rows, columns=None):
+    array = np.array(rows, dtype=np.int32)
+    return array.reshape(len(rows), columns) if columns is not None else array
+
+
+# cp_model wrapper of a variable (or, with isInterval, an interval constraint) already in the model
+# proto at the given index, for the variables built or loaded straight into the proto
+# This uses the private IntVar and IntervalVar constructors of OR-Tools 9.8 (the pinned version):
+# their signatures change between releases, so check them here when upgrading
+def _protoHandle(proto, index, isInterval=False):
+    if isInterval:
+        return cp_model.IntervalVar(proto, index, None, None, None, None)
+    return cp_model.IntVar(proto, index, None)
+
 
 class ScheduleTasks:
 
-    def __init__(self, userData):
-        self.userData = userData
+    # Stages of the lexicographic solve, each minimizing the named objective terms in this order
+    LEXICOGRAPHIC_STAGES = [
+        ('priority coverage', ['not present']),
+        ('second choice', ['second choice']),
+        ('compaction', ['order changed', 'gaps']),
+    ]
+
+    def __init__(self, userData, compactSchedule=True, penalizeOrderChanges=False, solverConfig=None, cache=None, presolve=True,
+                 deferrable=(), greedy=False, profile=False, variableNames=False, variableFixedStarts=False, template=None,
+                 absent=()):
+        # Reject malformed input before any variable is created
+        validateUserData(userData)
+        # Copy the activity lists, which addActivity and removeActivity keep in sync with the model
+        self.userData = dict(userData)
+        self.userData['buffer-times'] = list(userData['buffer-times'])
+        self.userData['activities'] = list(userData['activities'])
+        # Whether idle time between activities is penalized in the objective
+        self.compactSchedule = compactSchedule
+        # Whether activities scheduled out of their input order are penalized in the objective
+        self.penalizeOrderChanges = penalizeOrderChanges
         # Initialize OR-Tools model and solver
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
+        # With profile, a profiler.Profiler timing the build phases and recording the stats of every
+        # solve stage; SolveResult.profile holds its report
+        self.profiler = Profiler(self.model) if profile else None
+        # The priority cascade lives in enforced constraints, which are only added to the
+        # LP relaxation from linearization level 2; without it the LP ignores the cascade entirely
+        self.solver.parameters.linearization_level = 2
+        # Time limit, worker threads, gap limits, seed and logging used by solve()
+        self.solverConfig = solverConfig or SolverConfig()
 
         # Set overall time interval inside of which all activities must be scheduled
         self.startScheduleTime = userData['schedule-time'][0].startTime
@@ -17,358 +103,1071 @@ class ScheduleTasks:
 
         # Create container for activity variables
         self.activityVars = []
-        # Container for activity variables which will be charged negative penalty for being present
-        self.secondChoiceActivityVars = []
+        # id(activity variable) -> (activity variable, literal charged a penalty when it is fitted to a second choice time)
+        self.secondChoiceVars = collections.OrderedDict()
         # This variable will contain model's objective variable which will be used to find the optimal solution
         self.objectiveScoreVar = None
+        # Expression last set as the model's objective (see _minimize)
+        self._minimizedPenalty = None
         # Container to store extra variables to pass to solution printer
         self.extraVariables = {}
+        # Snapshot of the schedule returned by the last solve
+        self.lastSnapshot = None
+        # Whether to prune activities that can never be present and tighten start domains before
+        # building the model (see presolve.py); presolveReport describes what it did
+        # Order changed indicators also compare the starts of intervals that are not present, so
+        # narrowing those would change the order penalty: with it, presolve is off
+        # Presolve also depends on the fixed start times, which a model with variable fixed starts
+        # leaves open: with those it is off too
+        self.usePresolve = presolve and not penalizeOrderChanges and not variableFixedStarts and template is None
+        self.presolve = None
+        self.presolveReport = None
+        # ids of the buffers and activities whose absence does not hold back later priority levels:
+        # like any other they need every level before their own, but a level is complete without them
+        self.deferrable = set(id(activity) for activity in deferrable)
+        # ids of the buffers and activities that can never be present (e.g. the ones granularity.py
+        # cannot express in slots): like the ones presolve prunes they keep an entry fixed not present,
+        # so their priority level stays incomplete and holds back the later levels
+        self.absent = set(id(activity) for activity in absent)
+        # Whether a solve without any other hint is warm started from the greedy schedule (see
+        # greedy.py) and falls back to it when the solver finds no schedule in time
+        self.greedy = greedy
+        # Whether the variables and intervals of activities are named after them (e.g. to read a
+        # model written with ExportToFile); the build skips the names otherwise
+        self.variableNames = variableNames
+        # Whether fixed start times are start and end variables whose domains hold only that time
+        # instead of constants, so that the model can take other fixed start times by changing those
+        # domains (see model_template.py)
+        self.variableFixedStarts = variableFixedStarts or template is not None
+        # Optional model_template.ModelTemplate whose model is loaded instead of building one; userData
+        # must match it (see ModelTemplate.matches) but for the fixed start times
+        self.template = template
+        if template is not None:
+            if self.deferrable or self.absent:
+                raise ValueError('A model template cannot have deferrable or absent activities')
+            if not template.matches(self.userData, compactSchedule, penalizeOrderChanges):
+                raise InvalidInputError('userData does not match the model template')
+
+        # Optional result_cache.ResultCache looked up before the model is built (see solve)
+        # Only the problem as constructed is cached: edits to the model stop using the cache
+        # The cache key does not know deferrable or absent activities, so with them the cache is not used
+        self.cache = cache if not self.deferrable and not self.absent else None
+        self.cacheKey = None
+        self._cacheEntry = None
+        self._edited = False
+        if self.cache is not None:
+            self.cacheKey = problemKey(self.userData, compactSchedule, penalizeOrderChanges)
+            self._cacheEntry = cache.get(self.cacheKey)
 
         # Finally create the actual model variables and constraints
-        self._addActivities()
+        # After a cache hit this waits until something needs the model
+        self.isBuilt = False
+        if self._cacheEntry is None:
+            self._build()
 
 
     class ScheduleTasksSolutionsPrinter(cp_model.CpSolverSolutionCallback):
-        """Print intermediate solutions."""
+        """Capture intermediate solutions and pass them to an optional reporter."""
 
-        def __init__(self, activityVars, objScoreVar, extraVariables):
+        def __init__(self, activityVars, objScoreVar, extraVariables, solutions=None, reporter=None):
             cp_model.CpSolverSolutionCallback.__init__(self)
-            self._activity_vars = activityVars
+            self.activityVars = activityVars
+            self.extraVariables = extraVariables
             self._obj_score_var = objScoreVar
             self._solution_count = 0
-            self._extra_variables = extraVariables
+            # Bounded ring buffer of SolutionSnapshots, the oldest are dropped first
+            self._solutions = solutions if solutions is not None else collections.deque(maxlen=1)
+            self._reporter = reporter
+            self.lastSnapshot = None
+            # Index of each start and presence variable in the solution vector (fixed starts are ints)
+            self._starts = [actVar.start if isinstance(actVar.start, int) else actVar.start.Index()
+                            for actVar in activityVars]
+            self._startIsFixed = [isinstance(actVar.start, int) for actVar in activityVars]
+            self._presents = [actVar.isPresent.Index() for actVar in activityVars]
 
-        # Override callback method to print solutions
+        # Override callback method to capture solutions
+        # Only raw values are copied here, in one copy of the solution vector instead of a call per
+        # variable, since the search waits for the callback; sorting and printing are left to the reporter
         def OnSolutionCallback(self):
             self._solution_count += 1
-
-            for key, var in self._extra_variables.items():
-                print(key, ': ', self.Value(var))
-
-            print('Objective Score: ', self.Value(self._obj_score_var), '\n')
-            sortedActivities = sorted(self._activity_vars, key=lambda act: self.Value(act.start))
-            for activityVar in sortedActivities:
-                if self.Value(activityVar.isPresent):
-                    print('At ' + str(self.Value(activityVar.start)) +
-                        '\tfor: ' + str(activityVar.data.duration) +
-                        '\t\tpriority: ' + str(activityVar.data.priority) +
-                        '\t' + activityVar.data.name)
-            print()
-            for activityVar in sortedActivities:
-                if not self.Value(activityVar.isPresent):
-                    print('At ' + str(self.Value(activityVar.start)) +
-                        '\tfor: ' + str(activityVar.data.duration) +
-                        '\t\tpriority: ' + str(activityVar.data.priority) +
-                        '\t' + activityVar.data.name + '\t\tNot fitted')
-            print('**************************')
+            solution = list(self.Response().solution)
+            snapshot = SolutionSnapshot(
+                objective=self.Value(self._obj_score_var),
+                bound=self.BestObjectiveBound(),
+                wallTime=self.WallTime(),
+                starts=[start if isFixed else solution[start] for start, isFixed in zip(self._starts, self._startIsFixed)],
+                presents=[solution[present] for present in self._presents],
+            )
+            self._solutions.append(snapshot)
+            self.lastSnapshot = snapshot
+            if self._reporter is not None:
+                self._reporter.onSolution(self, snapshot)
 
 
         def solutionCount(self):
             return self._solution_count
 
 
-    def solve(self):
-        # Creates solution printer callback to be passed to solver
-        solutionPrinter = self.ScheduleTasksSolutionsPrinter(self.activityVars, self.objectiveScoreVar, self.extraVariables)
-        # solve
-        # status = self.solver.SearchForAllSolutions(self.model, solutionPrinter)
+    # Solve the model and return a SolveResult
+    # mode is 'weighted' (one solve of the weighted objective) or 'lexicographic' (see _lexicographicStages)
+    # stageTimeLimits is an optional list with the time limit (seconds) of each lexicographic stage
+    # solverConfig overrides the config given to the constructor for this solve only
+    # reporter (e.g. solve_result.ConsoleReporter) is notified of every solution, stage and the result
+    # keepSolutions is the number of intermediate solutions kept in SolveResult.solutions
+    # With a cache, a day solved to a proven result before in the same mode (see _isProven) is
+    # answered from the cache without solving; any other cached schedule of it only warm starts the solve
+    # Only the answered solves count as hits of the cache, the others as misses
+    def solve(self, mode='weighted', stageTimeLimits=None, solverConfig=None, reporter=None, keepSolutions=10):
+        answered = self._cacheEntry is not None and self._cacheEntry.get(mode, {}).get('proven', False)
+        if self.cacheKey is not None:
+            self.cache.countSolve(answered)
+        if answered:
+            result = self._cachedResult(mode)
+            if reporter is not None:
+                reporter.onResult(result)
+            return result
+        self._ensureBuilt()
+
+        solverConfig = solverConfig or self.solverConfig
+        solverConfig.applyTo(self.solver.parameters)
+        if self.profiler is not None:
+            self.profiler.prepareSolver(self.solver.parameters)
+        # The objective is rebuilt after activities were added or removed
+        if self.objectiveScoreVar is None:
+            with self._phase('objective'):
+                self.objectiveScoreVar = self._cpObjectiveFunction()
+
+        if self.greedy and not self.model.Proto().solution_hint.vars:
+            self.warmStart(self.greedyStarts())
+
+        if mode == 'weighted':
+            stages = [('', self.objectiveScoreVar)]
+        elif mode == 'lexicographic':
+            stages = self._lexicographicStages()
+        else:
+            raise ValueError('Unknown solve mode: ' + str(mode))
+
+        result = self._solveStages(stages, stageTimeLimits, reporter, keepSolutions)
+        if self.greedy and result.status == 'UNKNOWN':
+            result = self._greedyResult(result, keepSolutions)
+        result.solverConfig = solverConfig.asDict()
+        result.presolve = self.presolveReport
+        if self.profiler is not None:
+            result.profile = self.profiler.asDict()
+        if self.cacheKey is not None and result.hasSolution() and result.fallback is None:
+            self._storeInCache(mode, result, self._isProven(result, solverConfig))
+        if reporter is not None:
+            reporter.onResult(result)
+        return result
+
+    # solve() in a background thread: returns an anytime.AnytimeSolve at once, which yields the
+    # improving solutions as they are found (decode them with activityStarts) and gives the
+    # SolveResult of the best one through result()
+    # stop is an optional anytime.StopCondition ending the search at a target objective, relative gap,
+    # time budget or stall; AnytimeSolve.stop() ends it at any time
+    # The model is built here, so build errors are raised by this call
+    def solveAsync(self, stop=None, mode='weighted', stageTimeLimits=None, solverConfig=None, keepSolutions=10):
+        self._ensureBuilt()
+        return AnytimeSolve(self, stop, mode=mode, stageTimeLimits=stageTimeLimits, solverConfig=solverConfig,
+                            keepSolutions=keepSolutions)
+
+    # The improving solutions of solveAsync as a generator; leaving the loop early stops the search
+    def iterSolutions(self, stop=None, mode='weighted', stageTimeLimits=None, solverConfig=None):
+        anytimeSolve = self.solveAsync(stop, mode, stageTimeLimits, solverConfig)
+        try:
+            yield from anytimeSolve
+        finally:
+            anytimeSolve.stop()
+            anytimeSolve.result()
+
+    # Make penalty the model's objective, unless it already is: reading the objective expression
+    # of a large model takes a while, and a weighted solve right after the build would repeat it
+    def _minimize(self, penalty):
+        if penalty is not self._minimizedPenalty:
+            self.model.Minimize(penalty)
+            self._minimizedPenalty = penalty
+
+    # Stages of the lexicographic solve as (name, penalty) pairs, see LEXICOGRAPHIC_STAGES
+    # Stages whose penalty is a constant (e.g. no second choice intervals) are left out
+    def _lexicographicStages(self):
+        stages = []
+        for stageName, terms in self.LEXICOGRAPHIC_STAGES:
+            stagePenalty = sum([self.objectiveTerms[term] for term in terms if term in self.objectiveTerms])
+            if not isinstance(stagePenalty, int):
+                stages.append((stageName, stagePenalty))
+        return stages or [('', self.objectiveScoreVar)]
+
+    # Minimize the penalty of each stage in turn
+    # After each stage its optimum is added as an upper bound on the stage penalty and the stage
+    # solution is given as a hint to the next stage, so no weights between the stages are needed
+    # The bounds are removed again once the stages are done, so later solves of the model (e.g. after
+    # removeActivity) do not inherit them
+    def _solveStages(self, stages, stageTimeLimits, reporter, keepSolutions):
+        solutions = collections.deque(maxlen=keepSolutions)
+        stageTimeLimits = list(stageTimeLimits or [])
+        defaultTimeLimit = self.solver.parameters.max_time_in_seconds
+
+        stageResults = []
+        lastSnapshot = None
+        status = cp_model.UNKNOWN
+        objective = bound = None
+        penalties = {}
+        solutionCount = 0
+        wallTime = 0.0
+        firstStageBound = len(self.model.Proto().constraints)
+        try:
+            for stageIndex, (stageName, stagePenalty) in enumerate(stages):
+                self._minimize(stagePenalty)
+                if stageIndex < len(stageTimeLimits) and stageTimeLimits[stageIndex] is not None:
+                    self.solver.parameters.max_time_in_seconds = stageTimeLimits[stageIndex]
+
+                solutionCallback = self.ScheduleTasksSolutionsPrinter(
+                    self.activityVars, stagePenalty, self.extraVariables, solutions, reporter)
+                solveStart = time.perf_counter()
+                status = self.solver.Solve(self.model, solutionCallback)
+                self.solver.parameters.max_time_in_seconds = defaultTimeLimit
+                if self.profiler is not None:
+                    self.profiler.recordSolve(stageName, self.solver, solveStart)
+
+                solutionCount += solutionCallback.solutionCount()
+                wallTime += self.solver.WallTime()
+                hasSolution = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+                stageResults.append({
+                    'name': stageName,
+                    'status': self.solver.StatusName(status),
+                    'objective': self.solver.ObjectiveValue() if hasSolution else None,
+                    'wall-time': self.solver.WallTime(),
+                })
+                if reporter is not None:
+                    reporter.onStage(stageName, self.solver.StatusName(status), solutionCallback.solutionCount(), self.solver.WallTime())
+                if not hasSolution:
+                    break
+
+                lastSnapshot = solutionCallback.lastSnapshot or lastSnapshot
+                objective = self.solver.ObjectiveValue()
+                bound = self.solver.BestObjectiveBound()
+                penalties = {term: self.solver.Value(penalty) for term, penalty in self.objectiveTerms.items()}
+                if stageIndex < len(stages) - 1:
+                    # Keep this stage's optimum and warm start the next stage from its solution
+                    self.model.Add(stagePenalty <= int(self.solver.Value(stagePenalty)))
+                    self._hintCurrentSolution()
+        finally:
+            del self.model.Proto().constraints[firstStageBound:]
+
+        statusName = self.solver.StatusName(status)
+        # A later lexicographic stage that found nothing still leaves the schedule of the earlier ones
+        if lastSnapshot is not None and status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            statusName = 'FEASIBLE'
+        self.lastSnapshot = lastSnapshot
+        placed, unplaced = self._scheduledActivities(lastSnapshot)
+        return SolveResult(
+            status=statusName,
+            objective=objective,
+            bound=bound,
+            wallTime=wallTime,
+            placed=placed,
+            unplaced=unplaced,
+            solutionCount=solutionCount,
+            solutions=solutions,
+            penalties=penalties,
+            stages=stageResults if len(stages) > 1 else [],
+        )
+
+    # Result of the greedy schedule when the solve found nothing in time: the model with every
+    # variable fixed to the schedule is solved (without time limit, which takes no search) to score
+    # it with the weighted objective, in any mode; FEASIBLE without bound, fallback 'greedy'
+    def _greedyResult(self, failed, keepSolutions):
+        self.warmStart(self.greedyStarts())
+        self.solver.parameters.fix_variables_to_their_hinted_value = True
+        self.solver.parameters.ClearField('max_time_in_seconds')
+        try:
+            result = self._solveStages([('', self.objectiveScoreVar)], None, None, keepSolutions)
+        finally:
+            self.solver.parameters.ClearField('fix_variables_to_their_hinted_value')
+        if not result.hasSolution():
+            return failed
+        result.status = 'FEASIBLE'
+        result.bound = None
+        result.wallTime += failed.wallTime
+        result.fallback = 'greedy'
+        return result
+
+    # Split activities into placed (sorted by start) and unplaced lists of ScheduledActivity
+    def _scheduledActivities(self, snapshot):
+        placed = []
+        placedKeys = set()
+        if snapshot is not None:
+            for i, actVar in enumerate(self.activityVars):
+                if snapshot.presents[i]:
+                    placed.append(ScheduledActivity(actVar.data.name, snapshot.starts[i], actVar.data.duration, actVar.data.priority))
+                    placedKeys.add(id(actVar.data))
+        placed.sort(key=lambda activity: activity.start)
+
+        unplaced = []
+        for actVar in self.activityVars:
+            if id(actVar.data) not in placedKeys:
+                placedKeys.add(id(actVar.data))
+                unplaced.append(ScheduledActivity(actVar.data.name, None, actVar.data.duration, actVar.data.priority))
+        return placed, unplaced
+
+    # Hint every activity variable with its value in the last solution found by the solver
+    def _hintCurrentSolution(self):
+        self.model.ClearHints()
+        for actVar in self.activityVars:
+            self.model.AddHint(actVar.isPresent, self.solver.Value(actVar.isPresent))
+            if not isinstance(actVar.start, int):
+                self.model.AddHint(actVar.start, self.solver.Value(actVar.start))
+                self.model.AddHint(actVar.end, self.solver.Value(actVar.end))
+        for actVar, secondChoice in self.secondChoiceVars.values():
+            if secondChoice is not actVar.isPresent:
+                self.model.AddHint(secondChoice, self.solver.Value(secondChoice))
+
+    # Warm start the next solve from a previous schedule of the same (possibly edited) day
+    # previous is a SolveResult or a mapping of activity name -> start time (None if not fitted),
+    # or a list of start times in model order (as returned by activityStarts)
+    # Activities are matched by name, repeated names (e.g. buffers) in order, or by position for a
+    # list; activities that are new in this model get no hint. If freezeBefore is given, activities that previously started
+    # before it are fixed in place and nothing else may start before it
+    def warmStart(self, previous, freezeBefore=None):
+        self._ensureBuilt()
+        if freezeBefore is not None:
+            self._stopCaching()
+        positionalStarts = None
+        startsByName = {}
+        if isinstance(previous, (list, tuple)):
+            positionalStarts = previous
+        elif isinstance(previous, SolveResult):
+            for activity in previous.placed + previous.unplaced:
+                startsByName.setdefault(activity.name, collections.deque()).append(activity.start)
+        else:
+            for name, start in previous.items():
+                startsByName.setdefault(name, collections.deque()).append(start)
+
+        self.model.ClearHints()
+        for position, activityVars in enumerate(self._activityVarsByActivity().values()):
+            if positionalStarts is not None:
+                known = position < len(positionalStarts)
+                previousStart = positionalStarts[position] if known else None
+            else:
+                previousStarts = startsByName.get(activityVars[0].data.name)
+                known = previousStarts is not None
+                previousStart = previousStarts.popleft() if previousStarts else None
+            # Activities unknown to the previous schedule are left to the solver
+            hintedVar = self._hintActivity(activityVars, previousStart) if known else None
+
+            if freezeBefore is None:
+                continue
+            for actVar in activityVars:
+                if actVar is hintedVar and previousStart < freezeBefore:
+                    self.model.Add(actVar.isPresent == 1)
+                    self.model.Add(actVar.start == previousStart)
+                else:
+                    self.model.Add(actVar.start >= freezeBefore).OnlyEnforceIf(actVar.isPresent)
+
+    # Hint one activity to start at the given time (None: not fitted) and return the hinted interval
+    def _hintActivity(self, activityVars, start):
+        hintedVar = None
+        if start is not None:
+            hintedVar = next((actVar for actVar in activityVars
+                              if actVar.interval is not None and self._canStartAt(actVar, start)), None)
+        for actVar in activityVars:
+            self.model.AddHint(actVar.isPresent, actVar is hintedVar)
+            if actVar is hintedVar and not isinstance(actVar.start, int):
+                self.model.AddHint(actVar.start, start)
+                self.model.AddHint(actVar.end, start + actVar.data.duration)
+        return hintedVar
+
+    # Whether the interval of actVar can start at the given time
+    def _canStartAt(self, actVar, start):
+        if isinstance(actVar.start, int):
+            return actVar.start == start
+        return self._inDomain(actVar.start, start) and self._inDomain(actVar.end, start + actVar.data.duration)
+
+    @staticmethod
+    def _inDomain(var, value):
+        domain = var.Proto().domain
+        return any(domain[i] <= value <= domain[i + 1] for i in range(0, len(domain), 2))
+
+    # Activity variables grouped by activity, in model order
+    # Every activity has a single interval, disturbance times included in its start domain
+    def _activityVarsByActivity(self):
+        activityVarsByActivity = collections.OrderedDict()
+        for actVar in self.activityVars:
+            activityVarsByActivity.setdefault(id(actVar.data), []).append(actVar)
+        return activityVarsByActivity
+
+    # Build phase of the given name for the profiler (a no-op context without profiling)
+    def _phase(self, name):
+        return self.profiler.phase(name) if self.profiler is not None else _NO_PHASE
+
+    def _build(self):
+        with self._phase('build'):
+            if self.template is not None:
+                self._loadModel()
+            else:
+                self._buildModel()
+
+    def _buildModel(self):
+        self.isBuilt = True
+        # Start and end variables whose domains presolve cut, with the start ranges without the cuts
+        self._tightenedVars = []
+        if self.usePresolve:
+            with self._phase('presolve'):
+                self.presolve = presolveUserData(self.userData, self.deferrable)
+        self._addActivities()
+        if self.presolve is not None:
+            self.presolveReport = {
+                'pruned': [{'name': activity.name, 'priority': int(activity.priority), 'reason': reason}
+                           for activity, reason in self.presolve.pruned.values()],
+                'blocked-priority': self.presolve.blockedPriority,
+                'tightened-domains': len(self._tightenedVars),
+                'wall-time': self.presolve.wallTime,
+            }
+        # Start from a cached schedule of this day (not proven, or of another mode), or else of a day with the same structure
+        if self.cache is not None:
+            entry = self._cacheEntry or self.cache.getSimilar(self.cacheKey.structureKey)
+            if entry is not None:
+                self.model.ClearHints()
+                cachedStarts = self._startsFromCache(next(iter(entry.values()))['starts'])
+                for activityVars, start in zip(self._activityVarsByActivity().values(), cachedStarts):
+                    self._hintActivity(activityVars, start)
+
+    # Take the model of the template instead of building it: the model is parsed from its bytes and
+    # the variables and constraints the scheduler keeps are found through its index map (see
+    # modelIndex); the fixed start times of userData are then set as the domains of their start and
+    # end variables
+    def _loadModel(self):
+        self.isBuilt = True
+        self._tightenedVars = []
+        self._initActivityState()
+        proto = self.model.Proto()
+        index = self.template.index
+        with self._phase('load'):
+            proto.ParseFromString(self.template.modelBytes)
+            variable = lambda variableIndex: _protoHandle(proto, variableIndex)
+
+            for (trackKey, capacity), (constraint, capacityConstraint, lastEnd) in \
+                    zip(self.resourceCapacities.items(), index['tracks'].tolist()):
+                self.tracks[trackKey] = Track(capacity=capacity, constraint=constraint, capacityConstraint=capacityConstraint,
+                                              lastEnd=variable(lastEnd) if lastEnd >= 0 else None)
+            for priority, tierComplete, tierAllowed in index['tiers'].tolist():
+                self.tierCompleteVars[priority] = variable(tierComplete)
+                self.tierAllowedVars[priority] = variable(tierAllowed)
+            self._tierBoundConstraints = index['tierBounds'].tolist()
+
+            activities = self.userData['buffer-times'] + self.userData['activities']
+            for activity, (start, end, interval, isPresent, secondChoice, tierComplete) in \
+                    zip(activities, index['activities'].tolist()):
+                if activity.startTime is not None:
+                    proto.variables[start].domain[:] = [activity.startTime, activity.startTime]
+                    proto.variables[end].domain[:] = [activity.startTime + activity.duration] * 2
+                activityVar = ActivityVar(start=variable(start), end=variable(end),
+                                          interval=_protoHandle(proto, interval, isInterval=True),
+                                          isPresent=variable(isPresent), data=activity)
+                self.activityVars.append(activityVar)
+                if secondChoice >= 0:
+                    self.secondChoiceVars[id(activityVar)] = (
+                        activityVar, activityVar.isPresent if secondChoice == isPresent else variable(secondChoice))
+                self._tierCompleteConstraints[id(activity)] = tierComplete
+                for trackKey in tracksOf(activity):
+                    self._durationByPriority[(trackKey, activity.priority)] += activity.duration
+            for first, second, indicator in index['orderChanged'].tolist():
+                key = (id(self.activityVars[first]), id(self.activityVars[second]))
+                self.orderChangedIndicators[key] = variable(indicator)
 
-        start = time.time()
-        status = self.solver.SolveWithSolutionCallback(self.model, solutionPrinter)
-        end = time.time()
+        # The template's model already minimizes this objective
+        with self._phase('objective'):
+            self.objectiveScoreVar = self._cpObjectiveFunction()
+            self._minimizedPenalty = self.objectiveScoreVar
 
-        # Print status and num of solutions
-        print('Status = %s' % self.solver.StatusName(status))
-        print('Number of solutions found: %i' % solutionPrinter.solutionCount())
-        print('Time Taken: ', round(end-start, 3), 'seconds')
+    # Index map of the model as built, which model_template.py stores with the model: int32 arrays
+    # of model proto indices (-1 for none) of the variables and constraints the scheduler keeps
+    #   activities    per buffer and activity in input order: start, end, interval, isPresent,
+    #                 second choice literal, tier complete constraint
+    #   tracks        per track in resourceCapacities order: constraint, capacityConstraint, lastEnd
+    #   tiers         per priority level: priority, tierComplete, tierAllowed
+    #   tierBounds    constraints of _addTierBounds
+    #   orderChanged  per indicator: positions of the two activities it compares, indicator
+    # Only a model built with variable fixed starts, without presolve, deferrable or absent
+    # activities or edits has one
+    def modelIndex(self):
+        self._ensureBuilt()
+        if not self.variableFixedStarts or self.presolve is not None or self.deferrable or self.absent or self._edited:
+            raise ValueError('Only a model built with variable fixed starts and without presolve, deferrable or absent '
+                             'activities or edits has an index map')
+        secondChoices = {key: secondChoice.Index() for key, (_, secondChoice) in self.secondChoiceVars.items()}
+        positions = {id(actVar): position for position, actVar in enumerate(self.activityVars)}
+        return {
+            'activities': _indexArray([[actVar.start.Index(), actVar.end.Index(), actVar.interval.Index(), actVar.isPresent.Index(),
+                                        secondChoices.get(id(actVar), -1), self._tierCompleteConstraints[id(actVar.data)]]
+                                       for actVar in self.activityVars], 6),
+            'tracks': _indexArray([[track.constraint, track.capacityConstraint, track.lastEnd.Index() if track.lastEnd is not None else -1]
+                                   for track in self.tracks.values()], 3),
+            'tiers': _indexArray([[priority, self.tierCompleteVars[priority].Index(), self.tierAllowedVars[priority].Index()]
+                                  for priority in self.tierCompleteVars], 3),
+            'tierBounds': _indexArray(self._tierBoundConstraints),
+            'orderChanged': _indexArray([[positions[first], positions[second], indicator.Index()]
+                                         for (first, second), indicator in self.orderChangedIndicators.items()], 3),
+        }
+
+    def _ensureBuilt(self):
+        if not self.isBuilt:
+            self._build()
+
+    # Called by every edit to the model
+    def _stopCaching(self):
+        self.cacheKey = None
+        self._cacheEntry = None
+        self._edited = True
+
+    # Start of each buffer and activity (None if not fitted) in the schedule of the last solve, in
+    # model order: buffer-times then activities as given to the constructor, then added ones
+    # (and, once the model was edited, the activities presolve had pruned)
+    # snapshot is a SolutionSnapshot of this model to decode instead, e.g. one yielded by solveAsync
+    def activityStarts(self, snapshot=None):
+        snapshot = snapshot or self.lastSnapshot
+        if snapshot is None:
+            return None
+        return self._activityStarts(snapshot)
+
+    # Starts of greedy.greedySchedule for the current activities, in model order (see activityStarts)
+    def greedyStarts(self):
+        self._ensureBuilt()
+        activities = self.userData['buffer-times'] + self.userData['activities']
+        startsById = {id(activity): start for activity, start in zip(activities, greedySchedule(self.userData))}
+        return [startsById[key] for key in self._activityVarsByActivity()]
+
+    # Start of each activity (None if not fitted) in the schedule of snapshot, in model order
+    def _activityStarts(self, snapshot):
+        starts = []
+        position = 0
+        for activityVars in self._activityVarsByActivity().values():
+            start = None
+            for i in range(position, position + len(activityVars)):
+                if snapshot.presents[i]:
+                    start = snapshot.starts[i]
+            starts.append(start)
+            position += len(activityVars)
+        return starts
+
+    # Cached starts in canonical order mapped back to the order of buffer-times + activities
+    def _startsFromCache(self, canonicalStarts):
+        starts = [None] * len(canonicalStarts)
+        for position, index in enumerate(self.cacheKey.order):
+            starts[index] = canonicalStarts[position]
+        return starts
+
+    # Whether result holds whatever the time limit: every stage was solved to optimality (or proved
+    # infeasible) without a gap limit, with which CP-SAT reports OPTIMAL before it is (an absolute
+    # gap below 1 is exact, the objective is an int)
+    @staticmethod
+    def _isProven(result, solverConfig):
+        if solverConfig.relativeGapLimit or (solverConfig.absoluteGapLimit or 0) >= 1:
+            return False
+        statuses = [result.status] + [stage['status'] for stage in result.stages]
+        return all(status in ('OPTIMAL', 'INFEASIBLE') for status in statuses)
+
+    # A schedule that is not proven is only kept for warm starts, and never replaces a proven one
+    def _storeInCache(self, mode, result, proven):
+        if not proven and (self._cacheEntry or {}).get(mode, {}).get('proven'):
+            return
+        starts = self._activityStarts(self.lastSnapshot)
+        entry = dict(self._cacheEntry or {})
+        entry[mode] = {
+            'proven': proven,
+            'starts': [starts[index] for index in self.cacheKey.order],
+            'status': result.status,
+            'objective': result.objective,
+            'bound': result.bound,
+            'solutionCount': result.solutionCount,
+            'penalties': result.penalties,
+            'stages': result.stages,
+            'solverConfig': result.solverConfig,
+        }
+        self._cacheEntry = entry
+        self.cache.put(self.cacheKey, entry)
+
+    # SolveResult of a cached solve of this day, with the names of this day's activities
+    def _cachedResult(self, mode):
+        cached = self._cacheEntry[mode]
+        activities = self.userData['buffer-times'] + self.userData['activities']
+        starts = self._startsFromCache(cached['starts'])
+        placed = [ScheduledActivity(activity.name, start, activity.duration, activity.priority)
+                  for activity, start in zip(activities, starts) if start is not None]
+        placed.sort(key=lambda activity: activity.start)
+        unplaced = [ScheduledActivity(activity.name, None, activity.duration, activity.priority)
+                    for activity, start in zip(activities, starts) if start is None]
+        return SolveResult(
+            status=cached['status'],
+            objective=cached['objective'],
+            bound=cached['bound'],
+            wallTime=0.0,
+            placed=placed,
+            unplaced=unplaced,
+            solutionCount=cached['solutionCount'],
+            penalties=cached['penalties'],
+            stages=cached['stages'],
+            solverConfig=cached['solverConfig'],
+        )
 
     def _addActivities(self):
+        self._initActivityState()
+        with self._phase('tracks'):
+            for trackKey, capacity in self.resourceCapacities.items():
+                self.tracks[trackKey] = self._newTrack(trackKey, capacity)
+
+        # Add buffers, then activities to OR-tools model
+        self._addNewActivities(self.userData['buffer-times'] + self.userData['activities'])
+        self._addTierBounds()
+
+        # Main objective function that penalizes unwanted behavior
+        # OR-Tools library will minimize this function to find the optimal solution
+        with self._phase('objective'):
+            self.objectiveScoreVar = self._cpObjectiveFunction()
+            self._minimize(self.objectiveScoreVar)
+
+    # Groups, disturbance windows and track capacities of userData, and empty containers for the
+    # tracks, the priority cascade and the order changed indicators
+    def _initActivityState(self):
         # create group dictionary to easily access group by name
-        activityGroupsByName = {}
+        self.activityGroupsByName = {}
         for group in self.userData['activity-groups']:
-            activityGroupsByName[group.name] = group
-        # Separate high and low disturbance times
-        highDisturbanceTimes = [dis for dis in self.userData['disturbance-marked-times'] if dis.disturbance == 'high']
-        lowDisturbanceTimes = [dis for dis in self.userData['disturbance-marked-times'] if dis.disturbance == 'low']
-
-        # creating on the fly class to store activity variables
-        ActivityVar = collections.namedtuple('ActivityVars', 'start, end, interval, isPresent, data')
-
-        # Add buffer constraints
-        buffers = self.userData['buffer-times']
-        for buffer in buffers:
-            self._addBuffer(buffer, ActivityVar)
-
-        # Add activity data to OR-tools model
-        activities = self.userData['activities']
-
-        for activity in activities:
-            # 1 - If Activity Start time is given
-            if activity.startTime is not None:
-                self._addActivityWithStartTime(activity, ActivityVar)
-            else:
-                self._addActivityWithoutStartTime(
-                    activity,
-                    activityGroupsByName,
-                    highDisturbanceTimes,
-                    lowDisturbanceTimes,
-                    ActivityVar
-                )
-
-        # Ensure no activities overlap
-        intervalVars = [activityVar.interval for activityVar in self.activityVars]
-        self.model.AddNoOverlap(intervalVars)
+            self.activityGroupsByName[group.name] = group
+        # Disturbance times each attention may also use: activities needing high attention may go in
+        # low disturbance times and activities needing low attention in high disturbance times
+        self.disturbanceWindows = {
+            Attention.HIGH: [(dis.startTime, dis.endTime) for dis in self.userData['disturbance-marked-times'] if dis.disturbance == Disturbance.LOW],
+            Attention.LOW: [(dis.startTime, dis.endTime) for dis in self.userData['disturbance-marked-times'] if dis.disturbance == Disturbance.HIGH],
+        }
+
+        # Constraints over the activities of a track are created empty and every activity is appended
+        # to them as it is added, so activities can also be added after the model is built (see addActivity)
+        # Ensure no more activities than its capacity overlap on the schedule's own track and on every resource
+        self.resourceCapacities = {None: 1}
+        self.resourceCapacities.update((resource.name, resource.capacity) for resource in resourcesOf(self.userData))
+        self.tracks = collections.OrderedDict()
 
         # Ensure no Priority n activities are scheduled if all Priority (n-1) activities are not scheduled
-        self._addPriorityConstraint()
+        # Literals of the priority cascade and indices of its constraints, see _addPriorityConstraint
+        self.tierCompleteVars = {}
+        self.tierAllowedVars = {}
+        self._tierCompleteConstraints = {}
+        self._tierBoundConstraints = []
+        self._durationByPriority = collections.Counter()
+        # Order changed indicators keyed by the pair of consecutive activity intervals they compare
+        self.orderChangedIndicators = collections.OrderedDict()
 
-        # Main objective function that penalizes unwanted behavior
-        # OR-Tools library will minimize this function to find the optimal solution
-        self.objectiveScoreVar = self._cpObjectiveFunction()
-        self.model.Minimize(self.objectiveScoreVar)
+    # Create the variables of buffers and activities and add them to every constraint over all activities
+    def _addNewActivities(self, activities):
+        with self._phase('activities'):
+            self._addActivityVars(activities)
+
+    # The windows and start domains of all activities are computed at once (see activity_columns.py)
+    # and their variables and constraints are written straight into the model proto: going through
+    # the expression API of cp_model takes more than twice as long on large inputs
+    def _addActivityVars(self, activities):
+        columns = ActivityColumns(activities, (self.startScheduleTime, self.endScheduleTime),
+                                  {name: (group.startTime, group.endTime) for name, group in self.activityGroupsByName.items()},
+                                  self.disturbanceWindows)
+        durations = columns.duration
+        windowStarts = columns.windowStart
+        windowEnds = columns.windowEnd
+        for row, activity in enumerate(activities):
+            firstNewVar = len(self.activityVars)
+            duration = durations[row]
+            if id(activity) in self.absent or (self.presolve is not None and self.presolve.isPruned(activity)):
+                self._addPrunedActivity(activity)
+            else:
+                if activity.startTime is not None and self.variableFixedStarts:
+                    start = self._newVar([activity.startTime, activity.startTime], 'start ', activity.name)
+                    end = self._newVar([activity.startTime + duration, activity.startTime + duration], 'end ', activity.name)
+                elif activity.startTime is not None:
+                    start = activity.startTime
+                    end = activity.startTime + duration
+                else:
+                    start, end = self._newStartEnd(activity, columns.plainStarts[row], (windowStarts[row], windowEnds[row]))
+                isPresent = self._newVar([0, 1], 'is present ', activity.name)
+                # Optional interval for soft constraint
+                interval = self._newOptionalInterval(start, duration, end, isPresent, activity.name)
+                activityVar = ActivityVar(start=start, end=end, interval=interval, isPresent=isPresent, data=activity)
+                self.activityVars.append(activityVar)
+                if columns.wantedStarts.get(row) is not None:
+                    self._addSecondChoice(activityVar, columns.wantedStarts[row])
+                for trackKey in tracksOf(activity):
+                    self._addToTrack(self.tracks[trackKey], activityVar)
+            with self._phase('priority cascade'):
+                self._addPriorityConstraint(self.activityVars[firstNewVar:])
+            if self.penalizeOrderChanges:
+                with self._phase('order changed'):
+                    self._addOrderChangedIndicators(firstNewVar, len(self.activityVars))
+
+    # New variable with a flattened domain [first, last, ...], named prefix + name with variableNames
+    def _newVar(self, domain, prefix, name):
+        proto = self.model.Proto()
+        variable = proto.variables.add()
+        variable.domain.extend(domain)
+        if self.variableNames:
+            variable.name = prefix + name
+        return _protoHandle(proto, len(proto.variables) - 1)
 
-    def _addBuffer(self, buffer, ActivityVar):
-        if buffer.startTime is not None:
-            start = buffer.startTime
-            end = buffer.startTime + buffer.duration
+    # New empty constraint (its ConstraintProto) enforced by the given literal indices
+    def _newConstraint(self, enforcementLiterals=()):
+        constraint = self.model.Proto().constraints.add()
+        constraint.enforcement_literal.extend(enforcementLiterals)
+        return constraint
+
+    # Linear constraint sum(coeffs[i] * variables[i]) in domain [first, last, ...] over variable indices
+    def _addLinear(self, variables, coeffs, domain, enforcementLiterals=()):
+        constraint = self._newConstraint(enforcementLiterals)
+        linear = constraint.linear
+        linear.vars.extend(variables)
+        linear.coeffs.extend(coeffs)
+        linear.domain.extend(domain)
+        return constraint
+
+    # At least one of literals is true (literal indices, negative for negations)
+    def _addBoolOr(self, literals, enforcementLiterals=()):
+        constraint = self._newConstraint(enforcementLiterals)
+        constraint.bool_or.literals.extend(literals)
+        return constraint
+
+    # Optional interval of the given duration, as CpModel.NewOptionalIntervalVar makes it: start and
+    # end are variables, or ints for a fixed start
+    def _newOptionalInterval(self, start, duration, end, isPresent, name):
+        presentIndex = isPresent.Index()
+        if isinstance(start, int):
+            self._addBoolOr([self.model.GetOrMakeIndexFromConstant(1)], [presentIndex])
         else:
-            start = self.model.NewIntVar(self.startScheduleTime, self.endScheduleTime, 'start ' + buffer.name)
-            end = self.model.NewIntVar(self.startScheduleTime, self.endScheduleTime, 'end ' + buffer.name)
-
-        isPresent = self.model.NewBoolVar('is present ' + buffer.name)
-        interval = self.model.NewOptionalIntervalVar(start, buffer.duration, end, isPresent, 'interval ' + buffer.name)
-
-        # Store newly created model variables for later access
-        buffer.priority = 1
-        bufferVar = ActivityVar(start=start, end=end, interval=interval, isPresent=isPresent, data=buffer)
-        self.activityVars.append(bufferVar)
-
-    def _addActivityWithStartTime(self, activity, ActivityVar):
-        start = activity.startTime
-        end = activity.startTime + activity.duration
-        isPresent = self.model.NewBoolVar('is present ' + activity.name)
-        # Optional interval for soft constraint
-        interval = self.model.NewOptionalIntervalVar(start, activity.duration, end, isPresent, 'interval ' + activity.name)
-        # Store newly created model variables for later access
-        activityVar = ActivityVar(start=start, end=end, interval=interval, isPresent=isPresent, data=activity)
-        self.activityVars.append(activityVar)
-
-    def _addActivityWithoutStartTime(self, activity, activityGroupsByName, highDisturbanceTimes, lowDisturbanceTimes, ActivityVar):
-        
-        # Interval if group
-        if activity.groupName is not None:
-            group = activityGroupsByName[activity.groupName]
-            start = self.model.NewIntVar(group.startTime, group.endTime, 'start ' + activity.name)
-            end = self.model.NewIntVar(group.startTime, group.endTime, 'end ' + activity.name)
-        # Interval if no group
+            self._addLinear([start.Index(), end.Index()], [1, -1], [-duration, -duration], [presentIndex])
+        constraint = self._newConstraint([presentIndex])
+        interval = constraint.interval
+        for expression, value in ((interval.start, start), (interval.end, end)):
+            if isinstance(value, int):
+                expression.offset = value
+            else:
+                expression.vars.append(value.Index())
+                expression.coeffs.append(1)
+        interval.size.offset = duration
+        if self.variableNames:
+            constraint.name = 'interval ' + name
+        proto = self.model.Proto()
+        return _protoHandle(proto, len(proto.constraints) - 1, isInterval=True)
+
+    # Empty Track of a resource name (None: the schedule's own track)
+    def _newTrack(self, trackKey, capacity):
+        if capacity == 1:
+            constraint = self.model.AddNoOverlap([]).Index()
         else:
-            start = self.model.NewIntVar(self.startScheduleTime, self.endScheduleTime, 'start ' + activity.name)
-            end = self.model.NewIntVar(self.startScheduleTime, self.endScheduleTime, 'end ' + activity.name)
-
-        isPresent = self.model.NewBoolVar('is present ' + activity.name)
-        # Optional interval for soft constraint
-        interval = self.model.NewOptionalIntervalVar(start, activity.duration, end, isPresent, 'interval ' + activity.name)
-        # Store newly created model variables for later access
-        activityVar = ActivityVar(start=start, end=end, interval=interval, isPresent=isPresent, data=activity)
-        self.activityVars.append(activityVar)
-        if activity.groupName is None and activity.attentionRequired != 2:
-            self.secondChoiceActivityVars.append(activityVar)
-
-        # Make more intervals using disturbed high/low times
-        if not activity.attentionRequired == 2:
-            # Array to use to ensure only one of these multiple intervals is fitted
-            allIsPresents = [isPresent]
-            if activity.attentionRequired == 1:
-                for disTime in lowDisturbanceTimes:
-                    start2 = self.model.NewIntVar(disTime.startTime, disTime.endTime, '')
-                    end2 = self.model.NewIntVar(disTime.startTime, disTime.endTime, '')
-                    isPresent2 = self.model.NewBoolVar('is present ' + activity.name)
-                    # Optional interval for soft constraint
-                    interval2 = self.model.NewOptionalIntervalVar(start2, activity.duration, end2, isPresent2, 'interval ' + activity.name)
-                    # Store newly created model variables for later access
-                    activityVar2 = ActivityVar(start=start2, end=end2, interval=interval2, isPresent=isPresent2, data=activity)
-                    self.activityVars.append(activityVar2)
-                    allIsPresents.append(isPresent2)
-                    if activity.groupName is not None:
-                        self.secondChoiceActivityVars.append(activityVar2)
-
-            if activity.attentionRequired == 3:
-                for disTime in highDisturbanceTimes:
-                    start2 = self.model.NewIntVar(disTime.startTime, disTime.endTime, '')
-                    end2 = self.model.NewIntVar(disTime.startTime, disTime.endTime, '')
-                    isPresent2 = self.model.NewBoolVar('is present ' + activity.name)
-                    # Optional interval for soft constraint
-                    interval2 = self.model.NewOptionalIntervalVar(start2, activity.duration, end2, isPresent2, 'interval ' + activity.name)
-                    # Store newly created model variables for later access
-                    activityVar2 = ActivityVar(start=start2, end=end2, interval=interval2, isPresent=isPresent2, data=activity)
-                    self.activityVars.append(activityVar2)
-                    allIsPresents.append(isPresent2)
-                    if activity.groupName is not None:
-                        self.secondChoiceActivityVars.append(activityVar2)
-            # Make sure at most only 1 of any of these intervals is fitted
-            self.model.Add(sum(allIsPresents) <= 1)
-    
-    def _addPriorityConstraint(self):
-        nbuffers = len([act for act in self.userData['buffer-times']])
-        npriority1Activities = len([act for act in self.userData['activities'] if act.priority == 1])
-        npriority2Activities = len([act for act in self.userData['activities'] if act.priority == 2])
-        npriority3Activities = len([act for act in self.userData['activities'] if act.priority == 3])
-
-        # Define 2 variables for number of priority 1 activities present and not present
-        priority1sPresent = self.model.NewIntVar(0, npriority1Activities + nbuffers, '')
-        priority1sPresentSummed = sum([actVar.isPresent for actVar in self.activityVars if actVar.data.priority == 1])
-        self.model.Add(priority1sPresent == priority1sPresentSummed)
-        priority1sNotPresent = self.model.NewIntVar(0, npriority1Activities, '')
-        self.model.Add(priority1sNotPresent == nbuffers + npriority1Activities - priority1sPresent)
-
-        # Define 2 variables for number of priority 2 activities present and not present
-        priority2sPresent = self.model.NewIntVar(0, npriority2Activities, '')
-        priority2sPresentSummed = sum([actVar.isPresent for actVar in self.activityVars if actVar.data.priority == 2])
-        self.model.Add(priority2sPresent == priority2sPresentSummed)
-        priority2sNotPresent = self.model.NewIntVar(0, npriority2Activities, '')
-        self.model.Add(priority2sNotPresent == npriority2Activities - priority2sPresent)
-
-        priority3sPresent = self.model.NewIntVar(0, npriority3Activities, '')
-        priority3sPresentSummed = sum([actVar.isPresent for actVar in self.activityVars if actVar.data.priority == 3])
-        self.model.Add(priority3sPresent == priority3sPresentSummed)
-
-        priority1sNotPresent = self.model.NewIntVar(0, npriority1Activities, '')
-        self.model.Add(priority1sNotPresent == nbuffers + npriority1Activities - priority1sPresent)
-
-        toBeZero12 = self.model.NewIntVar(0, 0, '')
-        self.model.AddProdEquality(toBeZero12, [priority1sNotPresent, priority2sPresent])
-        self.model.Add(toBeZero12 == 0)
-
-        toBeZero13 = self.model.NewIntVar(0, 0, '')
-        self.model.AddProdEquality(toBeZero13, [priority1sNotPresent, priority3sPresent])
-        self.model.Add(toBeZero13 == 0)
-
-        toBeZero23 = self.model.NewIntVar(0, 0, '')
-        self.model.AddProdEquality(toBeZero23, [priority2sNotPresent, priority3sPresent])
-        self.model.Add(toBeZero23 == 0)
-
-        
+            constraint = self.model.AddCumulative([], [], capacity).Index()
+        # Redundant capacity constraint: present activities cannot take more time than the track has
+        # This gives the LP relaxation the knapsack bound that decides how much of each priority level fits
+        self._addLinear([], [], [0, capacity * (self.endScheduleTime - self.startScheduleTime)])
+        capacityConstraint = len(self.model.Proto().constraints) - 1
+        # Every present activity of the track must end before lastEnd (used by the gaps penalty)
+        lastEnd = None
+        if self.compactSchedule:
+            lastEnd = self.model.NewIntVar(self.startScheduleTime, self.endScheduleTime,
+                                           'last end' if trackKey is None else 'last end ' + trackKey)
+        return Track(capacity=capacity, constraint=constraint, capacityConstraint=capacityConstraint, lastEnd=lastEnd)
+
+    def _addToTrack(self, track, actVar):
+        constraints = self.model.Proto().constraints
+        if track.capacity == 1:
+            constraints[track.constraint].no_overlap.intervals.append(actVar.interval.Index())
+        else:
+            cumulative = constraints[track.constraint].cumulative
+            cumulative.intervals.append(actVar.interval.Index())
+            cumulative.demands.add().offset = 1
+        capacityConstraint = constraints[track.capacityConstraint].linear
+        capacityConstraint.vars.append(actVar.isPresent.Index())
+        capacityConstraint.coeffs.append(actVar.data.duration)
+        if track.lastEnd is not None:
+            if isinstance(actVar.end, int):
+                self._addLinear([track.lastEnd.Index()], [1], [actVar.end, cp_model.INT_MAX], [actVar.isPresent.Index()])
+            else:
+                self._addLinear([track.lastEnd.Index(), actVar.end.Index()], [1, -1], [0, cp_model.INT_MAX],
+                                [actVar.isPresent.Index()])
+
+    # Second choice literal of an activity: present with a start outside every wanted window
+    # It is only bounded from below, the objective keeps it false whenever the start allows
+    # wantedStarts are the start ranges of its wanted windows (see activity_columns.py)
+    def _addSecondChoice(self, activityVar, wantedStarts):
+        if not wantedStarts:
+            secondChoice = activityVar.isPresent
+        else:
+            secondChoice = self._newVar([0, 1], 'second choice ', activityVar.data.name)
+            presentIndex = activityVar.isPresent.Index()
+            self._addLinear([activityVar.start.Index()], [1], _flatDomain(wantedStarts),
+                            [presentIndex, secondChoice.Not().Index()])
+            self._addBoolOr([presentIndex], [secondChoice.Index()])
+        self.secondChoiceVars[id(activityVar)] = (activityVar, secondChoice)
+
+    # Start and end variables of an interval of activity with plainStarts [[first, last], ...], the
+    # starts keeping it inside one of its windows, the first of which is firstWindow (start, end)
+    # The start domain only holds those starts and, after presolve, only the ones clear of the fixed
+    # activities of earlier priority levels (which are present whenever it is)
+    def _newStartEnd(self, activity, plainStarts, firstWindow):
+        startIntervals = plainStarts
+        if self.presolve is not None:
+            startIntervals = [allowed for first, last in plainStarts
+                              for allowed in self.presolve.allowedStarts(activity, first, last)]
+        # When nothing fits, keep the first window (the solver sees that the interval cannot be present)
+        if not startIntervals:
+            return (self._newVar(firstWindow, 'start ', activity.name),
+                    self._newVar(firstWindow, 'end ', activity.name))
+
+        start = self._newVar(_flatDomain(startIntervals), 'start ', activity.name)
+        end = self._newVar(_flatDomain([[first + activity.duration, last + activity.duration] for first, last in startIntervals]),
+                           'end ', activity.name)
+        if startIntervals != plainStarts:
+            self._tightenedVars.append((start, end, plainStarts, activity.duration))
+        return start, end
+
+    # A pruned activity keeps a single interval-less entry, fixed not present, so that it still
+    # counts in the priority cascade and the objective like an activity that was not fitted
+    def _addPrunedActivity(self, activity):
+        start = activity.startTime if activity.startTime is not None else self.startScheduleTime
+        isPresent = self._newVar([0, 1], 'is present ', activity.name)
+        self._addLinear([isPresent.Index()], [1], [0, 0])
+        self.activityVars.append(ActivityVar(start=start, end=start + activity.duration, interval=None, isPresent=isPresent, data=activity))
+
+    # Undo presolve before the activities change, since its deductions depend on all of them:
+    # pruned activities get their full variables and cut domains get back their plain windows
+    def _undoPresolve(self):
+        if self.presolve is None:
+            return
+        prunedActivities = [activity for activity, _ in self.presolve.pruned.values() if id(activity) not in self.absent]
+        self.presolve = None
+        for start, end, plainStarts, duration in self._tightenedVars:
+            start.Proto().domain[:] = cp_model.Domain.FromIntervals(plainStarts).FlattenedIntervals()
+            end.Proto().domain[:] = cp_model.Domain.FromIntervals(
+                [[first + duration, last + duration] for first, last in plainStarts]).FlattenedIntervals()
+        self._tightenedVars = []
+        for activity in prunedActivities:
+            first, activityVars = self._findActivityVars(activity)
+            self._removeActivityVars(first, activityVars)
+        self._addNewActivities(prunedActivities)
+        if prunedActivities:
+            self._addTierBounds()
+
+    # Add the intervals of one activity (buffers are priority 1) to the priority cascade
+    # For each priority level p two literals are defined (see _getPriorityLevel):
+    #   tierComplete[p] => every priority p activity is present
+    #   tierAllowed[p]  => tierComplete[q] and tierAllowed[q] for the level q just before p
+    #   any priority p activity present => tierAllowed[p]
+    # So no priority n activity is scheduled unless all activities of every level before n are
+    # Deferrable activities only take the last part: no level waits for them
+    def _addPriorityConstraint(self, activityVars):
+        data = activityVars[0].data
+        tierComplete, tierAllowed = self._getPriorityLevel(data.priority)
+        activityIsPresents = [actVar.isPresent.Index() for actVar in activityVars]
+        for isPresent in activityIsPresents:
+            self._addBoolOr([tierAllowed.Index()], [isPresent])
+        if id(data) in self.deferrable:
+            return
+        self._addBoolOr(activityIsPresents, [tierComplete.Index()])
+        self._tierCompleteConstraints[id(data)] = len(self.model.Proto().constraints) - 1
+        for trackKey in tracksOf(data):
+            self._durationByPriority[(trackKey, data.priority)] += data.duration
+
+    # Get the (tierComplete, tierAllowed) literals of a priority level, creating and linking them
+    # to the levels just before and after it if the level is new
+    def _getPriorityLevel(self, priority):
+        if priority not in self.tierCompleteVars:
+            tierComplete = self.model.NewBoolVar('priority ' + str(priority) + ' complete')
+            tierAllowed = self.model.NewBoolVar('priority ' + str(priority) + ' allowed')
+            previousLevels = [level for level in self.tierCompleteVars if level < priority]
+            nextLevels = [level for level in self.tierCompleteVars if level > priority]
+            if previousLevels:
+                previousLevel = max(previousLevels)
+                self.model.AddImplication(tierAllowed, self.tierCompleteVars[previousLevel])
+                self.model.AddImplication(tierAllowed, self.tierAllowedVars[previousLevel])
+            if nextLevels:
+                nextLevel = min(nextLevels)
+                self.model.AddImplication(self.tierAllowedVars[nextLevel], tierComplete)
+                self.model.AddImplication(self.tierAllowedVars[nextLevel], tierAllowed)
+            self.tierCompleteVars[priority] = tierComplete
+            self.tierAllowedVars[priority] = tierAllowed
+        return self.tierCompleteVars[priority], self.tierAllowedVars[priority]
+
+    # A level whose activities (together with all levels before it) overflow a track can never be complete
+    # These bounds depend on every activity, so they are replaced as a whole whenever activities change
+    def _addTierBounds(self):
+        with self._phase('priority cascade'):
+            self._replaceTierBounds()
+
+    def _replaceTierBounds(self):
+        for constraint in self._tierBoundConstraints:
+            self.model.Proto().constraints[constraint].Clear()
+        self._tierBoundConstraints = []
+        scheduleLength = self.endScheduleTime - self.startScheduleTime
+        blockedLevels = set()
+        for trackKey in set(trackKey for trackKey, _ in self._durationByPriority):
+            cumulativeDuration = 0
+            for priority in sorted(self.tierCompleteVars):
+                cumulativeDuration += self._durationByPriority[(trackKey, priority)]
+                if cumulativeDuration > self.resourceCapacities[trackKey] * scheduleLength:
+                    blockedLevels.add(priority)
+        for priority in sorted(blockedLevels):
+            self._tierBoundConstraints.append(self.model.Add(self.tierCompleteVars[priority] == 0).Index())
+
+    # Add order changed indicators between each pair of consecutive intervals in activityVars[first - 1:last]
+    def _addOrderChangedIndicators(self, first, last):
+        for i in range(max(first, 1), last):
+            self._addOrderChangedIndicator(self.activityVars[i - 1], self.activityVars[i])
+
+    def _addOrderChangedIndicator(self, actVar, nextActVar):
+        # Pruned activities are never present, so their order never changes
+        if actVar.interval is None or nextActVar.interval is None:
+            return
+        # Indicator is 1 iff actVar is present and starts after nextActVar
+        nextActStartDif = actVar.start - nextActVar.start
+        indicator = self.getPositiveIndicator(nextActStartDif, onlyIf=[actVar.isPresent])
+        self.orderChangedIndicators[(id(actVar), id(nextActVar))] = indicator
+
+    # Add a buffer or activity to the built model
+    # Only the new activity's variables and constraints are created; the objective is
+    # rebuilt from the current activities by the next solve()
+    def addActivity(self, activity):
+        validateActivity(activity, self.userData)
+        self._ensureBuilt()
+        self._stopCaching()
+        self._undoPresolve()
+        if isinstance(activity, BufferTime):
+            self.userData['buffer-times'].append(activity)
+        else:
+            self.userData['activities'].append(activity)
+        self._addNewActivities([activity])
+        self._addTierBounds()
+        self.objectiveScoreVar = None
+
+    # Remove a buffer or activity (given by object or by name) from the built model
+    # Its intervals are forced absent and taken out of the priority cascade and the objective
+    def removeActivity(self, activity):
+        self._ensureBuilt()
+        self._stopCaching()
+        self._undoPresolve()
+        first, activityVars = self._findActivityVars(activity)
+        data = activityVars[0].data
+        # Input records compare by value, so remove this exact object rather than an equal one
+        key = 'buffer-times' if isinstance(data, BufferTime) else 'activities'
+        self.userData[key] = [item for item in self.userData[key] if item is not data]
+        self._removeActivityVars(first, activityVars)
+        self._addTierBounds()
+
+    # Take the variables of one activity out of the model: its intervals are forced absent and
+    # dropped from the priority cascade, the order changed indicators and the objective
+    def _removeActivityVars(self, first, activityVars):
+        data = activityVars[0].data
+        for actVar in activityVars:
+            self.model.Add(actVar.isPresent == 0)
+        if id(data) not in self.deferrable:
+            self.model.Proto().constraints[self._tierCompleteConstraints.pop(id(data))].Clear()
+            for trackKey in tracksOf(data):
+                self._durationByPriority[(trackKey, data.priority)] -= data.duration
+
+        removedKeys = set(id(actVar) for actVar in activityVars)
+        for key in list(self.orderChangedIndicators):
+            if key[0] in removedKeys or key[1] in removedKeys:
+                del self.orderChangedIndicators[key]
+        self.activityVars[first:first + len(activityVars)] = []
+        for key in removedKeys:
+            self.secondChoiceVars.pop(key, None)
+        # Keep the order of the intervals around the removed activity penalized
+        if self.penalizeOrderChanges and 0 < first < len(self.activityVars):
+            self._addOrderChangedIndicator(self.activityVars[first - 1], self.activityVars[first])
+        self.objectiveScoreVar = None
+
+    # Replace an activity (given by object or by name) with a new version, e.g. with another duration
+    def updateActivity(self, activity, newActivity):
+        self.removeActivity(activity)
+        self.addActivity(newActivity)
+
+    # Position in activityVars and intervals of the activity given by object or by name
+    # (the first match for repeated names); the intervals of one activity are always consecutive
+    def _findActivityVars(self, activity):
+        for first, actVar in enumerate(self.activityVars):
+            data = actVar.data
+            if data is activity or (isinstance(activity, str) and data.name == activity):
+                last = first + 1
+                while last < len(self.activityVars) and self.activityVars[last].data is data:
+                    last += 1
+                return first, self.activityVars[first:last]
+        raise KeyError('Activity not in model: ' + str(activity))
 
     def _cpObjectiveFunction(self):
+        # Individual penalty terms are kept by name for the lexicographic solve
+        self.objectiveTerms = collections.OrderedDict()
         finalObjVar = 0
 
         # Adding penalty to activities for not being present
         activitiesNotPresentPenalty = self.getActivitiesNotPresentPenalty()
+        self.objectiveTerms['not present'] = activitiesNotPresentPenalty
         finalObjVar += activitiesNotPresentPenalty
 
         # Adding penalty to activities for being fitted to lesser wanted options
         activitiesFittedToSecondChoiceTimesPenalty = self.getActivitiesFittedToSecondChoiceTimesPenalty()
+        self.objectiveTerms['second choice'] = activitiesFittedToSecondChoiceTimesPenalty
         finalObjVar += 120 * activitiesFittedToSecondChoiceTimesPenalty
 
-        # # Adding penalty to activities which switch order
-        # activitiesOrderChangedPenalty = self.getActivitiesOrderChangedPenalty()
-        # finalObjVar += activitiesOrderChangedPenalty
+        # Adding penalty to activities which switch order
+        if self.penalizeOrderChanges:
+            activitiesOrderChangedPenalty = self.getActivitiesOrderChangedPenalty()
+            self.objectiveTerms['order changed'] = activitiesOrderChangedPenalty
+            finalObjVar += activitiesOrderChangedPenalty
 
-        # # Adding penalty for activities for not starting immediately after the next one
-        # activitiesNotPushedFrontPenalty = self.getActivitiesInBetweenGapsPenalty()
-        # finalObjVar += activitiesNotPushedFrontPenalty
+        # Adding penalty for activities for not starting immediately after the previous one
+        # Idle time of a track can never exceed its capacity times the schedule length, so the
+        # penalties above are scaled by one more than the total of that over the tracks to keep
+        # compaction a tie-breaker that never drops an activity (schedule length + 1 for one track)
+        if self.compactSchedule:
+            scheduleLength = self.endScheduleTime - self.startScheduleTime
+            activitiesNotPushedFrontPenalty = self.getActivitiesInBetweenGapsPenalty()
+            self.objectiveTerms['gaps'] = activitiesNotPushedFrontPenalty
+            totalCapacity = sum(track.capacity for track in self.tracks.values())
+            finalObjVar = (scheduleLength * totalCapacity + 1) * finalObjVar + activitiesNotPushedFrontPenalty
 
         return finalObjVar
 
     def getActivitiesNotPresentPenalty(self):
-        return sum( [(1 - actVar.isPresent) for actVar in self.activityVars] )
+        return _weightedSum([actVar.isPresent for actVar in self.activityVars], [-1] * len(self.activityVars),
+                            len(self.activityVars))
 
     def getActivitiesFittedToSecondChoiceTimesPenalty(self):
-        for i, actVar in enumerate(self.secondChoiceActivityVars):
+        for i, (actVar, _) in enumerate(self.secondChoiceVars.values()):
             self.extraVariables[str(i) + actVar.data.name] = actVar.data.duration
 
-        return sum([act.isPresent for act in self.secondChoiceActivityVars])
+        return _weightedSum([secondChoice for _, secondChoice in self.secondChoiceVars.values()],
+                            [1] * len(self.secondChoiceVars))
 
 
     def getActivitiesOrderChangedPenalty(self):
-        nextElementBefore = []
-        for i in range(0, len(self.activityVars) - 1):
-            nextActStartDif = self.model.NewIntVar(-self.endScheduleTime, self.endScheduleTime, '')
-            self.model.Add(nextActStartDif == self.activityVars[i].start - self.activityVars[i+1].start)
-            nextActStartDifPosIndicator = self.getPositiveIndicatorForVariable(nextActStartDif, -self.endScheduleTime, self.endScheduleTime)
-            nextActStartDifPosIndicatorIfActPresent = self.model.NewIntVar(0, 1, '')
-            self.model.AddProdEquality(nextActStartDifPosIndicatorIfActPresent, [nextActStartDifPosIndicator, self.activityVars[i].isPresent])
-            nextElementBefore.append(nextActStartDifPosIndicatorIfActPresent)
-        return sum(nextElementBefore)
-
-    def getPositiveIndicatorForVariable(self, var, varLb, varUb):
-        ub = int(max(abs(varLb), abs(varUb)))
-        varAbs = self.model.NewIntVar(0, ub, '')
-        self.model.AddAbsEquality(varAbs, var)
-        doubleOrNothing = self.model.NewIntVar(0, int(2 * ub), '')
-        self.model.Add(doubleOrNothing == varAbs + var)
-        doubleIndicator = self.model.NewIntVar(0, 2, '')
-        avoidZero = self.model.NewIntVar(1, ub, '')
-        self.model.AddMaxEquality(avoidZero, [varAbs, 1])
-        self.model.AddDivisionEquality(doubleIndicator, doubleOrNothing, avoidZero)
-        indicator = self.model.NewIntVar(0, 1, '')
-        self.model.AddDivisionEquality(indicator, doubleIndicator, 2)
+        return _weightedSum(list(self.orderChangedIndicators.values()), [1] * len(self.orderChangedIndicators))
+
+    # Get a Boolean literal b such that b == 1 iff expr > 0 and every literal in onlyIf is true
+    # Both directions are plain linear constraints switched on by literals (OnlyEnforceIf),
+    # which CP-SAT propagates directly and keeps in its LP relaxation
+    def getPositiveIndicator(self, expr, onlyIf=()):
+        onlyIf = list(onlyIf)
+        indicator = self.model.NewBoolVar('')
+        self.model.Add(expr >= 1).OnlyEnforceIf(indicator)
+        self.model.Add(expr <= 0).OnlyEnforceIf([indicator.Not()] + onlyIf)
+        for literal in onlyIf:
+            self.model.AddImplication(indicator, literal)
         return indicator
 
-    # Get the sum of gaps between each activity intervals (to be used as penalty for objective function minimization)
+    # Get the total idle time between activity intervals (to be used as penalty for objective function minimization)
+    # In Short - every present activity of a track must end before its lastEnd, so the intervals
+    # packed inside [startScheduleTime, lastEnd] leave exactly this much free time on the track:
+    # idle = capacity * (lastEnd - startScheduleTime) - sum(duration of its present activities)
+    # This counts the lag before the first activity and every gap in between, using one
+    # constraint per activity instead of the pairwise differences between all activities
+    # The idle time of every track is added up
     def getActivitiesInBetweenGapsPenalty(self):
-        # actStartAndPreviousActEndDifs will contain lag time for each activity - free time between one activity and the next
-        actStartAndPreviousActEndDifs = []
-        # Each iteration of the loop determines the lag time for that activity
-        # In Short - For each activity (actVar), the algorithm calculates the difference: 
-        # d = (actVar.start - actVar2.end) where actVar2 is all the other activities
-        # The lagtime will be equal to the minimum of all these positive differences
-        # lagtime = min( d for all d > 0 )
+        variables = [track.lastEnd for track in self.tracks.values()]
+        coeffs = [track.capacity for track in self.tracks.values()]
         for actVar in self.activityVars:
-            # Array that will contain all the difference d = (actVar - actVar2) if d > 0
-            actStartAndAllActsEndDifs = []
-            # Array that will contain bool indicating whether actVar2 comes after actVar
-            # Sum of this array will be used as weight for lag time
-            # This will push activities in reducing lag time with previous activity rather than the next activity
-            act2AfterAct = []
-            # Add start time to this array which will be the lag time if this is the first activity
-            actStartAndAllActsEndDifs.append(actVar.start)
-            for actVar2 in self.activityVars:
-                if not actVar == actVar2:
-                    # Define variable a with constraint a == -(actVar - actVar2)
-                    act1StartAct2EndDif = self.model.NewIntVar(-self.endScheduleTime, self.endScheduleTime, '')
-                    self.model.Add(act1StartAct2EndDif == actVar.start - actVar2.end)
-                    # Also define (-a) necessary for subsequent steps
-                    act2EndAct1StartDif = self.model.NewIntVar(-self.endScheduleTime, self.endScheduleTime, '')
-                    self.model.Add(act2EndAct1StartDif == -act1StartAct2EndDif)
-                    # Define bool variable b such that b = 1 iff -a > 0
-                    # In other words, b = 1 iff a >= 0
-                    # Or, more importantly b = 0 iff (actVar - actVar2) < 0
-                    act1StartAct2EndDifNegIndicator = self.getPositiveIndicatorForVariable(act2EndAct1StartDif, -self.endScheduleTime, self.endScheduleTime)
-                    act2AfterAct.append(act1StartAct2EndDifNegIndicator)
-                    # Define variable m
-                    #                   = 0 if (actVar - actVar2) >= 0
-                    #                   = 2 * self.endScheduleTime if (actVar - actVar2) < 0
-                    doubleEndScheduleOrNothing = self.model.NewIntVar(0, 2*self.endScheduleTime, '')
-                    self.model.AddProdEquality(doubleEndScheduleOrNothing, [act1StartAct2EndDifNegIndicator, 2*self.endScheduleTime])
-                    # Define variable n = (actVar - actVar2) + m
-                    #                   = (actVar - actVar2)    if (actVar - actVar2) >= 0
-                    #                   > self.endScheduleTime  if (actVar1 - actVar2) < 0
-                    act1StartAct2EndDifIfPositive = self.model.NewIntVar(0, 2*self.endScheduleTime, '')
-                    self.model.Add(act1StartAct2EndDifIfPositive == act1StartAct2EndDif + doubleEndScheduleOrNothing)
-                    # Finally the variable we want:
-                    # Define p = n * actVar.isPresent
-                    #                   = (actVar - actVar2)    if (actVar - actVar2) >= 0 and actVar.isPresent == 1
-                    #                   > self.endScheduleTime  if (actVar - actVar2) <  and actVar.isPresent == 1
-                    #                   = 0                     if actVar.isPresent == 0
-                    act1StartAct2EndDifIfPositiveAndPresent = self.model.NewIntVar(0, 2*self.endScheduleTime, '')
-                    self.model.AddProdEquality(act1StartAct2EndDifIfPositiveAndPresent, [act1StartAct2EndDifIfPositiveAndPresent, actVar.isPresent])
-                    # Append to array that will contain all p's to later minimize
-                    actStartAndAllActsEndDifs.append(act1StartAct2EndDifIfPositive)
-            # define variable s = minimum(all p and startTime )
-            # In other words s = minimum of actVar - actVar2 such that (actVar - actVar2 > 0)
-            # So s is the lag time for this activity actVar
-            actStartAndPreviousActEndDif = self.model.NewIntVar(0, self.endScheduleTime, '')
-            self.model.AddMinEquality(actStartAndPreviousActEndDif, actStartAndAllActsEndDifs)
-            # We define the weight w = sum(act2 such that act2 > 0)
-            actNumOfActsAfter = self.model.NewIntVar(0, len(self.activityVars), '')
-            self.model.Add(actNumOfActsAfter == 1 + sum(act2AfterAct))
-            # Multiply s and w to obtain weighted lag time, which is basically the penalty for this activity
-            actStartAndPreviousActEndDifWeighted = self.model.NewIntVar(0, len(self.activityVars)*self.endScheduleTime, '')
-            self.model.AddProdEquality(actStartAndPreviousActEndDifWeighted, [actStartAndPreviousActEndDif, actNumOfActsAfter])
-            actStartAndPreviousActEndDifs.append(actStartAndPreviousActEndDifWeighted)
-        return sum(actStartAndPreviousActEndDifs)
-
-
-
-
+            for _ in tracksOf(actVar.data):
+                variables.append(actVar.isPresent)
+                coeffs.append(-actVar.data.duration)
+        return _weightedSum(variables, coeffs, -sum(coeffs[:len(self.tracks)]) * self.startScheduleTime)
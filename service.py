@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from batch import errorResult, solveCase, solveIsolated, splitCores
+from input_interfaces import InvalidInputError
+from json_format import resultToJson, userDataFromJson
+from solver_config import SolverConfig
+
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 10 * 1024 * 1024
+# Seconds kept back from a request's deadline for building the model and sending the response
+DEADLINE_MARGIN = 0.2
+# Worker processes are started from a fork server: forked straight from the service they would
+# inherit its open client sockets and keep those connections open after the service closes them
+_MP_CONTEXT = multiprocessing.get_context('forkserver')
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+           504: 'Gateway Timeout'}
+
+
+# Cumulative histogram in the Prometheus text format
+class Histogram:
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = list(buckets)
+        # Observations per bucket, the last one counting those above every bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s histogram' % self.name]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append('%s_bucket{le="%g"} %d' % (self.name, bound, cumulative))
+        lines.append('%s_bucket{le="+Inf"} %d' % (self.name, self.count))
+        lines.append('%s_sum %f' % (self.name, self.sum))
+        lines.append('%s_count %d' % (self.name, self.count))
+        return lines
+
+
+# HTTP front end of the scheduler:
+#   POST /schedule  body is the JSON form of userData (see json_format), the response is the
+#                   JSON form of its SolveResult
+#   GET /metrics    latency histograms, request counts, queue depth and solves in progress
+# Solves run in a pool of worker processes so the event loop never blocks on CP-SAT
+# Requests wait in a bounded queue; when it is full the service answers 503 straight away
+# An X-Deadline-Seconds header (default defaultDeadline) bounds the total time of a request:
+# whatever is left of it when a worker picks the request up becomes the solver time limit,
+# and a request whose deadline passed while queued is answered 504 without solving
+class ScheduleService:
+    def __init__(self, workers=None, queueSize=None, solverConfig=None, defaultDeadline=30.0, mode='weighted'):
+        self.workers = workers or os.cpu_count() or 1
+        self.solverConfig = splitCores(solverConfig, self.workers)
+        self.defaultDeadline = defaultDeadline
+        self.mode = mode
+        self.queueSize = queueSize or 4 * self.workers
+        self.queue = None
+        self.pool = None
+        self.dispatchers = []
+        self.solvesInProgress = 0
+        self.requestCounts = collections.Counter()
+        self.requestLatency = Histogram('schedule_request_duration_seconds', 'Time from request to response of POST /schedule')
+        self.queueWait = Histogram('schedule_queue_wait_seconds', 'Time requests waited for a solver worker')
+        self.solveLatency = Histogram('schedule_solve_duration_seconds', 'Time spent in a solver worker per request')
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.queue = asyncio.Queue(maxsize=self.queueSize)
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT)
+        self.dispatchers = [asyncio.ensure_future(self._dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self._handleConnection, host, port)
+
+    def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # Serve the requests of one connection, keeping it open between requests unless asked not to
+    async def _handleConnection(self, reader, writer):
+        try:
+            while True:
+                request = await self._readRequest(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if isinstance(body, int):
+                    status, payload = body, {'error': REASONS[body]}
+                else:
+                    status, payload = await self._route(method, path, headers, body)
+                keepAlive = headers.get('connection', '').lower() != 'close'
+                await self._writeResponse(writer, status, payload, keepAlive)
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # (method, path, headers, body) of the next request, None at the end of the connection
+    # body is an HTTP status code instead when the request cannot be read
+    async def _readRequest(self, reader):
+        requestLine = await reader.readline()
+        if not requestLine.strip():
+            return None
+        parts = requestLine.decode('latin-1').split()
+        if len(parts) != 3:
+            return 'GET', '', {'connection': 'close'}, 400
+        method, path, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return method, path, dict(headers, connection='close'), 400
+        if length < 0:
+            return method, path, dict(headers, connection='close'), 400
+        if length > MAX_BODY_BYTES:
+            return method, path, dict(headers, connection='close'), 413
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _writeResponse(self, writer, status, payload, keepAlive):
+        body = payload.encode() if isinstance(payload, str) else json.dumps(payload, separators=(',', ':')).encode()
+        contentType = 'text/plain; version=0.0.4' if isinstance(payload, str) else 'application/json'
+        head = ['HTTP/1.1 %d %s' % (status, REASONS[status]),
+                'Content-Type: ' + contentType,
+                'Content-Length: %d' % len(body),
+                'Connection: ' + ('keep-alive' if keepAlive else 'close')]
+        if status == 503:
+            head.append('Retry-After: 1')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _route(self, method, path, headers, body):
+        path = path.split('?', 1)[0]
+        if path == '/schedule':
+            if method != 'POST':
+                return 405, {'error': 'Use POST'}
+            loop = asyncio.get_running_loop()
+            received = loop.time()
+            status, payload = await self._schedule(headers, body, received)
+            self.requestLatency.observe(loop.time() - received)
+            self.requestCounts[status] += 1
+            return status, payload
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'Use GET'}
+            return 200, self._metrics()
+        return 404, {'error': 'Unknown path ' + path}
+
+    async def _schedule(self, headers, body, received):
+        try:
+            deadline = float(headers.get('x-deadline-seconds', self.defaultDeadline))
+            if not math.isfinite(deadline) or deadline <= 0:
+                raise InvalidInputError('X-Deadline-Seconds must be a positive number of seconds')
+            obj = json.loads(body)
+            userData = userDataFromJson(obj)
+        # InvalidInputError is a ValueError; a TypeError would be a gap in the schema checks, but it
+        # is still the request's fault
+        except (ValueError, TypeError) as error:
+            return 400, {'error': str(error)}
+        userId = obj.get('id')
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((userData, received, received + deadline, future))
+        except asyncio.QueueFull:
+            return 503, {'id': userId, 'error': 'Queue full, retry later'}
+
+        result = await future
+        if result is None:
+            return 504, {'id': userId, 'error': 'Deadline passed before a solver worker was free'}
+        return (500 if result.status == 'ERROR' else 200), resultToJson(result, userId)
+
+    # One per worker process: take queued requests and solve them in the pool
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            userData, received, deadlineAt, future = await self.queue.get()
+            started = loop.time()
+            self.queueWait.observe(started - received)
+            solveOptions = self._solveOptions(deadlineAt, started)
+            if solveOptions is None:
+                future.set_result(None)
+                continue
+
+            pool = self.pool
+            self.solvesInProgress += 1
+            try:
+                result = await loop.run_in_executor(pool, solveCase, userData, solveOptions)
+            except BrokenProcessPool:
+                # A dead worker breaks the pool and every solve running in it, so there is no telling
+                # which request killed it: replace the pool and solve this request again in a process
+                # of its own (like batch.solveMany), within what is left of its deadline
+                if self.pool is pool:
+                    self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                solveOptions = self._solveOptions(deadlineAt, loop.time())
+                if solveOptions is None:
+                    result = errorResult('Worker process died and the deadline passed before a retry')
+                else:
+                    result = await loop.run_in_executor(None, solveIsolated, userData, solveOptions, _MP_CONTEXT)
+            finally:
+                self.solvesInProgress -= 1
+            self.solveLatency.observe(loop.time() - started)
+            if not future.done():
+                future.set_result(result)
+
+    # Options of solveCase for a request with the given deadline starting to solve at now (loop
+    # time), None when nothing is left of its deadline
+    def _solveOptions(self, deadlineAt, now):
+        timeLimit = deadlineAt - now - DEADLINE_MARGIN
+        if timeLimit <= 0:
+            return None
+        if self.solverConfig.maxTimeInSeconds is not None:
+            timeLimit = min(timeLimit, self.solverConfig.maxTimeInSeconds)
+        return (self.solverConfig.replace(maxTimeInSeconds=timeLimit), self.mode, 0, None)
+
+    def _metrics(self):
+        lines = []
+        for histogram in (self.requestLatency, self.queueWait, self.solveLatency):
+            lines += histogram.render()
+        lines += ['# HELP schedule_requests_total Responses to POST /schedule by status code',
+                  '# TYPE schedule_requests_total counter']
+        lines += ['schedule_requests_total{code="%d"} %d' % (status, count)
+                  for status, count in sorted(self.requestCounts.items())]
+        lines += ['# HELP schedule_queue_depth Requests waiting for a solver worker',
+                  '# TYPE schedule_queue_depth gauge',
+                  'schedule_queue_depth %d' % self.queue.qsize(),
+                  '# HELP schedule_queue_capacity Requests that may wait before new ones get 503',
+                  '# TYPE schedule_queue_capacity gauge',
+                  'schedule_queue_capacity %d' % self.queueSize,
+                  '# HELP schedule_solves_in_progress Requests being solved right now',
+                  '# TYPE schedule_solves_in_progress gauge',
+                  'schedule_solves_in_progress %d' % self.solvesInProgress]
+        return '\n'.join(lines) + '\n'
+
+
+async def serve(host, port, **serviceOptions):
+    service = ScheduleService(**serviceOptions)
+    server = await service.start(host, port)
+    print('Serving on http://%s:%d (%d solver workers, queue of %d)' % (host, port, service.workers, service.queueSize))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP scheduling service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help='solver processes (default: one per core)')
+    parser.add_argument('--queue-size', type=int, default=None, help='queued requests before answering 503')
+    parser.add_argument('--time-limit', type=float, default=None, help='upper bound on seconds per solve')
+    parser.add_argument('--deadline', type=float, default=30.0, help='deadline of requests without X-Deadline-Seconds')
+    parser.add_argument('--mode', default='weighted', choices=['weighted', 'lexicographic'])
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, queueSize=args.queue_size,
+                          solverConfig=SolverConfig(maxTimeInSeconds=args.time_limit),
+                          defaultDeadline=args.deadline, mode=args.mode))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
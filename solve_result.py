@@ -0,0 +1,113 @@
+import collections
+
+
+# One activity of a solved schedule (start is None for activities that were not fitted)
+ScheduledActivity = collections.namedtuple('ScheduledActivity', 'name, start, duration, priority')
+
+# Raw values of one intermediate solution, in the order of ScheduleTasks.activityVars
+# Kept as plain int lists so that capturing a solution inside the solver callback stays cheap
+SolutionSnapshot = collections.namedtuple('SolutionSnapshot', 'objective, bound, wallTime, starts, presents')
+
+
+class SolveResult:
+    def __init__(self, status, objective, bound, wallTime, placed, unplaced,
+                 solutionCount=0, solutions=(), penalties=None, stages=(), solverConfig=None, error=None, presolve=None,
+                 decomposition=None, horizon=None, fallback=None, profile=None):
+        # Solver status name ('OPTIMAL', 'FEASIBLE', 'INFEASIBLE', 'UNKNOWN', ...) or 'ERROR'
+        self.status = status
+        # Objective value and best bound of the last solve (None when no solution was found)
+        self.objective = objective
+        self.bound = bound
+        # Seconds spent inside CP-SAT over all stages
+        self.wallTime = wallTime
+        # ScheduledActivity lists: placed sorted by start time, unplaced in input order
+        self.placed = list(placed)
+        self.unplaced = list(unplaced)
+        self.solutionCount = solutionCount
+        # Last intermediate solutions as SolutionSnapshots, oldest first
+        self.solutions = list(solutions)
+        # Value of each named objective term in the returned schedule
+        self.penalties = dict(penalties or {})
+        # One dict per lexicographic stage with its name, status, objective and wall time
+        self.stages = list(stages)
+        # Solver parameters used for this solve, as SolverConfig.asDict()
+        self.solverConfig = dict(solverConfig or {})
+        # Error message when status is 'ERROR' (the case could not be built or solved)
+        self.error = error
+        # What presolve pruned and tightened before the model was built (ScheduleTasks.presolveReport)
+        self.presolve = presolve
+        # How decomposition.solveDecomposed split and reconciled the day (None for a plain solve)
+        self.decomposition = decomposition
+        # Windows of a rolling_horizon.solveRollingHorizon solve (None for a plain solve)
+        self.horizon = horizon
+        # 'greedy' when the solver found nothing in time and this is the greedy schedule (ScheduleTasks(greedy=True))
+        self.fallback = fallback
+        # Build phases and solve stats of a profiled ScheduleTasks (see profiler.Profiler.asDict)
+        self.profile = profile
+
+    def hasSolution(self):
+        return self.status in ('OPTIMAL', 'FEASIBLE')
+
+    def asDict(self):
+        return {
+            'status': self.status,
+            'objective': self.objective,
+            'bound': self.bound,
+            'wall-time': self.wallTime,
+            'placed': [activity._asdict() for activity in self.placed],
+            'unplaced': [activity._asdict() for activity in self.unplaced],
+            'solution-count': self.solutionCount,
+            'penalties': self.penalties,
+            'stages': self.stages,
+            'solver-config': self.solverConfig,
+            'error': self.error,
+            'presolve': self.presolve,
+            'decomposition': self.decomposition,
+            'horizon': self.horizon,
+            'fallback': self.fallback,
+            'profile': self.profile,
+        }
+
+    def __repr__(self):
+        return 'SolveResult(status=%s, objective=%s, placed=%d, unplaced=%d)' % (
+            self.status, self.objective, len(self.placed), len(self.unplaced))
+
+
+class ConsoleReporter:
+    """Print intermediate solutions and the final result."""
+
+    # Called from the solver thread for every improving solution
+    def onSolution(self, solutionCallback, snapshot):
+        for key, var in solutionCallback.extraVariables.items():
+            print(key, ': ', solutionCallback.Value(var))
+
+        print('Objective Score: ', snapshot.objective, '\n')
+        activityVars = solutionCallback.activityVars
+        order = sorted(range(len(activityVars)), key=lambda i: snapshot.starts[i])
+        for i in order:
+            if snapshot.presents[i]:
+                print('At ' + str(snapshot.starts[i]) +
+                    '\tfor: ' + str(activityVars[i].data.duration) +
+                    '\t\tpriority: ' + str(activityVars[i].data.priority) +
+                    '\t' + activityVars[i].data.name)
+        print()
+        for i in order:
+            if not snapshot.presents[i]:
+                print('At ' + str(snapshot.starts[i]) +
+                    '\tfor: ' + str(activityVars[i].data.duration) +
+                    '\t\tpriority: ' + str(activityVars[i].data.priority) +
+                    '\t' + activityVars[i].data.name + '\t\tNot fitted')
+        print('**************************')
+
+    # Called once per solve stage with its name ('' for a single stage solve), status and solution count
+    def onStage(self, stageName, status, solutionCount, wallTime):
+        if stageName:
+            print('Stage: %s' % stageName)
+        print('Status = %s' % status)
+        print('Number of solutions found: %i' % solutionCount)
+        print('Time Taken: ', round(wallTime, 3), 'seconds')
+
+    def onResult(self, result):
+        solverConfig = {key: value for key, value in result.solverConfig.items() if value is not None}
+        print('Solver config: %s' % solverConfig)
+        print('Final Status = %s, Objective = %s, Bound = %s' % (result.status, result.objective, result.bound))
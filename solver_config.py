@@ -0,0 +1,48 @@
+class SolverConfig:
+    # Maps each config attribute to the CP-SAT parameter it sets
+    PARAMETER_NAMES = {
+        'maxTimeInSeconds': 'max_time_in_seconds',
+        'numSearchWorkers': 'num_workers',
+        'relativeGapLimit': 'relative_gap_limit',
+        'absoluteGapLimit': 'absolute_gap_limit',
+        'randomSeed': 'random_seed',
+        'logSearchProgress': 'log_search_progress',
+        'maxDeterministicTime': 'max_deterministic_time',
+    }
+
+    # Any value left as None keeps CP-SAT's own default for that parameter
+    # maxDeterministicTime limits the solver's own work count instead of the clock, so that with one
+    # search worker and a fixed seed a time limited solve gives the same schedule on every run
+    def __init__(self, maxTimeInSeconds=None, numSearchWorkers=None, relativeGapLimit=None,
+                 absoluteGapLimit=None, randomSeed=None, logSearchProgress=None, maxDeterministicTime=None):
+        self.maxTimeInSeconds = maxTimeInSeconds
+        self.numSearchWorkers = numSearchWorkers
+        self.relativeGapLimit = relativeGapLimit
+        self.absoluteGapLimit = absoluteGapLimit
+        self.randomSeed = randomSeed
+        self.logSearchProgress = logSearchProgress
+        self.maxDeterministicTime = maxDeterministicTime
+
+    # Set the solver parameters from this config, resetting unset ones to their defaults
+    # so that a config applied before does not leak into the next solve
+    def applyTo(self, solverParameters):
+        for attribute, parameterName in self.PARAMETER_NAMES.items():
+            value = getattr(self, attribute)
+            if value is None:
+                solverParameters.ClearField(parameterName)
+            else:
+                setattr(solverParameters, parameterName, value)
+
+    # Copy of this config with the given attributes replaced
+    def replace(self, **changes):
+        values = self.asDict()
+        values.update(changes)
+        return SolverConfig(**values)
+
+    def asDict(self):
+        return {attribute: getattr(self, attribute) for attribute in self.PARAMETER_NAMES}
+
+    def __repr__(self):
+        setValues = ', '.join(
+            attribute + '=' + repr(value) for attribute, value in self.asDict().items() if value is not None)
+        return 'SolverConfig(' + setValues + ')'
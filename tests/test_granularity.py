@@ -0,0 +1,42 @@
+from granularity import TimeScale, solveWithGranularity
+from input_interfaces import Activity, ActivityGroup, ScheduleTime, createInputShell
+from solver_config import SolverConfig
+
+
+def _config():
+    return SolverConfig(maxTimeInSeconds=10, numSearchWorkers=1)
+
+
+# A priority 1 activity whose group window holds no whole slot, and a priority 3 one
+def _collapsingGroupDay():
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, 60)]
+    userData['activity-groups'] = [ActivityGroup('g', 7, 14)]
+    userData['activities'] = [
+        Activity('A', 5, groupName='g', priority=1),
+        Activity('B', 20, priority=3),
+    ]
+    return userData
+
+
+def test_inexpressible_activity_is_kept_absent():
+    timeScale = TimeScale(_collapsingGroupDay(), 10)
+    assert [activity.name for activity in timeScale.absent] == ['A']
+    assert timeScale.originalIndices == [0, 1]
+
+
+def test_inexpressible_activity_holds_back_later_levels():
+    userData = _collapsingGroupDay()
+    result = solveWithGranularity(userData, 10, solverConfig=_config())
+    assert result.status == 'OPTIMAL'
+    assert result.placed == []
+    assert sorted(activity.name for activity in result.unplaced) == ['A', 'B']
+
+
+def test_expressible_day_is_scheduled_in_slots():
+    userData = _collapsingGroupDay()
+    userData['activity-groups'] = [ActivityGroup('g', 10, 30)]
+    result = solveWithGranularity(userData, 10, solverConfig=_config())
+    starts = {activity.name: activity.start for activity in result.placed}
+    assert set(starts) == {'A', 'B'}
+    assert 10 <= starts['A'] <= 20
@@ -0,0 +1,49 @@
+import pytest
+
+from input_interfaces import (Activity, BufferTime, InvalidInputError, Resource, ScheduleTime, createInputShell,
+                              validateUserData)
+
+
+def _userData(activities=(), buffers=(), resources=()):
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, 60)]
+    userData['activities'] = list(activities)
+    userData['buffer-times'] = list(buffers)
+    userData['resources'] = list(resources)
+    return userData
+
+
+@pytest.mark.parametrize('userData', [
+    _userData(activities=[Activity('A', True)]),
+    _userData(activities=[Activity('A', 10, startTime=False)]),
+    _userData(buffers=[BufferTime(True)]),
+    _userData(buffers=[BufferTime(10, startTime=True)]),
+    _userData(resources=[Resource('r', capacity=True)]),
+])
+def test_bools_are_not_ints(userData):
+    with pytest.raises(InvalidInputError):
+        validateUserData(userData)
+
+
+def test_bool_schedule_time_is_rejected():
+    userData = _userData()
+    userData['schedule-time'] = [ScheduleTime(False, 60)]
+    with pytest.raises(InvalidInputError):
+        validateUserData(userData)
+
+
+@pytest.mark.parametrize('arguments', [
+    {'priority': True},
+    {'priority': [1]},
+    {'attentionRequired': True},
+    {'attentionRequired': 4},
+    {'attentionRequired': [2]},
+])
+def test_activity_rejects_bad_priority_and_attention(arguments):
+    with pytest.raises(InvalidInputError):
+        Activity('A', 10, **arguments)
+
+
+def test_valid_userData_passes():
+    validateUserData(_userData(activities=[Activity('A', 10, startTime=0, priority=1, attentionRequired=3)],
+                               buffers=[BufferTime(5)], resources=[Resource('r', capacity=2)]))
@@ -0,0 +1,73 @@
+import io
+import json
+
+import pytest
+
+import json_format
+from input_interfaces import InvalidInputError
+from json_format import solveNdjson, userDataFromJson
+from solver_config import SolverConfig
+
+
+def _user(userId, **activityFields):
+    activity = dict({'name': 'A', 'duration': 10}, **activityFields)
+    return {'id': userId, 'schedule-time': {'start-time': 0, 'end-time': 60}, 'activities': [activity]}
+
+
+def _solveLines(lines):
+    output = io.StringIO()
+    solveNdjson(io.StringIO('\n'.join(lines) + '\n'), output, workers=1,
+                solverConfig=SolverConfig(maxTimeInSeconds=5, numSearchWorkers=1))
+    return {result['id']: result for result in map(json.loads, output.getvalue().splitlines())}
+
+
+@pytest.mark.parametrize('activityFields', [
+    {'group-name': ['g']},
+    {'resources': [['x']]},
+    {'resources': 'x'},
+    {'duration': True},
+    {'duration': '10'},
+    {'start-time': 1.5},
+    {'priority': 'high'},
+    {'attention-required': True},
+    {'name': 7},
+])
+def test_wrong_types_are_invalid_input(activityFields):
+    with pytest.raises(InvalidInputError):
+        userDataFromJson(_user('u', **activityFields))
+
+
+def test_optional_fields_may_be_null():
+    userData = userDataFromJson(_user('u', priority=None, resources=None, **{'start-time': None}))
+    assert userData['activities'][0].priority == 3
+
+
+def test_malformed_lines_do_not_stop_the_batch():
+    results = _solveLines([
+        json.dumps(_user('good-1')),
+        json.dumps(_user('bad-group', **{'group-name': ['g']})),
+        '{not json',
+        json.dumps(_user('bad-resources', resources=[['x']])),
+        json.dumps(['not', 'an', 'object']),
+        json.dumps(_user('good-2')),
+    ])
+    assert results['good-1']['status'] == 'OPTIMAL'
+    assert results['good-2']['status'] == 'OPTIMAL'
+    for userId in ('bad-group', 'bad-resources', 3, 5):
+        assert results[userId]['status'] == 'ERROR'
+    assert len(results) == 6
+
+
+def test_unexpected_errors_fail_only_their_line(monkeypatch):
+    parse = json_format.userDataFromJson
+
+    def failing(obj):
+        if obj.get('id') == 'crash':
+            raise TypeError('unhashable type')
+        return parse(obj)
+
+    monkeypatch.setattr(json_format, 'userDataFromJson', failing)
+    results = _solveLines([json.dumps(_user('crash')), json.dumps(_user('fine'))])
+    assert results['crash']['status'] == 'ERROR'
+    assert 'TypeError' in results['crash']['error']
+    assert results['fine']['status'] == 'OPTIMAL'
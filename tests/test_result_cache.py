@@ -0,0 +1,80 @@
+import copy
+
+from instance_generator import generateUserData
+from result_cache import ResultCache
+from scheduler import ScheduleTasks
+from solver_config import SolverConfig
+
+
+def _solve(userData, cache, solverConfig):
+    scheduler = ScheduleTasks(userData, solverConfig=solverConfig, cache=cache)
+    return scheduler, scheduler.solve()
+
+
+def test_time_limited_result_does_not_answer_a_longer_solve():
+    userData = generateUserData(120, seed=1)
+    cache = ResultCache()
+    limited = SolverConfig(maxDeterministicTime=0.005, numSearchWorkers=1, randomSeed=0)
+    _, first = _solve(userData, cache, limited)
+    assert first.status == 'FEASIBLE'
+
+    scheduler, second = _solve(userData, cache, SolverConfig(numSearchWorkers=1))
+    assert scheduler.isBuilt
+    assert second.status == 'OPTIMAL'
+    assert second.objective < first.objective
+
+    # The proven result replaces the limited one and answers without solving
+    scheduler, third = _solve(userData, cache, limited)
+    assert not scheduler.isBuilt
+    assert third.objective == second.objective
+
+
+def test_limited_result_does_not_replace_a_proven_one():
+    userData = generateUserData(120, seed=1)
+    cache = ResultCache()
+    _, proven = _solve(userData, cache, SolverConfig(numSearchWorkers=1))
+    scheduler = ScheduleTasks(userData, cache=cache)
+    worse = copy.copy(proven)
+    worse.status, worse.objective = 'FEASIBLE', proven.objective + 1
+    scheduler._storeInCache('weighted', worse, False)
+    scheduler, again = _solve(userData, cache, SolverConfig(numSearchWorkers=1))
+    assert not scheduler.isBuilt
+    assert again.objective == proven.objective
+
+
+def test_gap_limited_result_is_not_proven():
+    userData = generateUserData(40, seed=1)
+    cache = ResultCache()
+    _, first = _solve(userData, cache, SolverConfig(relativeGapLimit=0.5, numSearchWorkers=1))
+    assert first.status == 'OPTIMAL'
+    assert not ScheduleTasks._isProven(first, SolverConfig(relativeGapLimit=0.5))
+    assert ScheduleTasks._isProven(first, SolverConfig())
+
+    scheduler, _ = _solve(userData, cache, SolverConfig(numSearchWorkers=1))
+    assert scheduler.isBuilt
+
+
+def test_only_answered_solves_count_as_hits():
+    userData = generateUserData(120, seed=1)
+    cache = ResultCache()
+    limited = SolverConfig(maxDeterministicTime=0.005, numSearchWorkers=1, randomSeed=0)
+    _solve(userData, cache, limited)
+    # The limited entry is found but does not answer the solve, neither does one of another mode
+    _solve(userData, cache, limited)
+    ScheduleTasks(userData, cache=cache).solve(mode='lexicographic', stageTimeLimits=[0.5, 0.5, 0.5])
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    _solve(userData, cache, SolverConfig(numSearchWorkers=1))
+    _solve(userData, cache, SolverConfig(numSearchWorkers=1))
+    assert (cache.hits, cache.misses) == (1, 4)
+    assert cache.hitRate() == 0.2
+
+
+def test_entry_read_from_disk_is_found_by_its_structure(tmp_path):
+    userData = generateUserData(40, seed=1)
+    _solve(userData, ResultCache(directory=str(tmp_path)), SolverConfig(numSearchWorkers=1))
+
+    cache = ResultCache(directory=str(tmp_path))
+    scheduler = ScheduleTasks(userData, cache=cache)
+    assert scheduler._cacheEntry is not None
+    assert cache.getSimilar(scheduler.cacheKey.structureKey) is scheduler._cacheEntry
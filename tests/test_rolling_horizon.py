@@ -0,0 +1,54 @@
+import pytest
+
+from instance_generator import DAY_LENGTH, multiDayUserData
+from input_interfaces import Activity, ActivityGroup, ScheduleTime, createInputShell
+from rolling_horizon import _score, solveRollingHorizon
+from scheduler import ScheduleTasks
+from solver_config import SolverConfig
+
+
+# Deterministic limits: the one model gets as much work as all the windows together
+def _windowConfig():
+    return SolverConfig(maxDeterministicTime=3, numSearchWorkers=1)
+
+
+@pytest.mark.parametrize('numDays', [1, 2])
+def test_rolling_horizon_scores_as_well_as_one_model(numDays):
+    userData = multiDayUserData(numDays)
+    whole = ScheduleTasks(userData, solverConfig=_windowConfig().replace(maxDeterministicTime=3 * numDays)).solve()
+    rolling = solveRollingHorizon(userData, DAY_LENGTH, windowConfig=_windowConfig())
+    assert rolling.objective <= whole.objective
+    assert rolling.horizon['dropped-by-cascade'] == 0
+
+
+# The first window has no room for the floating priority 1 activity; the second must place it before
+# its own priority 3 ones, since the third has no room either and losing it would lose level 3 too
+def test_left_unplaced_activity_takes_precedence():
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, 300)]
+    userData['activity-groups'] = [ActivityGroup('first', 0, 100), ActivityGroup('second', 100, 200),
+                                   ActivityGroup('third', 200, 300)]
+    userData['activities'] = [
+        Activity('floating', 60, priority=1),
+        Activity('first', 100, groupName='first', priority=1),
+        Activity('low', 50, groupName='second', priority=3),
+        Activity('lower', 50, groupName='second', priority=3),
+        Activity('third', 100, groupName='third', priority=1),
+    ]
+    rolling = solveRollingHorizon(userData, 100, lookahead=0, windowConfig=_windowConfig())
+    assert {'floating', 'first', 'third'} <= set(activity.name for activity in rolling.placed)
+    assert len(rolling.placed) == 3
+    assert rolling.horizon['dropped-by-cascade'] == 0
+
+
+# A plan the full model rejects is not reported as feasible
+def test_rejected_plan_keeps_the_scoring_status():
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, 100)]
+    userData['activities'] = [Activity('A', 30), Activity('B', 30)]
+    report = {}
+    result = _score(userData, [0, 0], True, 'weighted', _windowConfig(), report)
+    assert result.status == 'INFEASIBLE'
+    assert result.objective is None
+    assert [activity.start for activity in result.placed] == [0, 0]
+    assert result.horizon is report
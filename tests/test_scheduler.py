@@ -0,0 +1,27 @@
+from input_interfaces import Activity, ScheduleTime, createInputShell
+from scheduler import ScheduleTasks
+from solver_config import SolverConfig
+
+
+def _day():
+    userData = createInputShell()
+    userData['schedule-time'] = [ScheduleTime(0, 100)]
+    userData['activities'] = [Activity('A', 60), Activity('B', 30), Activity('C', 20), Activity('D', 50)]
+    return userData
+
+
+# The bounds a lexicographic solve puts on its stages must not outlive it
+def test_lexicographic_stage_bounds_do_not_outlive_the_solve():
+    scheduler = ScheduleTasks(_day(), solverConfig=SolverConfig(maxTimeInSeconds=10, numSearchWorkers=1))
+    numConstraints = len(scheduler.model.Proto().constraints)
+    assert scheduler.solve(mode='lexicographic').status == 'OPTIMAL'
+    assert len(scheduler.model.Proto().constraints) == numConstraints
+
+    scheduler.removeActivity('B')
+    result = scheduler.solve(mode='lexicographic')
+    userData = _day()
+    del userData['activities'][1]
+    fresh = ScheduleTasks(userData, solverConfig=SolverConfig(maxTimeInSeconds=10, numSearchWorkers=1)).solve(mode='lexicographic')
+    assert result.status == fresh.status == 'OPTIMAL'
+    assert result.penalties == fresh.penalties
+    assert len(result.placed) == 2
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import batch
+import service
+from service import ScheduleService
+from solver_config import SolverConfig
+
+
+def _body(**activityFields):
+    activity = dict({'name': 'A', 'duration': 10}, **activityFields)
+    return json.dumps({'id': 'u', 'schedule-time': {'start-time': 0, 'end-time': 60}, 'activities': [activity]})
+
+
+async def _post(port, body, headers=()):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    head = ['POST /schedule HTTP/1.1', 'Content-Length: %d' % len(body.encode()), 'Connection: close'] + list(headers)
+    writer.write(('\r\n'.join(head) + '\r\n\r\n' + body).encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    statusLine, _, rest = response.partition(b'\r\n')
+    return int(statusLine.split()[1]), json.loads(rest.partition(b'\r\n\r\n')[2] or b'null')
+
+
+# Status and payload of each request, posted at once to a service with the given workers
+def _serve(requests, workers=1):
+    async def run():
+        scheduleService = ScheduleService(workers=workers, solverConfig=SolverConfig(maxTimeInSeconds=5))
+        server = await scheduleService.start(port=0)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            return await asyncio.gather(*[_post(port, body, headers) for body, headers in requests])
+        finally:
+            server.close()
+            scheduleService.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('body, headers', [
+    (_body(**{'group-name': ['g']}), ()),
+    (_body(resources=[['x']]), ()),
+    (_body(duration=True), ()),
+    ('{not json', ()),
+    ('[1, 2]', ()),
+    (_body(), ('X-Deadline-Seconds: nan',)),
+    (_body(), ('X-Deadline-Seconds: inf',)),
+    (_body(), ('X-Deadline-Seconds: -1',)),
+    (_body(), ('X-Deadline-Seconds: soon',)),
+    (_body(), ('Content-Length: -1',)),
+])
+def test_bad_requests_get_400(body, headers):
+    (status, payload), = _serve([(body, headers)])
+    assert status == 400
+    assert payload['error']
+
+
+def test_valid_request_gets_200():
+    (status, payload), = _serve([(_body(), ('X-Deadline-Seconds: 10',))])
+    assert status == 200
+    assert payload['status'] == 'OPTIMAL'
+
+
+# Kills the worker process solving the activity named 'crash'
+def _crashingSolveCase(userData, solveOptions):
+    if userData['activities'][0].name == 'crash':
+        os._exit(3)
+    return _solveCase(userData, solveOptions)
+
+
+_solveCase = service.solveCase
+
+
+def test_dead_worker_does_not_fail_other_requests(monkeypatch):
+    # The isolated retry (batch.solveIsolated) crashes as well
+    monkeypatch.setattr(service, 'solveCase', _crashingSolveCase)
+    monkeypatch.setattr(batch, 'solveCase', _crashingSolveCase)
+    results = _serve([(_body(name='crash'), ()), (_body(name='B'), ()), (_body(name='C'), ())], workers=2)
+    # Only the crashing request fails; the others broken with the pool are solved again
+    assert [status for status, _ in results] == [500, 200, 200]
+    assert 'died' in results[0][1]['error']
+    assert [payload['status'] for _, payload in results[1:]] == ['OPTIMAL', 'OPTIMAL']